@@ -0,0 +1,110 @@
+import argparse
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import sessionmaker
+from database import immediate_transaction
+from models import Passenger, Ticket, TicketArchive, add_ticket_tombstones, current_revision
+
+# Билетов, переносимых в архив одной транзакцией: на базе в 1 млн билетов пачка
+# держит блокировку записи около 0,1 с, и кассы между пачками продают билеты как обычно
+BATCH_SIZE = 500
+# Пауза между пачками, секунд
+PAUSE_S = 0.05
+# Пассажиров, проверяемых на наличие билетов за один запрос
+PASSENGER_SCAN_SIZE = 5000
+
+# Колонки архива — те же, что у билета
+COLUMNS = [column.name for column in TicketArchive.__table__.columns]
+
+ArchiveResult = namedtuple("ArchiveResult", ["tickets", "passengers"])
+
+
+# Переносит в архив одну пачку билетов, прибывших раньше before, и возвращает
+# их число. Копирование и удаление идут одной транзакцией; удалённые билеты
+# получают отметки об удалении, и открытые списки убирают их при обновлении.
+# Сводки продаж архивные билеты не теряют (см. миграцию 7).
+def archive_batch(db, before: datetime, batch_size: int = BATCH_SIZE) -> int:
+    with immediate_transaction(db):
+        ticket_ids = db.scalars(
+            select(Ticket.id).where(Ticket.arrival_time < before).order_by(Ticket.arrival_time).limit(batch_size)
+        ).all()
+        if not ticket_ids:
+            return 0
+        db.execute(insert(TicketArchive).from_select(
+            COLUMNS, select(*[getattr(Ticket, name) for name in COLUMNS]).where(Ticket.id.in_(ticket_ids))))
+        add_ticket_tombstones(db, current_revision(db) + 1, ticket_ids)
+        db.execute(delete(Ticket).where(Ticket.id.in_(ticket_ids)).execution_options(synchronize_session=False))
+        return len(ticket_ids)
+
+
+# Пассажиры без билетов — ни действующих, ни архивных (например, после
+# удаления или изменения билетов). Пассажиры просматриваются по id кусками
+# по scan_size, каждый кусок — короткой транзакцией. Возвращает число удалённых.
+def collect_passengers(db, scan_size: int = PASSENGER_SCAN_SIZE, pause: float = PAUSE_S) -> int:
+    removed = 0
+    last_id = 0
+    while True:
+        with immediate_transaction(db):
+            passenger_ids = db.scalars(
+                select(Passenger.id).where(Passenger.id > last_id).order_by(Passenger.id).limit(scan_size)).all()
+            if not passenger_ids:
+                return removed
+            last_id = passenger_ids[-1]
+            orphans = (
+                select(Passenger.id)
+                .where(Passenger.id.in_(passenger_ids))
+                .where(~select(Ticket.id).where(Ticket.passenger_id == Passenger.id).exists())
+                .where(~select(TicketArchive.id).where(TicketArchive.passenger_id == Passenger.id).exists())
+            )
+            removed += db.execute(
+                delete(Passenger).where(Passenger.id.in_(orphans)).execution_options(synchronize_session=False)
+            ).rowcount
+        time.sleep(pause)
+
+
+# Задание архивации: все билеты, прибывшие раньше before (по умолчанию —
+# сейчас), переносятся в архив пачками, затем удаляются пассажиры без билетов.
+# progress(archived) вызывается после каждой пачки.
+def archive_tickets(db, before: datetime = None, batch_size: int = BATCH_SIZE, pause: float = PAUSE_S,
+                    progress=None) -> ArchiveResult:
+    before = before or datetime.now()
+    archived = 0
+    while True:
+        moved = archive_batch(db, before, batch_size)
+        archived += moved
+        if progress:
+            progress(archived)
+        if moved < batch_size:
+            break
+        time.sleep(pause)
+    return ArchiveResult(archived, collect_passengers(db, pause=pause))
+
+
+# Запуск по расписанию (cron, планировщик задач): python archive.py [--before ДАТА]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перенос билетов состоявшихся поездок в архив")
+    parser.add_argument("--before", type=datetime.fromisoformat, default=None,
+                        help="переносить билеты, прибывшие раньше (ГГГГ-ММ-ДД [ЧЧ:ММ]); по умолчанию — сейчас")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=PAUSE_S, help="пауза между пачками, секунд")
+    parser.add_argument("--profile", default=None, help="профиль базы данных из database.py")
+    args = parser.parse_args(argv)
+
+    from database import make_engine
+
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=make_engine(args.profile))
+    started = time.perf_counter()
+    with session_factory() as db:
+        result = archive_tickets(db, args.before, args.batch_size, args.pause,
+                                 progress=lambda done: print(f"\rПеренесено билетов: {done}", end="", file=sys.stderr))
+    print(file=sys.stderr)
+    print(f"Перенесено в архив билетов: {result.tickets}, удалено пассажиров без билетов: {result.passengers} "
+          f"за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,109 @@
+import logging
+import math
+import os
+import threading
+import time
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from models import User
+from models import SchemaInfo, User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib 1.7 не умеет читать версию bcrypt 4.x и пишет об этом трассировку при первом хешировании
+logging.getLogger("passlib.handlers.bcrypt").setLevel(logging.ERROR)
 
+# Сколько должна занимать проверка пароля. Стоимость bcrypt подбирается под это
+# время на компьютере, который первым обратился к базе, и сохраняется в ней
+# (SchemaInfo), чтобы все кассы одной базы хешировали с одной стоимостью;
+# CASHIER_BCRYPT_ROUNDS задаёт её явно.
+TARGET_HASH_MS = float(os.environ.get("CASHIER_BCRYPT_TARGET_MS", 100))
+MIN_ROUNDS = 10
+MAX_ROUNDS = 14
+PROBE_ROUNDS = 6
+ROUNDS_KEY = "bcrypt_rounds"
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+_pwd_context = None
+# Стоимость контекста взята из базы или задана явно, а не подобрана только для этого процесса
+_pwd_context_shared = False
+_pwd_context_lock = threading.Lock()
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# Время bcrypt удваивается с каждым раундом, поэтому достаточно замерить
+# дешёвый хеш и экстраполировать
+def calibrate_rounds(target_ms=TARGET_HASH_MS):
+    probe = bcrypt.using(rounds=PROBE_ROUNDS)
+    elapsed_ms = math.inf
+    for _ in range(3):
+        started = time.perf_counter()
+        probe.hash("calibration")
+        elapsed_ms = min(elapsed_ms, (time.perf_counter() - started) * 1000)
+
+    rounds = PROBE_ROUNDS + math.floor(math.log2(target_ms / elapsed_ms))
+    return max(MIN_ROUNDS, min(MAX_ROUNDS, rounds))
+
+
+# Общая стоимость bcrypt базы: сохранённая или, если её ещё нет, подобранная
+# на этом компьютере. При одновременной записи двумя кассами остаётся первая.
+def shared_rounds(db: Session) -> int:
+    rounds = db.scalar(select(SchemaInfo.value).where(SchemaInfo.key == ROUNDS_KEY))
+    if rounds is None:
+        db.execute(sqlite_insert(SchemaInfo).values(key=ROUNDS_KEY, value=str(calibrate_rounds()))
+                   .on_conflict_do_nothing(index_elements=[SchemaInfo.key]))
+        db.commit()
+        rounds = db.scalar(select(SchemaInfo.value).where(SchemaInfo.key == ROUNDS_KEY))
+    return int(rounds)
+
+
+# Единый контекст хеширования. Устаревшими (needs_update) считаются только хеши
+# дешевле общей стоимости: они перехешируются при следующем успешном входе, а
+# более дорогие остаются как есть. db — сессия базы, из которой берётся общая
+# стоимость; без неё (и без CASHIER_BCRYPT_ROUNDS) стоимость подбирается для
+# процесса и заменяется общей при первом обращении с db.
+def get_pwd_context(db: Session = None) -> CryptContext:
+    global _pwd_context, _pwd_context_shared
+    with _pwd_context_lock:
+        if _pwd_context is None or (db is not None and not _pwd_context_shared):
+            explicit = os.environ.get("CASHIER_BCRYPT_ROUNDS")
+            if explicit:
+                rounds = int(explicit)
+            elif db is not None:
+                rounds = shared_rounds(db)
+            else:
+                rounds = calibrate_rounds()
+            _pwd_context_shared = bool(explicit) or db is not None
+            _pwd_context = CryptContext(
+                schemes=["bcrypt"],
+                deprecated="auto",
+                bcrypt__default_rounds=rounds,
+                bcrypt__min_rounds=rounds,
+            )
+        return _pwd_context
+
+
+def verify_password(plain_password, hashed_password, db: Session = None):
+    return get_pwd_context(db).verify(plain_password, hashed_password)
+
+
+def get_password_hash(password, db: Session = None):
+    return get_pwd_context(db).hash(password)
 
 
 def authenticate_user(db: Session, username: str, password: str):
     user = db.query(User).filter(User.username == username).first()
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not verify_password(password, user.password, db):
         return False
+    if get_pwd_context(db).needs_update(user.password):
+        user.password = get_password_hash(password, db)
+        db.commit()
+        db.refresh(user)
     return user
 
 
 def create_user(db: Session, username: str, firstname: str, lastname: str, middlename: str, email: str, password: str):
-    hashed_password = get_password_hash(password)
+    hashed_password = get_password_hash(password, db)
     db_user = User(username=username, firstname=firstname, lastname=lastname, middle_name=middlename, email=email,
                    password=hashed_password, is_admin=False)
     db.add(db_user)
@@ -0,0 +1,259 @@
+# Нагрузочная проверка продажи билетов несколькими кассами одновременно.
+# Запуск из корня проекта: python -m bench.booking_stress [--writers 8 16 32] [--attempts 200]
+#
+# Каждая касса — отдельный процесс со своим подключением к общей базе, как у
+# нескольких терминалов. Все кассы продают места одного поезда на несколько
+# пересекающихся по времени рейсов, выбирая место случайно, поэтому постоянно
+# сталкиваются на одних и тех же местах. Продажа идёт через booking.save_ticket.
+#
+# После прогона база проверяется: ни одно место не должно быть продано дважды на
+# пересекающееся время, а число проданных билетов — совпадать с числом успешных
+# продаж. Печатается пропускная способность (продаж и попыток в секунду) и
+# задержка одной продажи. Код возврата 1 — найдена двойная продажа или ошибка.
+#
+# С --service кассы продают через сервис бронирования (service.py), который
+# запускается на той же копии базы: один писатель и групповой коммит вместо
+# борьбы процессов за блокировку файла.
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Рейсы стресс-теста: DAYS дней по RUNS отправлений через RUN_STEP друг от друга,
+# каждый длится RUN_HOURS, поэтому соседние рейсы дня занимают место одновременно
+DAYS = 10
+RUNS = 4
+RUN_STEP = timedelta(hours=2)
+RUN_HOURS = timedelta(hours=5)
+
+# Серии паспортов до 1000 генератор не выдаёт: у каждой кассы своя серия
+PASSPORT_SERIES = 100
+
+TICKETS = 10_000
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+# Сколько ждать, пока сервис начнёт принимать соединения, секунд
+SERVICE_START_S = 30
+
+
+def _writer(writer, attempts, plan, start, results, service=None):
+    import auth
+    import booking
+    from bench import datagen
+    from database import SessionLocal
+    from sqlalchemy.exc import OperationalError
+    from service_client import ServiceClient
+
+    client = ServiceClient(service) if service else None
+    # Продажи идут от администратора (cashier_id 1): сервис выполняет операции только после входа
+    if client is not None:
+        client.call(auth.authenticate_user, "admin", datagen.ADMIN_PASSWORD)
+    rng = random.Random(writer)
+    sold = rejected = busy = 0
+    errors = []
+    latencies = []
+    start.wait()
+    for attempt in range(attempts):
+        departure = plan["departure"] + timedelta(days=rng.randrange(DAYS)) + RUN_STEP * rng.randrange(RUNS)
+        form = {
+            "train_id": plan["train_id"],
+            "seat_number": rng.randint(1, plan["total_seats"]),
+            "departure_time": departure,
+            "arrival_time": departure + RUN_HOURS,
+            "first_name": "Нагрузка",
+            "last_name": f"Касса{writer}",
+            "middle_name": "Тестович",
+            "series_passport": PASSPORT_SERIES + writer,
+            "number_passport": 100000 + attempt,
+            "departure_station_id": plan["departure_station_id"],
+            "arrival_station_id": plan["arrival_station_id"],
+            "cashier_id": 1,
+        }
+        started = time.perf_counter()
+        try:
+            if client is not None:
+                client.call(booking.save_ticket, form)
+            else:
+                with SessionLocal() as db:
+                    booking.save_ticket(db, form)
+        except booking.BookingError:
+            rejected += 1
+        except OperationalError as e:
+            # База осталась занятой после всех повторов
+            if "is locked" not in str(e):
+                errors.append(str(e))
+            busy += 1
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        else:
+            sold += 1
+        latencies.append(time.perf_counter() - started)
+    results.put({"sold": sold, "rejected": rejected, "busy": busy, "errors": errors, "latencies": latencies})
+
+
+def _plan(path):
+    connection = sqlite3.connect(path)
+    try:
+        train_id, total_seats = connection.execute(
+            'SELECT id, total_seats FROM "Trains" ORDER BY total_seats LIMIT 1').fetchone()
+        last_arrival = connection.execute('SELECT max(arrival_time) FROM "Tickets"').fetchone()[0]
+        stations = [row[0] for row in connection.execute('SELECT id FROM "Stations" ORDER BY id LIMIT 2')]
+    finally:
+        connection.close()
+    departure = datetime.fromisoformat(last_arrival).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return {"train_id": train_id, "total_seats": total_seats, "departure": departure,
+            "departure_station_id": stations[0], "arrival_station_id": stations[1]}
+
+
+# Места, проданные дважды на пересекающееся время: пары билетов
+def double_bookings(path, plan):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('''
+            SELECT a.id, b.id, a.seat_number FROM "Tickets" a
+            JOIN "Tickets" b ON b.train_id = a.train_id AND b.seat_number = a.seat_number AND b.id > a.id
+                            AND b.departure_time < a.arrival_time AND a.departure_time < b.arrival_time
+            WHERE a.train_id = ? AND a.departure_time >= ?
+        ''', (plan["train_id"], plan["departure"].isoformat(" "))).fetchall()
+    finally:
+        connection.close()
+
+
+def sold_in_test(path, plan):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('SELECT count(*) FROM "Tickets" WHERE train_id = ? AND departure_time >= ?',
+                                  (plan["train_id"], plan["departure"].isoformat(" "))).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def service_address(directory):
+    if hasattr(socket, "AF_UNIX"):
+        return "unix:" + os.path.join(directory, "service.sock")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"127.0.0.1:{sock.getsockname()[1]}"
+
+
+def start_service(address):
+    import auth
+    from bench import datagen
+    from service_client import ServiceClient
+
+    process = subprocess.Popen([sys.executable, "service.py", "--listen", address], cwd=PROJECT_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = ServiceClient(address)
+    deadline = time.perf_counter() + SERVICE_START_S
+    while True:
+        try:
+            client.call(auth.authenticate_user, "admin", datagen.ADMIN_PASSWORD)
+            break
+        except Exception:
+            if process.poll() is not None or time.perf_counter() > deadline:
+                process.kill()
+                raise RuntimeError("Сервис бронирования не запустился")
+            time.sleep(0.2)
+    client.close()
+    return process
+
+
+def run(path, plan, writers, attempts, service=False):
+    # Процессы запускаются начисто (spawn): база берётся из окружения при импорте database
+    os.environ["CASHIER_DB_URL"] = f"sqlite:///{path}"
+    os.environ["CASHIER_DB_PROFILE"] = "production"
+    address = service_address(os.path.dirname(path)) if service else None
+    service_process = start_service(address) if service else None
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=_writer, args=(writer, attempts, plan, start, results, address))
+                 for writer in range(writers)]
+    for process in processes:
+        process.start()
+    # Пусть все процессы импортируют модули и подойдут к старту
+    time.sleep(1 + writers * 0.05)
+    started = time.perf_counter()
+    start.set()
+    stats = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    if service_process is not None:
+        service_process.terminate()
+        service_process.wait()
+
+    latencies = sorted(latency for item in stats for latency in item["latencies"])
+    return {
+        "writers": writers,
+        "elapsed_s": elapsed,
+        "sold": sum(item["sold"] for item in stats),
+        "rejected": sum(item["rejected"] for item in stats),
+        "busy": sum(item["busy"] for item in stats),
+        "errors": [error for item in stats for error in item["errors"]],
+        "median_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "failed": any(process.exitcode for process in processes),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Одновременная продажа билетов несколькими кассами")
+    parser.add_argument("--writers", type=int, nargs="+", default=[8, 16, 32], help="число касс (процессов)")
+    parser.add_argument("--attempts", type=int, default=200, help="попыток продажи на одну кассу")
+    parser.add_argument("--tickets", type=int, default=TICKETS, help="билетов в синтетической базе")
+    parser.add_argument("--service", action="store_true", help="продавать через сервис бронирования (service.py)")
+    args = parser.parse_args(argv)
+
+    from bench import datagen
+
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="cashier-stress-") as directory:
+        template = os.path.join(directory, "template.db")
+        print(f"Генерация базы: {args.tickets} билетов…", flush=True)
+        datagen.generate(f"sqlite:///{template}", args.tickets)
+        plan = _plan(template)
+        print("Кассы продают через сервис бронирования" if args.service else "Кассы пишут в файл базы напрямую")
+        print(f"Поезд {plan['train_id']}: {plan['total_seats']} мест, {DAYS} дней по {RUNS} пересекающихся рейса "
+              f"с {plan['departure']:%d.%m.%Y %H:%M}")
+        print(f"{'Касс':>5} {'Продано':>8} {'Отказ':>7} {'Занято':>7} {'Продаж/с':>9} {'Попыток/с':>10} "
+              f"{'Медиана, мс':>12} {'p99, мс':>8}  Двойные продажи")
+
+        for writers in args.writers:
+            # Каждый прогон — на свежей копии базы
+            path = os.path.join(directory, f"stress-{writers}.db")
+            shutil.copyfile(template, path)
+            result = run(path, plan, writers, args.attempts, args.service)
+            doubles = double_bookings(path, plan)
+            stored = sold_in_test(path, plan)
+            attempts = writers * args.attempts
+            print(f"{writers:>5} {result['sold']:>8} {result['rejected']:>7} {result['busy']:>7} "
+                  f"{result['sold'] / result['elapsed_s']:>9.1f} {attempts / result['elapsed_s']:>10.1f} "
+                  f"{result['median_ms']:>12.1f} {result['p99_ms']:>8.1f}  {len(doubles)}", flush=True)
+            if doubles:
+                ok = False
+                for first, second, seat in doubles[:10]:
+                    print(f"      место {seat}: билеты {first} и {second}")
+            if stored != result["sold"]:
+                ok = False
+                print(f"      в базе {stored} билетов, а кассы продали {result['sold']}")
+            if result["failed"] or result["errors"]:
+                ok = False
+                print(f"      ошибок: {len(result['errors'])}", *result["errors"][:5], sep="\n      ")
+
+    print("Двойных продаж нет" if ok else "ОШИБКА: проверка не пройдена")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+# Генератор синтетической базы для бенчмарков.
+# Запуск из корня проекта: python -m bench.datagen bench.db --tickets 1000000
+#
+# Заполняет города, станции, поезда, кассиров, пассажиров и билеты правдоподобными
+# данными: у поезда свой маршрут и расписание, рейсы одного поезда не пересекаются и
+# заполнены на 50–95%, места на рейсе не повторяются, часть пассажиров ездит
+# несколько раз. Генерация детерминирована для одного и того же --seed.
+# Объём — от 10 тыс. до 5 млн билетов; остальное по умолчанию выводится из него.
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+
+import migrations
+from auth import get_password_hash
+from database import Base, make_engine
+from models import City, Passenger, Station, Ticket, Train, User
+
+MIN_TICKETS = 10_000
+MAX_TICKETS = 5_000_000
+
+# Сколько строк вставляется одним executemany
+CHUNK_SIZE = 50_000
+
+# Первый день расписания
+START_DATE = datetime(2026, 1, 1)
+
+# Пароли созданных пользователей (для бенчмарка входа)
+ADMIN_PASSWORD = "admin"
+CASHIER_PASSWORD = "cashier"
+
+CITIES = [
+    "Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань", "Нижний Новгород", "Самара", "Омск",
+    "Челябинск", "Ростов-на-Дону", "Уфа", "Красноярск", "Пермь", "Воронеж", "Волгоград", "Краснодар", "Саратов",
+    "Тюмень", "Тольятти", "Ижевск", "Барнаул", "Ульяновск", "Иркутск", "Хабаровск", "Ярославль", "Владивосток",
+    "Махачкала", "Томск", "Оренбург", "Кемерово", "Новокузнецк", "Рязань", "Астрахань", "Набережные Челны",
+    "Пенза", "Киров", "Липецк", "Чебоксары", "Калининград", "Тула",
+]
+STATION_KINDS = ["Главный", "Пассажирский", "Северный", "Южный"]
+
+TRAIN_NAMES = [
+    "Ласточка", "Сапсан", "Стриж", "Сибирь", "Россия", "Красная стрела", "Урал", "Байкал", "Енисей", "Волга",
+    "Кама", "Дон", "Кубань", "Жигули", "Татарстан", "Башкортостан", "Янтарь", "Амур", "Тайга", "Мегаполис",
+]
+# Вместимость поезда: сидячие экспрессы и составы из 10–20 вагонов
+TRAIN_SEATS = [200, 250, 300, 350, 400, 443, 450, 500, 600, 1000]
+
+MALE_FIRST = ["Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артём", "Илья", "Кирилл", "Михаил",
+              "Никита", "Матвей", "Роман", "Егор", "Иван", "Павел", "Владимир", "Николай", "Фёдор", "Юрий"]
+FEMALE_FIRST = ["Анастасия", "Мария", "Анна", "Виктория", "Екатерина", "Наталья", "Марина", "Полина", "Дарья",
+                "Алёна", "Ксения", "Елена", "Ольга", "Татьяна", "Юлия", "Ирина", "Софья", "Светлана", "Вера", "Алиса"]
+# Мужская форма фамилии; женская получается окончанием «а» или «ая»
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков",
+              "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов",
+              "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин", "Захаров", "Зайцев", "Соловьёв",
+              "Борисов", "Яковлев", "Григорьев", "Романов", "Воробьёв", "Сергеев", "Кузьмин", "Фролов",
+              "Александров", "Дмитриев", "Королёв", "Гусев", "Киселёв", "Ильин", "Максимов", "Поляков",
+              "Сорокин", "Виноградов", "Ковалёв", "Белов", "Медведев", "Антонов", "Тарасов", "Жуков", "Баранов",
+              "Филиппов", "Комаров", "Давыдов", "Беляев", "Герасимов", "Богданов", "Осипов", "Сидоров",
+              "Матвеев", "Титов", "Марков", "Миронов", "Крылов", "Куликов", "Карпов", "Власов", "Мельников",
+              "Денисов", "Гаврилов", "Тихонов", "Казаков", "Афанасьев", "Данилов", "Савельев", "Тимофеев",
+              "Фомин", "Чернов", "Абрамов", "Мартынов", "Ефимов", "Федотов", "Щербаков", "Назаров", "Калинин",
+              "Исаев", "Чернышёв", "Быков", "Маслов", "Родионов", "Коновалов", "Лазарев", "Воронин", "Климов",
+              "Филатов", "Пономарёв", "Голубев", "Кудрявцев", "Прохоров", "Наумов", "Потапов", "Журавлёв",
+              "Овчинников", "Трофимов", "Леонов", "Соболев", "Ермаков", "Колесников", "Гончаров", "Емельянов",
+              "Никифоров", "Грачёв", "Котов", "Гришин", "Ефремов", "Архипов", "Громов", "Кириллов", "Малышев",
+              "Панов", "Моисеев", "Румянцев", "Акимов", "Кондратьев", "Бирюков", "Горбунов", "Анисимов",
+              "Ершов", "Брагин", "Шевчук", "Толстой", "Достоевский", "Островский", "Лермонтов", "Чехов"]
+MIDDLE_NAMES = ["Александров", "Дмитриев", "Сергеев", "Андреев", "Алексеев", "Михайлов", "Иванов", "Павлов",
+                "Владимиров", "Николаев", "Юрьев", "Викторов", "Петров", "Олегов", "Игорев"]
+
+# Серия и номер паспорта: 9000 серий по 900000 номеров. Номер пассажира
+# переставляется умножением на простое число, поэтому паспорта уникальны,
+# но не идут подряд.
+PASSPORT_SPACE = 9000 * 900000
+PASSPORT_STEP = 2654435761
+
+
+def passport(index):
+    value = index * PASSPORT_STEP % PASSPORT_SPACE
+    return 1000 + value // 900000, 100000 + value % 900000
+
+
+def female_form(last_name):
+    if last_name.endswith("ий"):
+        return last_name[:-2] + "ая"
+    if last_name.endswith("ой"):
+        return last_name[:-2] + "ая"
+    if last_name.endswith(("ов", "ев", "ёв", "ин", "ын")):
+        return last_name + "а"
+    return last_name
+
+
+def passenger_values(rng, index):
+    series, number = passport(index)
+    last_name = rng.choice(LAST_NAMES)
+    middle_name = rng.choice(MIDDLE_NAMES)
+    if rng.random() < 0.5:
+        first_name = rng.choice(MALE_FIRST)
+        middle_name += "ич" if middle_name.endswith(("ев", "ов")) else "ович"
+    else:
+        first_name = rng.choice(FEMALE_FIRST)
+        last_name = female_form(last_name)
+        middle_name += "на" if middle_name.endswith(("ев", "ов")) else "овна"
+    return {
+        "first_name": first_name,
+        "last_name": last_name,
+        # У части пассажиров (иностранцы) отчества нет
+        "middle_name": middle_name if rng.random() < 0.95 else None,
+        "series_passport": series,
+        "number_passport": number,
+    }
+
+
+# Параметры по умолчанию для заданного числа билетов
+def default_volumes(tickets):
+    return {
+        # В среднем полтора билета на пассажира
+        "passengers": max(1, tickets * 2 // 3),
+        "trains": min(200, max(20, tickets // 25_000)),
+        "cashiers": min(200, max(5, tickets // 50_000)),
+    }
+
+
+def _insert_chunks(connection, table, rows, progress=None):
+    chunk = []
+    done = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            connection.execute(table.insert(), chunk)
+            done += len(chunk)
+            chunk = []
+            if progress:
+                progress(done)
+    if chunk:
+        connection.execute(table.insert(), chunk)
+        done += len(chunk)
+        if progress:
+            progress(done)
+    return done
+
+
+def _reference_data(rng, trains):
+    cities = [{"id": i, "name": name} for i, name in enumerate(CITIES, start=1)]
+    stations = [{"id": i, "name_station": f"{city['name']}-{kind}", "city_id": city["id"]}
+                for i, (city, kind) in enumerate(((city, kind) for city in cities for kind in STATION_KINDS),
+                                                 start=1)]
+    train_rows = []
+    for i in range(1, trains + 1):
+        number = f"{i:03d}"
+        name = TRAIN_NAMES[(i - 1) % len(TRAIN_NAMES)]
+        train_rows.append({"id": i, "train_name": f"{number} {name}", "total_seats": rng.choice(TRAIN_SEATS)})
+    return cities, stations, train_rows
+
+
+# Маршрут поезда: 2–8 станций в разных городах, часы в пути между соседними,
+# час отправления и период рейсов в сутках
+def _routes(rng, train_rows, stations):
+    by_city = {}
+    for station in stations:
+        by_city.setdefault(station["city_id"], []).append(station["id"])
+    routes = {}
+    for train in train_rows:
+        cities = rng.sample(sorted(by_city), rng.randint(2, 8))
+        route = [rng.choice(by_city[city]) for city in cities]
+        hours = [rng.randint(2, 14) for _ in route[1:]]
+        departure_hour = rng.randint(0, 23)
+        # Поезд ходит раз в несколько суток, если рейс длиннее: занятость мест
+        # считается по поезду, и рейсы одного поезда не должны пересекаться
+        period = (departure_hour + sum(hours)) // 24 + 1
+        routes[train["id"]] = (route, hours, departure_hour, period)
+    return routes
+
+
+# Билеты по дням: каждый поезд делает рейс раз в period суток, на рейс продаётся 50–95%
+# мест, каждое место — на случайный участок маршрута
+def _ticket_values(rng, tickets, passengers, train_rows, routes, cashiers):
+    made = 0
+    day = 0
+    while made < tickets:
+        for train in train_rows:
+            route, hours, departure_hour, period = routes[train["id"]]
+            if day % period:
+                continue
+            trip_start = START_DATE + timedelta(days=day, hours=departure_hour)
+            sold = int(train["total_seats"] * rng.uniform(0.5, 0.95))
+            for seat in rng.sample(range(1, train["total_seats"] + 1), sold):
+                first = rng.randrange(len(route) - 1)
+                last = rng.randrange(first + 1, len(route))
+                departure = trip_start + timedelta(hours=sum(hours[:first]))
+                arrival = trip_start + timedelta(hours=sum(hours[:last]))
+                # Часть пассажиров ездит часто: квадрат сдвигает выбор к началу
+                passenger_id = int(passengers * rng.random() ** 2) + 1
+                yield {
+                    "train_id": train["id"],
+                    "departure_station_id": route[first],
+                    "arrival_station_id": route[last],
+                    "passenger_id": passenger_id,
+                    "departure_time": departure,
+                    "arrival_time": arrival,
+                    "seat_number": seat,
+                    "cashier_id": rng.randint(1, cashiers + 1),
+                }
+                made += 1
+                if made >= tickets:
+                    return
+        day += 1
+
+
+# Создаёт схему и заполняет пустую базу по url. Возвращает число строк по таблицам.
+def generate(url, tickets, passengers=None, trains=None, cashiers=None, seed=1, log=None):
+    if not MIN_TICKETS <= tickets <= MAX_TICKETS:
+        raise ValueError(f"Число билетов должно быть от {MIN_TICKETS} до {MAX_TICKETS}")
+    volumes = default_volumes(tickets)
+    passengers = passengers or volumes["passengers"]
+    trains = trains or volumes["trains"]
+    cashiers = cashiers or volumes["cashiers"]
+    rng = random.Random(seed)
+
+    engine = make_engine("bulk-load", url)
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+
+    def report(name):
+        def progress(done):
+            if log:
+                log(f"{name}: {done}")
+        return progress
+
+    with engine.begin() as connection:
+        if connection.scalar(select(func.count()).select_from(Ticket)):
+            raise ValueError("База уже заполнена")
+        cities, stations, train_rows = _reference_data(rng, trains)
+        connection.execute(City.__table__.insert(), cities)
+        connection.execute(Station.__table__.insert(), stations)
+        connection.execute(Train.__table__.insert(), train_rows)
+
+        # Хеш bcrypt дорогой, поэтому у всех кассиров один пароль и один хеш
+        cashier_hash = get_password_hash(CASHIER_PASSWORD)
+        users = [{"username": "admin", "firstname": "Administrator", "lastname": "Administrator",
+                  "middle_name": "Administrator", "password": get_password_hash(ADMIN_PASSWORD),
+                  "email": "admin@db.local", "is_admin": True}]
+        for i in range(1, cashiers + 1):
+            values = passenger_values(rng, PASSPORT_SPACE - i)
+            users.append({"username": f"cashier{i}", "firstname": values["first_name"],
+                          "lastname": values["last_name"], "middle_name": values["middle_name"],
+                          "password": cashier_hash, "email": f"cashier{i}@db.local", "is_admin": False})
+        connection.execute(User.__table__.insert(), users)
+
+    with engine.begin() as connection:
+        _insert_chunks(connection, Passenger.__table__,
+                       (passenger_values(rng, i) for i in range(1, passengers + 1)), report("Пассажиры"))
+
+    routes = _routes(rng, train_rows, stations)
+    with engine.begin() as connection:
+        _insert_chunks(connection, Ticket.__table__,
+                       _ticket_values(rng, tickets, passengers, train_rows, routes, cashiers), report("Билеты"))
+
+    # Статистика планировщика для заполненных таблиц, как после долгой работы
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+    engine.dispose()
+    return {"cities": len(cities), "stations": len(stations), "trains": trains, "users": len(users),
+            "passengers": passengers, "tickets": tickets}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Синтетическая база для бенчмарков")
+    parser.add_argument("path", help="файл базы SQLite (не должен содержать билетов)")
+    parser.add_argument("--tickets", type=int, default=100_000,
+                        help=f"число билетов, от {MIN_TICKETS} до {MAX_TICKETS}")
+    parser.add_argument("--passengers", type=int, help="число пассажиров (по умолчанию 2/3 от билетов)")
+    parser.add_argument("--trains", type=int, help="число поездов")
+    parser.add_argument("--cashiers", type=int, help="число кассиров")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        counts = generate(f"sqlite:///{args.path}", args.tickets, args.passengers, args.trains, args.cashiers,
+                          args.seed, log=lambda message: print(message, flush=True))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(", ".join(f"{name}: {count}" for name, count in counts.items()),
+          f"— {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# Сравнение профилей движка из database.py.
+# Запуск из корня проекта: python -m bench.db_profiles [--rows 100000] [--seconds 5]
+#
+# Для каждого профиля на временном файле базы измеряются:
+#   * коммиты в секунду — отдельная транзакция на каждый билет, как при продаже в кассе;
+#   * строк в секунду — пакетная вставка executemany в одной транзакции;
+#   * задержка чтения (p50/p99) точечного запроса, пока в соседнем потоке идут коммиты,
+#     и число ошибок «database is locked».
+# Вывод SQL у профиля debug отключается, чтобы мерить базу, а не терминал.
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from database import PROFILES, Base, make_engine
+from models import Ticket
+
+
+def ticket_values(i):
+    departure = datetime(2026, 1, 1) + timedelta(minutes=i)
+    return {
+        "train_id": i % 10 + 1,
+        "departure_station_id": 1,
+        "arrival_station_id": 2,
+        "passenger_id": i + 1,
+        "departure_time": departure,
+        "arrival_time": departure + timedelta(hours=6),
+        "seat_number": i % 400 + 1,
+        "cashier_id": 1,
+    }
+
+
+def measure_commits(engine, count):
+    started = time.perf_counter()
+    for i in range(count):
+        with engine.begin() as connection:
+            connection.execute(Ticket.__table__.insert(), ticket_values(i))
+    return count / (time.perf_counter() - started)
+
+
+def measure_bulk(engine, rows, offset):
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(Ticket.__table__.insert(), [ticket_values(offset + i) for i in range(rows)])
+    return rows / (time.perf_counter() - started)
+
+
+def measure_reads_under_writes(engine, seconds, max_id):
+    stop = threading.Event()
+    write_errors = []
+
+    def writer():
+        i = max_id
+        while not stop.is_set():
+            try:
+                with engine.begin() as connection:
+                    connection.execute(Ticket.__table__.insert(), ticket_values(i))
+            except OperationalError as e:
+                write_errors.append(e)
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+
+    latencies = []
+    read_errors = 0
+    query = select(Ticket.id, Ticket.seat_number, Ticket.departure_time).where(Ticket.id == 0)
+    deadline = time.perf_counter() + seconds
+    with engine.connect() as connection:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.execute(query.where(Ticket.id == random.randint(1, max_id))).all()
+                connection.rollback()
+            except OperationalError:
+                read_errors += 1
+                connection.rollback()
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    stop.set()
+    thread.join()
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) if latencies else None,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] if latencies else None,
+        "reads": len(latencies),
+        "locked_errors": read_errors + len(write_errors),
+    }
+
+
+def run_profile(profile, rows, commits, seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(profile, f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        engine.echo = False
+        Base.metadata.create_all(bind=engine)
+
+        result = {"profile": profile}
+        result["commits_per_s"] = measure_commits(engine, commits)
+        result["bulk_rows_per_s"] = measure_bulk(engine, rows, commits)
+        result.update(measure_reads_under_writes(engine, seconds, commits + rows))
+        engine.dispose()
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение профилей SQLite")
+    parser.add_argument("--rows", type=int, default=100000, help="строк в пакетной вставке")
+    parser.add_argument("--commits", type=int, default=2000, help="одиночных транзакций")
+    parser.add_argument("--seconds", type=float, default=5, help="длительность теста чтения под записью")
+    parser.add_argument("--profile", action="append", choices=list(PROFILES), help="только указанные профили")
+    args = parser.parse_args(argv)
+
+    print(f"{'профиль':<12}{'коммит/с':>10}{'строк/с':>12}{'чтение p50, мс':>16}{'p99, мс':>10}"
+          f"{'чтений':>9}{'locked':>8}")
+    for profile in args.profile or list(PROFILES):
+        r = run_profile(profile, args.rows, args.commits, args.seconds)
+        p50 = f"{r['p50_ms']:.3f}" if r["reads"] else "—"
+        p99 = f"{r['p99_ms']:.3f}" if r["reads"] else "—"
+        print(f"{profile:<12}{r['commits_per_s']:>10.0f}{r['bulk_rows_per_s']:>12.0f}{p50:>16}{p99:>10}"
+              f"{r['reads']:>9}{r['locked_errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
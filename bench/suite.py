@@ -0,0 +1,420 @@
+# Бенчмарки основных операций кассы на синтетической базе.
+# Запуск из корня проекта: python -m bench.suite [--tickets 100000] [--update-baseline]
+#
+# База генерируется во временном файле (bench.datagen) или берётся готовая (--db).
+# Каждый сценарий выполняется в отдельном процессе: так пиковая память (RSS)
+# относится к одному сценарию, а кэши справочников и занятости мест начинают
+# с нуля. Интерфейс работает на платформе Qt offscreen, окно не показывается.
+#
+# Для сценария записываются время (медиана и все повторы), число SQL-запросов
+# (executemany — один запрос) и пиковый RSS процесса. Результат сохраняется в
+# JSON и сравнивается с эталоном bench/baseline.json для того же числа билетов:
+# рост времени или памяти больше допуска и любой рост числа запросов — регрессия,
+# команда завершается с кодом 1.
+import argparse
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# Допуски сравнения с эталоном. Разница меньше MIN_TIME_DELTA_S не считается
+# регрессией даже в процентах: короткие сценарии шумят сильнее.
+TIME_TOLERANCE = 0.25
+RSS_TOLERANCE = 0.20
+MIN_TIME_DELTA_S = 0.005
+
+# Стоимость bcrypt фиксируется, чтобы время входа не зависело от калибровки
+BCRYPT_ROUNDS = 10
+
+# Сколько операций выполняет один повтор сценария
+PAGES_TO_SCROLL = 5
+SEAT_CHECKS = 20
+BOOKINGS = 20
+LOGINS = 5
+
+SCENARIOS = {}
+
+
+def scenario(function):
+    SCENARIOS[function.__name__] = function
+    return function
+
+
+# --- Сценарии. Выполняются в дочернем процессе, где база уже настроена. ---
+# Сценарий получает контекст и возвращает функцию одного замеряемого повтора;
+# подготовка до возврата в замер не входит.
+
+class Context:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self._app = None
+
+    @property
+    def app(self):
+        if self._app is None:
+            from PyQt6.QtWidgets import QApplication
+            self._app = QApplication.instance() or QApplication([])
+        return self._app
+
+    # Обрабатывает события Qt, пока не выполнится условие: ответы пула
+    # потоков доставляются в интерфейс через очередь событий
+    def wait_until(self, condition, timeout=600):
+        from ui.db_executor import get_executor
+        deadline = time.perf_counter() + timeout
+        executor = get_executor()
+        while not condition():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Сценарий не дождался ответа базы")
+            executor.wait(1)
+            self.app.processEvents()
+
+
+# Родитель главного окна: окну нужен только вошедший пользователь
+class _Session:
+    def __init__(self, user):
+        self.user = user
+
+
+def _admin():
+    from database import SessionLocal
+    from models import User
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == "admin").one()
+        db.expunge(user)
+        return user
+
+
+# Главное окно: первая страница списка и прокрутка на PAGES_TO_SCROLL страниц
+@scenario
+def load_data(context):
+    from ui.main_window import MainWindow
+    from ui.ticket_model import PAGE_SIZE
+    app = context.app
+    parent = _Session(_admin())
+
+    def run():
+        window = MainWindow(parent)
+        window.resize(1200, 800)
+        window.show()
+        model = window.model
+        context.wait_until(lambda: model.rowCount() > 0 and not model._loading)
+        for _ in range(PAGES_TO_SCROLL):
+            if not model.canFetchMore():
+                break
+            # Представление само просит следующую страницу, дойдя до конца
+            target = model.rowCount() + PAGE_SIZE
+            window.table.scrollToBottom()
+            context.wait_until(lambda: not model._loading
+                               and (model.rowCount() >= target or not model.canFetchMore()))
+        window.close()
+        window.deleteLater()
+        app.processEvents()
+
+    return run
+
+
+# Экспорт всей базы в Excel
+@scenario
+def export_to_excel(context):
+    import exporter
+    directory = tempfile.mkdtemp()
+
+    def run():
+        exporter.export_tickets(os.path.join(directory, "export.xlsx"))
+
+    return run
+
+
+# Проверка свободных мест для SEAT_CHECKS рейсов разных поездов, как при
+# открытии формы билета; кэш занятости каждый повтор начинается с нуля
+@scenario
+def check_available_seats(context):
+    from sqlalchemy import func, select
+    import booking
+    import seats
+    from database import SessionLocal
+    from models import Ticket
+
+    with SessionLocal() as db:
+        trips = db.execute(
+            select(Ticket.train_id, Ticket.departure_time, Ticket.arrival_time)
+            .where(Ticket.id.in_(select(func.min(Ticket.id)).group_by(Ticket.train_id)))
+        ).all()
+    trips = list(itertools.islice(itertools.cycle(trips), SEAT_CHECKS))
+
+    def run():
+        seats.inventory.clear()
+        for train_id, departure, arrival in trips:
+            with SessionLocal() as db:
+                booking.available_seats(db, train_id, departure, arrival)
+
+    return run
+
+
+# Оформление BOOKINGS билетов новым пассажирам, каждый в своей сессии, как из формы.
+# Рейсы — после последнего в базе, поэтому места свободны и при повторном запуске.
+@scenario
+def save_ticket(context):
+    from sqlalchemy import func, select
+    import booking
+    import refdata
+    from database import SessionLocal
+    from models import Passenger, Ticket
+
+    with SessionLocal() as db:
+        last_departure = db.scalar(select(func.max(Ticket.arrival_time))) or datetime.now()
+        next_passenger = (db.scalar(select(func.max(Passenger.id))) or 0) + 1
+        reference = refdata.cache.get(db)
+    train = next(iter(reference.trains.values()))
+    departure_station, arrival_station = list(reference.stations)[:2]
+    start = last_departure.replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    runs = itertools.count()
+
+    def run():
+        nonlocal next_passenger
+        departure = start + timedelta(days=next(runs))
+        for seat in range(1, BOOKINGS + 1):
+            # Серии до 1000 генератор не выдаёт, поэтому паспорта новые
+            series, number = divmod(next_passenger, 900000)
+            next_passenger += 1
+            with SessionLocal() as db:
+                booking.save_ticket(db, {
+                    "train_id": train.id,
+                    "seat_number": seat,
+                    "departure_time": departure,
+                    "arrival_time": departure + timedelta(hours=8),
+                    "first_name": "Тест",
+                    "last_name": "Тестов",
+                    "middle_name": "Тестович",
+                    "series_passport": 100 + series,
+                    "number_passport": 100000 + number,
+                    "departure_station_id": departure_station,
+                    "arrival_station_id": arrival_station,
+                    "cashier_id": 1,
+                })
+
+    return run
+
+
+# LOGINS входов администратора
+@scenario
+def authenticate_user(context):
+    import auth
+    from bench.datagen import ADMIN_PASSWORD
+    from database import SessionLocal
+
+    def run():
+        for _ in range(LOGINS):
+            with SessionLocal() as db:
+                if not auth.authenticate_user(db, "admin", ADMIN_PASSWORD):
+                    raise RuntimeError("Не удалось войти администратором")
+
+    return run
+
+
+def peak_rss_mb():
+    # На Linux ru_maxrss переживает exec и досталась бы от родителя,
+    # поэтому берём пик памяти самого процесса из /proc
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows: модуля resource нет, память не измеряется
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает КиБ, macOS — байты
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_scenario(name, repeat):
+    from sqlalchemy import event
+    from database import engine
+
+    queries = itertools.count()
+    event.listen(engine, "before_cursor_execute", lambda *args: next(queries))
+
+    run = SCENARIOS[name](Context(repeat))
+    times = []
+    counts = []
+    for _ in range(repeat):
+        before = next(queries)
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+        # next() сам занимает одно значение счётчика
+        counts.append(next(queries) - before - 1)
+    return {
+        "wall_s": statistics.median(times),
+        "min_s": min(times),
+        "runs_s": times,
+        "queries": max(counts),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# --- Родительский процесс: база, запуск сценариев, сравнение с эталоном ---
+
+def child_environment(db_path):
+    env = dict(os.environ)
+    env["CASHIER_DB_URL"] = f"sqlite:///{db_path}"
+    env["CASHIER_DB_PROFILE"] = "production"
+    env["QT_QPA_PLATFORM"] = "offscreen"
+    env.setdefault("CASHIER_BCRYPT_ROUNDS", str(BCRYPT_ROUNDS))
+    return env
+
+
+def run_in_child(name, db_path, repeat):
+    completed = subprocess.run(
+        [sys.executable, "-m", "bench.suite", "--child", name, "--repeat", str(repeat)],
+        cwd=PROJECT_DIR, env=child_environment(db_path), stdout=subprocess.PIPE, text=True,
+    )
+    if completed.returncode:
+        raise RuntimeError(f"Сценарий {name} завершился с ошибкой (код {completed.returncode})")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(result, baseline, time_tolerance=TIME_TOLERANCE, rss_tolerance=RSS_TOLERANCE):
+    regressions = []
+    for name, current in result["scenarios"].items():
+        previous = baseline["scenarios"].get(name)
+        if previous is None:
+            continue
+        limit = previous["wall_s"] * (1 + time_tolerance)
+        if current["wall_s"] > limit and current["wall_s"] - previous["wall_s"] > MIN_TIME_DELTA_S:
+            regressions.append(f"{name}: время {current['wall_s']:.3f} с, эталон {previous['wall_s']:.3f} с "
+                               f"(+{current['wall_s'] / previous['wall_s'] - 1:.0%})")
+        if current["queries"] > previous["queries"]:
+            regressions.append(f"{name}: запросов {current['queries']}, эталон {previous['queries']}")
+        if current["peak_rss_mb"] and previous.get("peak_rss_mb") \
+                and current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + rss_tolerance):
+            regressions.append(f"{name}: память {current['peak_rss_mb']:.0f} МиБ, "
+                               f"эталон {previous['peak_rss_mb']:.0f} МиБ")
+    return regressions
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def print_table(result, baseline):
+    print(f"{'сценарий':<24}{'время, с':>10}{'эталон, с':>11}{'запросов':>10}{'эталон':>8}{'RSS, МиБ':>10}")
+    for name, r in result["scenarios"].items():
+        b = (baseline or {}).get("scenarios", {}).get(name, {})
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] else "—"
+        base_time = f"{b['wall_s']:.3f}" if b else "—"
+        base_queries = str(b["queries"]) if b else "—"
+        print(f"{name:<24}{r['wall_s']:>10.3f}{base_time:>11}{r['queries']:>10}{base_queries:>8}{rss:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки операций кассы")
+    parser.add_argument("--tickets", type=int, default=10_000, help="объём сгенерированной базы, билетов")
+    parser.add_argument("--db", help="готовая база вместо сгенерированной (сценарий save_ticket её дополняет)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждого сценария")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="только указанные сценарии")
+    parser.add_argument("--output", help="файл результата JSON (по умолчанию bench/results/...)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="файл эталонов")
+    parser.add_argument("--update-baseline", action="store_true", help="записать результат как эталон")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--rss-tolerance", type=float, default=RSS_TOLERANCE)
+    parser.add_argument("--child", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args.repeat)))
+        return 0
+
+    os.environ.setdefault("CASHIER_BCRYPT_ROUNDS", str(BCRYPT_ROUNDS))
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = args.db
+        if db_path is None:
+            from bench import datagen
+            db_path = os.path.join(directory, "bench.db")
+            started = time.perf_counter()
+            datagen.generate(f"sqlite:///{db_path}", args.tickets, seed=args.seed)
+            print(f"База: {args.tickets} билетов за {time.perf_counter() - started:.1f} с")
+        with sqlite3.connect(db_path) as connection:
+            tickets = connection.execute('SELECT count(*) FROM "Tickets"').fetchone()[0]
+
+        result = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "tickets": tickets,
+            "repeat": args.repeat,
+            "environment": environment_info(),
+            "scenarios": {},
+        }
+        # save_ticket дописывает билеты, поэтому он идёт после остальных
+        names = [name for name in SCENARIOS if not args.scenario or name in args.scenario]
+        for name in names:
+            result["scenarios"][name] = run_in_child(name, db_path, args.repeat)
+
+    # Эталоны хранятся по объёму базы: числа для 10 тыс. и 1 млн билетов несравнимы
+    volume = str(args.tickets if args.db is None else tickets)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{volume}.json")
+    save_json(output, result)
+
+    baselines = load_baselines(args.baseline)
+    baseline = baselines.get(volume)
+    print_table(result, baseline)
+    print(f"Результат: {output}")
+
+    if args.update_baseline:
+        baselines[volume] = result
+        save_json(args.baseline, baselines)
+        print(f"Эталон для {volume} билетов записан в {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"Эталона для {volume} билетов нет — сравнение пропущено (--update-baseline, чтобы записать)")
+        return 0
+
+    regressions = compare(result, baseline, args.time_tolerance, args.rss_tolerance)
+    if regressions:
+        print("\nРЕГРЕССИЯ ПРОИЗВОДИТЕЛЬНОСТИ:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    print("Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
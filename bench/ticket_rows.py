@@ -0,0 +1,112 @@
+# Память и скорость хранилища строк списка билетов (ui/ticket_rows.py).
+# Запуск из корня проекта: python -m bench.ticket_rows [--rows 1000000] [--compare 100000]
+#
+# Строки создаются генератором с ФИО и паспортами как в bench.datagen и по одной
+# добавляются в TicketRows — так же, как их добавляет модель таблицы при прокрутке.
+# Память считается через tracemalloc. Для сравнения --compare строк хранится
+# по-старому: десять готовых строк ячеек, ключ сортировки и словарь id → ключ.
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from bench import datagen
+from ui.ticket_rows import TicketRows
+import repository
+
+Row = namedtuple("Row", [
+    "id", "first_name", "middle_name", "last_name", "series_passport", "number_passport", "train_name",
+    "seat_number", "departure_station", "arrival_station", "departure_time", "arrival_time",
+    "cashier_lastname", "cashier_firstname", "cashier_middle_name",
+])
+
+TRAINS = 200
+STATIONS = 300
+CASHIERS = 50
+# Сколько строк видно на экране: столько строк отрисовывается за раз
+SCREEN_ROWS = 40
+
+
+def rows(count, seed=1):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    for ticket_id in range(1, count + 1):
+        passenger = datagen.passenger_values(rng, rng.randrange(1, count))
+        departure = start + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        yield Row(
+            ticket_id, passenger["first_name"], passenger["middle_name"], passenger["last_name"],
+            passenger["series_passport"], passenger["number_passport"], f"{rng.randrange(TRAINS):03d} Поезд",
+            rng.randint(1, 600), f"Станция {rng.randrange(STATIONS)}", f"Станция {rng.randrange(STATIONS)}",
+            departure, departure + timedelta(hours=rng.randint(1, 48)),
+            f"Кассиров{rng.randrange(CASHIERS)}", "Кассир", "Кассирович",
+        )
+
+
+# Прежнее хранение в модели: текст всех ячеек строки, ключ и индекс по id
+def old_layout(count):
+    keys, ids, texts, key_by_id = [], [], [], {}
+    for row in rows(count):
+        key = (row.id,)
+        keys.append(key)
+        ids.append(row.id)
+        texts.append([
+            str(row.id), repository.passenger_full_name(row), repository.passport(row), row.train_name,
+            str(row.seat_number), row.departure_station, row.arrival_station,
+            row.departure_time.strftime("%Y-%m-%d %H:%M"), row.arrival_time.strftime("%Y-%m-%d %H:%M"),
+            repository.cashier_full_name(row),
+        ])
+        key_by_id[row.id] = key
+    return keys, ids, texts, key_by_id
+
+
+def measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def fill(count):
+    store = TicketRows()
+    for row in rows(count):
+        store.append(store.encode(row))
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Память хранилища строк списка билетов")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="строк в хранилище")
+    parser.add_argument("--compare", type=int, default=100_000, help="строк для замера прежнего хранения")
+    args = parser.parse_args(argv)
+
+    store, size, elapsed = measure(lambda: fill(args.rows))
+    print(f"TicketRows: {args.rows} строк — {size / 2**20:.1f} МиБ ({size / args.rows:.0f} байт на строку), "
+          f"заполнение {elapsed:.1f} с (под tracemalloc)")
+
+    started = time.perf_counter()
+    middle = len(store) // 2
+    for position in range(middle, middle + SCREEN_ROWS):
+        for column in range(10):
+            store.text(position, column)
+    print(f"Отрисовка экрана ({SCREEN_ROWS} строк): {(time.perf_counter() - started) * 1000:.2f} мс")
+
+    started = time.perf_counter()
+    store.find(args.rows // 3)
+    print(f"Поиск строки по id: {(time.perf_counter() - started) * 1000:.3f} мс")
+    del store
+
+    if args.compare:
+        _, size, _ = measure(lambda: old_layout(args.compare))
+        print(f"Прежнее хранение: {args.compare} строк — {size / 2**20:.1f} МиБ ({size / args.compare:.0f} байт "
+              f"на строку), на {args.rows} строк ≈ {size / args.compare * args.rows / 2**20:.0f} МиБ")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+from datetime import timedelta
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import immediate_transaction
+from models import Passenger, Ticket, current_revision
+import refdata
+import repository
+import seats
+
+# Сколько билетов с занятыми местами перечислять в сообщении массового изменения
+CONFLICTS_SHOWN = 5
+
+
+# Ошибка проверки при оформлении билета; текст показывается пользователю
+class BookingError(Exception):
+    pass
+
+
+def find_train(db: Session, train_id: int) -> refdata.TrainRef:
+    train = refdata.cache.get(db).trains.get(train_id)
+    if not train:
+        raise BookingError("Поезд не найден")
+    return train
+
+
+def available_seats(db: Session, train_id: int, departure_time, arrival_time, exclude_id=None):
+    train = find_train(db, train_id)
+    return train.total_seats, seats.inventory.trip(db, train, departure_time, arrival_time, exclude_id)
+
+
+# Создаёт билет или, если в форме есть ticket_id, изменяет существующий.
+# form — словарь значений полей формы TicketDialog.
+# Проверка места и запись идут в одной транзакции с блокировкой записи, поэтому
+# две кассы не продадут одно место; уникальный индекс ux_Tickets_seat — страховка
+# от клиентов, которые пишут в базу в обход этой функции.
+def save_ticket(db: Session, form: dict) -> int:
+    with immediate_transaction(db):
+        return write_ticket(db, form)
+
+
+# То же внутри уже открытой транзакции записи: сервис (service.py) так
+# записывает несколько билетов одним коммитом
+def write_ticket(db: Session, form: dict) -> int:
+    train = find_train(db, form["train_id"])
+
+    seat_number = form["seat_number"]
+    departure_time = form["departure_time"]
+    arrival_time = form["arrival_time"]
+    if arrival_time <= departure_time:
+        raise BookingError("Время прибытия должно быть позже времени отправления!")
+
+    stations = refdata.cache.get(db).stations
+    departure_station = stations.get(form["departure_station_id"])
+
+    if not departure_station:
+        raise BookingError("Станция отправления не найдена!")
+
+    arrival_station = stations.get(form["arrival_station_id"])
+
+    if not arrival_station:
+        raise BookingError("Станция прибытия не найдена!")
+
+    # Проверяем, не занято ли место на время этой поездки
+    own_id = form.get("ticket_id")
+    occupancy = seats.inventory.get(db, train)
+
+    if not occupancy.is_free(seat_number, departure_time, arrival_time, own_id):
+        seat_map = occupancy.bitmap(departure_time, arrival_time, own_id)
+        free_seat = seat_map.first_free(seat_number) or seat_map.first_free()
+        raise BookingError("Это место уже занято!" +
+                           (f" Ближайшее свободное место: {free_seat}" if free_seat else ""))
+
+    passenger = db.query(Passenger).filter(
+        Passenger.series_passport == form["series_passport"],
+        Passenger.number_passport == form["number_passport"],
+    ).first()
+
+    if not passenger:
+        passenger = Passenger(
+            first_name=form["first_name"],
+            last_name=form["last_name"],
+            middle_name=form["middle_name"],
+            number_passport=form["number_passport"],
+            series_passport=form["series_passport"],
+        )
+        db.add(passenger)
+        db.flush()
+
+    if not own_id:
+        ticket = Ticket(cashier_id=form["cashier_id"])
+        db.add(ticket)
+    else:
+        ticket = db.get(Ticket, own_id)
+        if not ticket:
+            raise BookingError("Билет не найден")
+
+    ticket.train_id = train.id
+    ticket.passenger_id = passenger.id
+    ticket.departure_station_id = departure_station.id
+    ticket.arrival_station_id = arrival_station.id
+    ticket.departure_time = departure_time
+    ticket.arrival_time = arrival_time
+    ticket.seat_number = seat_number
+    ticket.cashier_id = form["cashier_id"]
+    # Номер билета — до коммита, иначе после него объект перечитывается из базы
+    try:
+        db.flush()
+    except IntegrityError:
+        raise BookingError("Это место уже занято!")
+    return ticket.id
+
+
+# Массовое изменение выбранных билетов. changes — словарь с любыми из ключей:
+# train_id (пересадка на другой поезд с теми же местами), departure_station_id,
+# arrival_station_id и shift_minutes (сдвиг отправления и прибытия). Места
+# проверяются для всех билетов сразу, затем выполняется один UPDATE ... WHERE id IN
+# (...) на пачку id — всё в одной транзакции: либо меняются все билеты, либо ни
+# один. Возвращает число изменённых билетов.
+def update_tickets(db: Session, ticket_ids, changes: dict) -> int:
+    with immediate_transaction(db):
+        return change_tickets(db, ticket_ids, changes)
+
+
+# То же внутри уже открытой транзакции записи
+def change_tickets(db: Session, ticket_ids, changes: dict) -> int:
+    train = find_train(db, changes["train_id"]) if changes.get("train_id") is not None else None
+    stations = refdata.cache.get(db).stations
+    values = {}
+    for key, message in [("departure_station_id", "Станция отправления не найдена!"),
+                         ("arrival_station_id", "Станция прибытия не найдена!")]:
+        if changes.get(key) is not None:
+            if changes[key] not in stations:
+                raise BookingError(message)
+            values[key] = changes[key]
+    shift = timedelta(minutes=changes.get("shift_minutes") or 0)
+
+    tickets = [row for chunk in repository.chunks(ticket_ids) for row in db.execute(
+        select(Ticket.id, Ticket.train_id, Ticket.seat_number, Ticket.departure_time, Ticket.arrival_time)
+        .where(Ticket.id.in_(chunk))
+    )]
+    if not tickets:
+        return 0
+    if train is not None or shift:
+        _check_moved_seats(db, tickets, train, shift)
+
+    if train is not None:
+        values["train_id"] = train.id
+    if shift:
+        values["departure_time"] = _shifted(Ticket.departure_time, shift)
+        values["arrival_time"] = _shifted(Ticket.arrival_time, shift)
+    if not values:
+        return 0
+    values["revision"] = current_revision(db) + 1
+
+    # SQLite проверяет ux_Tickets_seat после каждой строки UPDATE, а не в конце:
+    # при сдвиге нескольких рейсов одного места на интервал между ними первый
+    # билет упёрся бы в старое время второго, который ещё не сдвинут. Поэтому
+    # при смене поезда или времени билеты сначала «паркуются» на отрицательных
+    # местах (-1 - место), которые ни с чем не совпадают, и только потом
+    # получают новые значения и свои места обратно.
+    parked = train is not None or bool(shift)
+    if parked:
+        values["seat_number"] = -1 - Ticket.seat_number
+    try:
+        if parked:
+            for chunk in repository.chunks(ticket.id for ticket in tickets):
+                db.execute(update(Ticket).where(Ticket.id.in_(chunk)).values(seat_number=-1 - Ticket.seat_number)
+                           .execution_options(synchronize_session=False))
+        for chunk in repository.chunks(ticket.id for ticket in tickets):
+            db.execute(update(Ticket).where(Ticket.id.in_(chunk)).values(values)
+                       .execution_options(synchronize_session=False))
+    except IntegrityError:
+        raise BookingError("Место уже занято другим билетом")
+    return len(tickets)
+
+
+# В SQLite нет интервалов: время сдвигается через strftime, а дробная часть секунд
+# переносится из исходной строки, чтобы значение осталось в формате SQLAlchemy
+# («ГГГГ-ММ-ДД ЧЧ:ММ:СС.ffffff») и сравнивалось с остальными как строка
+def _shifted(column, shift: timedelta):
+    seconds = int(shift.total_seconds())
+    return func.strftime("%Y-%m-%d %H:%M:%S", column, f"{seconds:+d} seconds").op("||")(func.substr(column, 20))
+
+
+# Новые места билетов не должны пересекаться ни с остальными билетами поезда,
+# ни друг с другом; старые места переносимых билетов считаются свободными
+def _check_moved_seats(db: Session, tickets, train, shift: timedelta):
+    moved = {ticket.id for ticket in tickets}
+    # Занятость поезда из общего кэша мест берётся один раз на поезд
+    occupancies = {}
+    batch = {}
+    conflicts = []
+    for ticket in tickets:
+        target = train or find_train(db, ticket.train_id)
+        seat = ticket.seat_number
+        start, end = ticket.departure_time + shift, ticket.arrival_time + shift
+        if seat > target.total_seats:
+            conflicts.append(f"№{ticket.id}: в поезде {target.train_name} нет места {seat}")
+            continue
+        if target.id not in occupancies:
+            occupancies[target.id] = seats.inventory.get(db, target)
+        occupancy = occupancies[target.id]
+        moved_before = batch.setdefault(target.id, seats.TrainOccupancy(target.id, target.total_seats))
+        if not occupancy.is_free(seat, start, end, exclude_ids=moved) or not moved_before.is_free(seat, start, end):
+            conflicts.append(f"№{ticket.id}: место {seat} занято")
+            continue
+        moved_before.add(ticket.id, seat, start, end)
+
+    if conflicts:
+        shown = "; ".join(conflicts[:CONFLICTS_SHOWN])
+        more = f" и ещё {len(conflicts) - CONFLICTS_SHOWN}" if len(conflicts) > CONFLICTS_SHOWN else ""
+        raise BookingError(f"Билеты не изменены, места заняты у {len(conflicts)} из {len(tickets)}: {shown}{more}")
@@ -0,0 +1,192 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import sessionmaker
+from database import make_engine, read_settings
+from models import Ticket, TicketArchive, Train, current_revision
+import exporter
+import repository
+
+# Выгрузка билетов для внешних систем: файлы (шарды) по поездам или дням
+# отправления в формате exporter.WRITERS, которые пишут параллельно отдельные
+# процессы, и манифест с числом строк и контрольной суммой каждого файла.
+
+MANIFEST = "manifest.json"
+
+# Как делить билеты на шарды: колонка ключа в "Tickets" (и в архиве)
+SHARD_KEYS = {
+    "train": lambda tickets: tickets.train_id,
+    "date": lambda tickets: func.date(tickets.departure_time),
+}
+
+# Шард: ключ для манифеста, имя файла без расширения, фильтр его билетов и
+# сколько в нём билетов по подсчёту перед выгрузкой
+Shard = namedtuple("Shard", ["key", "name", "ticket_filter", "rows"])
+ShardResult = namedtuple("ShardResult", ["file", "rows", "size", "sha256"])
+
+# Фабрика сессий процесса-исполнителя (см. _init_worker)
+_session_factory = None
+
+
+# Шарды по ключу by: по одному на поезд или на день отправления, в порядке ключа.
+# Билеты считаются по индексам с ключом в начале, не читая сами строки.
+def plan_shards(db, by: str, include_archive: bool = False):
+    counts = Counter()
+    for tickets in [Ticket, TicketArchive] if include_archive else [Ticket]:
+        key = SHARD_KEYS[by](tickets)
+        counts.update(dict(db.execute(select(key, func.count()).where(key.is_not(None)).group_by(key)).all()))
+
+    if by == "train":
+        train_names = dict(db.execute(select(Train.id, Train.train_name)).all())
+        return [Shard(train_names.get(train_id, str(train_id)), f"train_{train_id}",
+                      repository.TicketFilter(train_id=train_id, include_archive=include_archive), counts[train_id])
+                for train_id in sorted(counts)]
+    shards = []
+    for day in sorted(counts):
+        departure_date = date.fromisoformat(day)
+        shards.append(Shard(day, day, repository.TicketFilter(date_from=departure_date, date_to=departure_date,
+                                                              include_archive=include_archive), counts[day]))
+    return shards
+
+
+# Исполнитель открывает своё соединение с базой только для чтения
+# (PRAGMA query_only): выгрузка не может ничего изменить, а читатели в
+# режиме WAL не мешают кассам продавать билеты.
+def _init_worker(profile, url):
+    global _session_factory
+    engine = make_engine(profile, url)
+
+    @event.listens_for(engine, "connect")
+    def read_only(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA query_only = ON")
+
+    _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _sha256(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Пишет один шард в каталог directory (выполняется в процессе-исполнителе)
+def write_shard(shard: Shard, directory, fmt: str, compress: bool) -> ShardResult:
+    writer_class = exporter.WRITERS[fmt]
+    file = f"{shard.name}.{writer_class.extension}" + (".gz" if compress else "")
+    filename = os.path.join(directory, file)
+    rows = 0
+    with _session_factory() as db:
+        writer = writer_class(filename, compress)
+        try:
+            for ticket in repository.iter_ticket_rows(db, exporter.BATCH_SIZE, shard.ticket_filter.include_archive,
+                                                      shard.ticket_filter):
+                writer.write(exporter.ticket_values(ticket))
+                rows += 1
+        except BaseException:
+            writer.discard()
+            raise
+        writer.close()
+    return ShardResult(file, rows, os.path.getsize(filename), _sha256(filename))
+
+
+# Выгрузка в каталог directory: шарды по ключу by пишут workers процессов
+# (по умолчанию — по числу ядер), большие шарды начинаются первыми. Манифест
+# записывается последним, поэтому его наличие означает, что выгрузка завершена.
+# Каждый процесс читает свой снимок базы: билеты, проданные во время выгрузки,
+# могут попасть в одни шарды и не попасть в другие. progress(done, total)
+# вызывается после каждого шарда. Возвращает манифест.
+def export_shards(directory, fmt: str = "csv", by: str = "train", compress: bool = False,
+                  include_archive: bool = False, workers: int = None, profile: str = None, url: str = None,
+                  progress=None):
+    if compress and not exporter.WRITERS[fmt].compressible:
+        raise ValueError(f"Формат {fmt} не сжимается gzip")
+    default_profile, default_url = read_settings()
+    profile = profile or default_profile
+    url = url or default_url
+
+    engine = make_engine(profile, url)
+    with sessionmaker(bind=engine)() as db:
+        revision = current_revision(db)
+        shards = plan_shards(db, by, include_archive)
+    engine.dispose()
+
+    os.makedirs(directory, exist_ok=True)
+    manifest_file = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+
+    total = sum(shard.rows for shard in shards)
+    done = 0
+    results = {}
+    # spawn, а не fork: исполнители не наследуют соединения и потоки родителя
+    # и запускаются одинаково в Linux и Windows
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(profile, url)) as pool:
+        futures = {pool.submit(write_shard, shard, directory, fmt, compress): shard
+                   for shard in sorted(shards, key=lambda shard: shard.rows, reverse=True)}
+        try:
+            for future in as_completed(futures):
+                shard = futures[future]
+                results[shard.name] = future.result()
+                done += shard.rows
+                if progress:
+                    progress(done, total)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    manifest = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": revision,
+        "format": fmt,
+        "compression": "gzip" if compress else None,
+        "shard_by": by,
+        "include_archive": include_archive,
+        "rows": sum(result.rows for result in results.values()),
+        "shards": [dict(key=shard.key, **results[shard.name]._asdict()) for shard in shards],
+    }
+    with open(manifest_file + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(manifest_file + ".tmp", manifest_file)
+    return manifest
+
+
+# python bulk_export.py КАТАЛОГ [--format csv|jsonl|xlsx] [--by train|date] [--gzip]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Параллельная выгрузка билетов по поездам или дням отправления")
+    parser.add_argument("directory", help="каталог для файлов и манифеста")
+    parser.add_argument("--format", choices=list(exporter.WRITERS), default="csv")
+    parser.add_argument("--by", choices=list(SHARD_KEYS), default="train",
+                        help="файл на каждый поезд (train) или день отправления (date)")
+    parser.add_argument("--gzip", action="store_true", help="сжать файлы gzip (кроме xlsx)")
+    parser.add_argument("--include-archive", action="store_true", help="выгрузить и архивные билеты")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов; по умолчанию — по числу ядер")
+    parser.add_argument("--profile", default=None, help="профиль базы данных из database.py")
+    args = parser.parse_args(argv)
+    if args.gzip and not exporter.WRITERS[args.format].compressible:
+        parser.error(f"формат {args.format} не сжимается gzip")
+
+    started = time.perf_counter()
+    manifest = export_shards(args.directory, args.format, args.by, args.gzip, args.include_archive, args.workers,
+                             args.profile,
+                             progress=lambda done, total: print(f"\rВыгружено билетов: {done} из {total}", end="",
+                                                                file=sys.stderr))
+    print(file=sys.stderr)
+    print(f"Выгружено билетов: {manifest['rows']} в {len(manifest['shards'])} файлов "
+          f"за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
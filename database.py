@@ -1,12 +1,167 @@
-from sqlalchemy import create_engine
+import configparser
+import os
+import random
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./cashier.db"
+DEFAULT_DATABASE_URL = "sqlite:///./cashier.db"
+DEFAULT_PROFILE = "production"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, echo=True
-)
+# Файл настроек (необязательный), секция [database]:
+#   profile = production | bulk-load | debug
+#   url = sqlite:///./cashier.db
+# Переменные окружения CASHIER_DB_PROFILE и CASHIER_DB_URL имеют приоритет над файлом.
+CONFIG_FILE = os.environ.get("CASHIER_CONFIG", "cashier.ini")
+
+# Профили движка. pragmas выполняются на каждом новом соединении:
+#   journal_mode=WAL — читатели не блокируют писателя и наоборот;
+#   synchronous — сколько fsync на коммит (NORMAL в WAL безопасен для целостности базы);
+#   cache_size — страничный кэш, отрицательное значение в КиБ;
+#   mmap_size — чтение файла базы через отображение в память;
+#   temp_store=MEMORY — временные таблицы и сортировки в памяти;
+#   busy_timeout — сколько мс ждать освобождения блокировки вместо мгновенной ошибки.
+PROFILES = {
+    "production": {
+        "echo": False,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -65536,
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,
+        },
+    },
+    # Массовая загрузка: без fsync на коммит и с большим кэшем. При сбое питания
+    # последние транзакции могут пропасть, поэтому только для импорта с повтором.
+    "bulk-load": {
+        "echo": False,
+        "pool_size": 2,
+        "max_overflow": 0,
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "OFF",
+            "cache_size": -262144,
+            "mmap_size": 1073741824,
+            "temp_store": "MEMORY",
+            "busy_timeout": 30000,
+        },
+    },
+    # Отладка: журнал по умолчанию, полный fsync и вывод всех запросов
+    "debug": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pragmas": {
+            "journal_mode": "DELETE",
+            "synchronous": "FULL",
+            "busy_timeout": 5000,
+        },
+    },
+}
+
+
+def read_settings():
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE, encoding="utf-8")
+    section = config["database"] if config.has_section("database") else {}
+
+    profile = os.environ.get("CASHIER_DB_PROFILE") or section.get("profile") or DEFAULT_PROFILE
+    url = os.environ.get("CASHIER_DB_URL") or section.get("url") or DEFAULT_DATABASE_URL
+    if profile not in PROFILES:
+        raise ValueError(f"Неизвестный профиль базы данных: {profile}. Доступны: {', '.join(PROFILES)}")
+    return profile, url
+
+
+def is_memory_url(url) -> bool:
+    url = make_url(url)
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def make_engine(profile=None, url=None):
+    if profile is None or url is None:
+        default_profile, default_url = read_settings()
+        profile = profile or default_profile
+        url = url or default_url
+    settings = PROFILES[profile]
+    pragmas = settings["pragmas"]
+
+    # Размер пула — только для файла базы: база в памяти (sqlite://) живёт в
+    # SingletonThreadPool, который этих параметров не принимает
+    pool = {} if is_memory_url(url) else {
+        "pool_size": settings["pool_size"],
+        "max_overflow": settings["max_overflow"],
+    }
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        echo=settings["echo"],
+        **pool,
+    )
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    # Обновляет статистику планировщика (ANALYZE) для таблиц, которые заметно
+    # выросли; без неё SQLite плохо выбирает индекс для фильтров списка
+    @event.listens_for(engine, "close")
+    def optimize(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA optimize")
+
+    return engine
+
+
+# Сколько раз повторить захват блокировки записи, если база занята другими
+# кассами дольше busy_timeout, и пауза перед первым повтором (дальше удваивается)
+BUSY_RETRIES = 3
+BUSY_BACKOFF_S = 0.05
+
+
+# SQLITE_BUSY («database is locked») и SQLITE_LOCKED («database table is locked»)
+def is_busy(error: OperationalError) -> bool:
+    return "is locked" in str(error.orig)
+
+
+# Транзакция с блокировкой записи с самого начала (BEGIN IMMEDIATE). Проверки и
+# запись внутри блока видят одно состояние базы: ни одна другая касса не может
+# записать между ними. Захват ждёт освобождения базы сам (busy_timeout); если
+# и этого не хватило, он повторяется с экспоненциальной паузой и случайным
+# разбросом, чтобы ждущие кассы не просыпались одновременно. В режиме WAL после
+# захвата блокировки транзакция уже не получит SQLITE_BUSY, поэтому тело блока
+# не повторяется.
+@contextmanager
+def immediate_transaction(db: Session, retries: int = BUSY_RETRIES, backoff: float = BUSY_BACKOFF_S):
+    for attempt in range(retries + 1):
+        try:
+            db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            break
+        except OperationalError as e:
+            db.rollback()
+            if not is_busy(e) or attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+    try:
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+
+SQLALCHEMY_PROFILE, SQLALCHEMY_DATABASE_URL = read_settings()
+
+engine = make_engine(SQLALCHEMY_PROFILE, SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
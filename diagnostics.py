@@ -0,0 +1,179 @@
+import contextvars
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+from migrations import is_full_scan
+
+# Запрос дольше порога (мс) попадает в журнал медленных запросов вместе с планом
+SLOW_QUERY_MS = float(os.environ.get("CASHIER_SLOW_QUERY_MS", 100))
+# Сколько последних действий и медленных запросов хранится в памяти
+HISTORY_SIZE = 200
+# Сколько самых медленных запросов запоминается для каждого действия
+SLOWEST_PER_ACTION = 5
+
+# План строится только для запросов с данными; PRAGMA, BEGIN и т.п. пропускаются
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+log = logging.getLogger("cashier.slow_queries")
+
+SlowQuery = namedtuple("SlowQuery", ["at", "action", "duration_ms", "statement", "parameters", "plan"])
+
+# Действие пользователя, к которому относятся запросы текущего кода. Пул потоков
+# базы (DbExecutor) переносит его в фоновый поток вместе с задачей.
+_current_action = contextvars.ContextVar("diagnostics_action", default=None)
+
+
+# Запросы одного действия: число, суммарное время в базе и самые медленные
+class ActionStats:
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        # Конец последнего запроса: действие продолжается, пока идут его фоновые запросы
+        self.finished = self.started
+        self.queries = 0
+        self.db_time = 0.0
+        self._slowest = []
+
+    @property
+    def duration(self):
+        return self.finished - self.started
+
+    def slowest(self):
+        return sorted(self._slowest, reverse=True)
+
+    def _record(self, duration, statement):
+        self.queries += 1
+        self.db_time += duration
+        self.finished = time.perf_counter()
+        if len(self._slowest) < SLOWEST_PER_ACTION:
+            heapq.heappush(self._slowest, (duration, statement))
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (duration, statement))
+
+
+# Сводка по однотипным действиям из истории
+ActionSummary = namedtuple("ActionSummary", ["name", "count", "queries", "db_time", "max_db_time"])
+
+
+# Счётчик запросов по действиям. Подключается к движку событиями курсора и
+# почти ничего не стоит: на запрос — два замера времени и сложение под блокировкой.
+class QueryTracer:
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, history=HISTORY_SIZE):
+        self.slow_query_ms = slow_query_ms
+        self.actions = deque(maxlen=history)
+        self.slow_queries = deque(maxlen=history)
+        # Запросы вне действий: фоновая подгрузка справочников и т.п.
+        self.unattributed = ActionStats("Без действия")
+        self._lock = threading.Lock()
+
+    def install(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    # Запросы внутри блока, в том числе отправленные из него в DbExecutor,
+    # считаются запросами действия name
+    @contextmanager
+    def action(self, name):
+        stats = ActionStats(name)
+        with self._lock:
+            self.actions.append(stats)
+        token = _current_action.set(stats)
+        try:
+            yield stats
+        finally:
+            _current_action.reset(token)
+
+    @staticmethod
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        context._diagnostics_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_diagnostics_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        stats = _current_action.get() or self.unattributed
+        with self._lock:
+            stats._record(duration, statement)
+        if duration * 1000 >= self.slow_query_ms:
+            self._log_slow(stats.name, duration, cursor, statement, parameters, executemany)
+
+    def _log_slow(self, action, duration, cursor, statement, parameters, executemany):
+        if executemany:
+            plan = []
+            described = f"{len(parameters)} наборов параметров"
+        else:
+            plan = explain(cursor.connection, statement, parameters)
+            described = describe_parameters(parameters)
+        entry = SlowQuery(datetime.now(), action, duration * 1000, statement, described, plan)
+        with self._lock:
+            self.slow_queries.append(entry)
+        log.warning("Медленный запрос (%s, %.0f мс): %s; параметры: %s; план: %s",
+                    action, entry.duration_ms, statement, described, " | ".join(plan))
+
+    # Копии для показа: действия от новых к старым и медленные запросы
+    def snapshot(self):
+        with self._lock:
+            return list(reversed(self.actions)), list(reversed(self.slow_queries))
+
+    def summary(self):
+        totals = {}
+        actions, _ = self.snapshot()
+        for stats in actions:
+            count, queries, db_time, max_db_time = totals.get(stats.name, (0, 0, 0.0, 0.0))
+            totals[stats.name] = (count + 1, queries + stats.queries, db_time + stats.db_time,
+                                  max(max_db_time, stats.db_time))
+        rows = [ActionSummary(name, *values) for name, values in totals.items()]
+        with self._lock:
+            rows.append(ActionSummary(self.unattributed.name, 0, self.unattributed.queries,
+                                      self.unattributed.db_time, 0.0))
+        return sorted(rows, key=lambda row: row.db_time, reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self.actions.clear()
+            self.slow_queries.clear()
+            self.unattributed = ActionStats(self.unattributed.name)
+
+
+# Параметры запроса для журнала и панели диагностики: только число и типы.
+# Значения — ФИО, паспорта — в журнал не попадают.
+def describe_parameters(parameters) -> str:
+    if not parameters:
+        return "нет"
+    if isinstance(parameters, dict):
+        types = [f"{name}: {type(value).__name__}" for name, value in parameters.items()]
+    else:
+        types = [type(value).__name__ for value in parameters]
+    return f"{len(types)} ({', '.join(types)})"
+
+
+# План выполняется на том же соединении и с теми же параметрами, что и запрос
+def explain(dbapi_connection, statement, parameters=()):
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return []
+    try:
+        rows = dbapi_connection.execute("EXPLAIN QUERY PLAN " + statement, parameters or ()).fetchall()
+    except sqlite3.Error as e:
+        return [f"План не получен: {e}"]
+    return [row[-1] for row in rows]
+
+
+# Полный просмотр таблицы в плане. Просмотр подзапросов и CTE, которые план сам
+# материализует (MATERIALIZE, CO-ROUTINE), таблицей не считается.
+def has_full_scan(entry: SlowQuery) -> bool:
+    derived = {"CONSTANT"}
+    derived.update(step.split()[1] for step in entry.plan if step.startswith(("MATERIALIZE ", "CO-ROUTINE ")))
+    return is_full_scan([step for step in entry.plan
+                         if not (step.startswith("SCAN ") and step.split()[1] in derived)])
+
+
+tracer = QueryTracer()
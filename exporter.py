@@ -0,0 +1,171 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from database import SessionLocal
+import repository
+
+HEADERS = ["ID", "ФИО", "Паспорт", "Название поезда", "Место", "Станция отправления", "Станция прибытия",
+           "Время отправления", "Время прибытия"]
+
+# Имена полей тех же колонок в JSON Lines
+FIELDS = ["id", "passenger", "passport", "train", "seat_number", "departure_station", "arrival_station",
+          "departure_time", "arrival_time"]
+
+# Ограничение Excel на число строк в одном листе (вместе с заголовком)
+EXCEL_MAX_ROWS = 1048576
+
+# Сколько строк читаем из курсора за раз и как часто сообщаем о прогрессе
+BATCH_SIZE = 1000
+
+DATETIME_FORMAT = "YYYY-MM-DD HH:MM"
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+# Значения колонок HEADERS для строки билета (repository.ticket_rows_query)
+def ticket_values(ticket):
+    return [
+        ticket.id,
+        repository.passenger_full_name(ticket),
+        repository.passport(ticket),
+        ticket.train_name,
+        ticket.seat_number,
+        ticket.departure_station,
+        ticket.arrival_station,
+        ticket.departure_time,
+        ticket.arrival_time,
+    ]
+
+
+def _datetime_cell(ws, value):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.number_format = DATETIME_FORMAT
+    return cell
+
+
+def _new_sheet(wb, number):
+    ws = wb.create_sheet("Пассажиры" if number == 1 else f"Пассажиры {number}")
+    ws.append(HEADERS)
+    return ws
+
+
+# Текстовый файл, при compress — сжатый gzip. Время в заголовке gzip нулевое,
+# чтобы одинаковые данные давали одинаковый файл и контрольную сумму.
+def _open_text(filename, compress):
+    if compress:
+        return io.TextIOWrapper(gzip.GzipFile(filename, "wb", mtime=0), encoding="utf-8", newline="")
+    return open(filename, "w", encoding="utf-8", newline="")
+
+
+# Форматы выгрузки. Писатель открывает файл при создании, принимает строки
+# ticket_values через write() и дописывает файл в close(). compressible —
+# можно ли сжать файл gzip.
+
+# Потоковая книга Excel: write-only книга пишет строки сразу на диск, новый
+# лист — каждые max_rows строк
+class XlsxWriter:
+    extension = "xlsx"
+    compressible = False
+
+    def __init__(self, filename, compress=False, max_rows=EXCEL_MAX_ROWS):
+        if compress:
+            raise ValueError("Файл XLSX уже сжат, gzip к нему не применяется")
+        self.filename = filename
+        self.max_rows = max_rows
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = _new_sheet(self.wb, 1)
+        self.sheet_rows = 1
+
+    def write(self, values):
+        if self.sheet_rows >= self.max_rows:
+            self.ws = _new_sheet(self.wb, len(self.wb.worksheets) + 1)
+            self.sheet_rows = 1
+        self.ws.append([_datetime_cell(self.ws, value) if isinstance(value, datetime) else value for value in values])
+        self.sheet_rows += 1
+
+    def close(self):
+        self.wb.save(self.filename)
+
+    # Закрывает потоковые листы прерванной книги, чтобы освободить их временные файлы
+    def discard(self):
+        for ws in self.wb.worksheets:
+            ws.close()
+
+
+# CSV в UTF-8 с заголовками HEADERS; время — ГГГГ-ММ-ДД ЧЧ:ММ
+class CsvWriter:
+    extension = "csv"
+    compressible = True
+
+    def __init__(self, filename, compress=False):
+        self.stream = _open_text(filename, compress)
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(HEADERS)
+
+    def write(self, values):
+        self.writer.writerow([value.isoformat(" ", "minutes") if isinstance(value, datetime) else value
+                              for value in values])
+
+    def close(self):
+        self.stream.close()
+
+    def discard(self):
+        self.stream.close()
+
+
+# JSON Lines: объект с полями FIELDS на строку, время в ISO 8601
+class JsonlWriter:
+    extension = "jsonl"
+    compressible = True
+
+    def __init__(self, filename, compress=False):
+        self.stream = _open_text(filename, compress)
+
+    def write(self, values):
+        self.stream.write(json.dumps(dict(zip(FIELDS, values)), ensure_ascii=False, default=datetime.isoformat))
+        self.stream.write("\n")
+
+    def close(self):
+        self.stream.close()
+
+    def discard(self):
+        self.stream.close()
+
+
+WRITERS = {writer.extension: writer for writer in [XlsxWriter, CsvWriter, JsonlWriter]}
+
+
+# Потоковый экспорт: писатель пишет строки сразу на диск, а билеты
+# читаются из курсора пачками, поэтому память не растёт вместе с таблицей.
+# progress(done, total) и is_cancelled() вызываются раз в BATCH_SIZE строк.
+# include_archive — выгрузить и билеты из архива.
+def export_tickets(filename, progress=None, is_cancelled=None, max_rows=EXCEL_MAX_ROWS, include_archive=False):
+    writer = XlsxWriter(filename, max_rows=max_rows)
+    done = 0
+
+    with SessionLocal() as db:
+        total = repository.count_tickets(db, include_archive)
+        for ticket in repository.iter_ticket_rows(db, yield_per=BATCH_SIZE, include_archive=include_archive):
+            writer.write(ticket_values(ticket))
+            done += 1
+
+            if done % BATCH_SIZE == 0:
+                if is_cancelled and is_cancelled():
+                    writer.discard()
+                    raise ExportCancelled()
+                if progress:
+                    progress(done, total)
+
+    if is_cancelled and is_cancelled():
+        writer.discard()
+        raise ExportCancelled()
+    writer.close()
+    if progress:
+        progress(done, done)
+    return done
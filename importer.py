@@ -0,0 +1,328 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import sessionmaker
+from database import immediate_transaction
+from models import Passenger, Ticket, User, current_revision
+import refdata
+import seats
+
+# Колонки файла импорта и допустимые заголовки (как в форме билета или латиницей)
+COLUMNS = {
+    "last_name": ["last_name", "фамилия"],
+    "first_name": ["first_name", "имя"],
+    "middle_name": ["middle_name", "отчество"],
+    "series_passport": ["series_passport", "серия паспорта"],
+    "number_passport": ["number_passport", "номер паспорта"],
+    "train": ["train", "поезд", "название поезда"],
+    "seat_number": ["seat_number", "seat", "место", "номер места"],
+    "departure_station": ["departure_station", "станция отправления"],
+    "arrival_station": ["arrival_station", "станция прибытия"],
+    "departure_time": ["departure_time", "время отправления"],
+    "arrival_time": ["arrival_time", "время прибытия"],
+}
+REQUIRED = [column for column in COLUMNS if column != "middle_name"]
+
+DATETIME_FORMATS = ["%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S"]
+
+# Строк в одной транзакции
+CHUNK_SIZE = 5000
+# Пар паспортов в одном запросе IN — с запасом до лимита переменных SQLite
+PASSPORT_LOOKUP_SIZE = 400
+
+ImportResult = namedtuple("ImportResult", ["imported", "errors"])
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def _header_keys(header):
+    aliases = {alias: key for key, names in COLUMNS.items() for alias in names}
+    keys = [aliases.get(str(name).strip().lower()) if name is not None else None for name in header]
+    missing = [column for column in REQUIRED if column not in keys]
+    if missing:
+        raise ImportFormatError("В файле нет колонок: " + ", ".join(missing))
+    return keys
+
+
+def _csv_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        sample = file.read(4096)
+        file.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t") if sample else csv.excel
+        yield from csv.reader(file, dialect)
+
+
+def _xlsx_rows(path):
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+# Строки файла по одной: (номер строки в файле, словарь значений колонок)
+def read_rows(path):
+    rows = _xlsx_rows(path) if path.lower().endswith((".xlsx", ".xlsm")) else _csv_rows(path)
+    header = next(rows, None)
+    if header is None:
+        raise ImportFormatError("Файл пуст")
+    keys = _header_keys(header)
+
+    for number, values in enumerate(rows, 2):
+        if not any(value not in (None, "") for value in values):
+            continue
+        yield number, {key: value for key, value in zip(keys, values) if key}
+
+
+def _parse_datetime(value):
+    if isinstance(value, datetime):
+        return value.replace(second=0, microsecond=0)
+    text = str(value or "").strip()
+    # ISO-формат разбирается заметно быстрее strptime
+    try:
+        return datetime.fromisoformat(text).replace(second=0, microsecond=0)
+    except ValueError:
+        pass
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).replace(second=0, microsecond=0)
+        except ValueError:
+            pass
+    raise ValueError(f"Неверная дата: {text!r}")
+
+
+def _parse_int(value, name):
+    try:
+        return int(str(value).strip()) if not isinstance(value, int) else value
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}: ожидается число, получено {value!r}")
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ""
+
+
+def parse_row(raw, reference):
+    train = reference.trains_by_name.get(_text(raw.get("train")))
+    if not train:
+        raise ValueError(f"Поезд не найден: {_text(raw.get('train'))!r}")
+    departure_station = reference.stations_by_name.get(_text(raw.get("departure_station")))
+    if not departure_station:
+        raise ValueError(f"Станция отправления не найдена: {_text(raw.get('departure_station'))!r}")
+    arrival_station = reference.stations_by_name.get(_text(raw.get("arrival_station")))
+    if not arrival_station:
+        raise ValueError(f"Станция прибытия не найдена: {_text(raw.get('arrival_station'))!r}")
+
+    first_name, last_name = _text(raw.get("first_name")), _text(raw.get("last_name"))
+    if not first_name or not last_name:
+        raise ValueError("Не указаны имя или фамилия пассажира")
+
+    seat_number = _parse_int(raw.get("seat_number"), "Место")
+    if not 1 <= seat_number <= train.total_seats:
+        raise ValueError(f"Места {seat_number} нет в поезде {train.train_name} (всего {train.total_seats})")
+
+    departure_time = _parse_datetime(raw.get("departure_time"))
+    arrival_time = _parse_datetime(raw.get("arrival_time"))
+    if arrival_time <= departure_time:
+        raise ValueError("Время прибытия должно быть позже времени отправления")
+
+    return {
+        "train": train,
+        "departure_station_id": departure_station.id,
+        "arrival_station_id": arrival_station.id,
+        "seat_number": seat_number,
+        "departure_time": departure_time,
+        "arrival_time": arrival_time,
+        "passport": (_parse_int(raw.get("series_passport"), "Серия паспорта"),
+                     _parse_int(raw.get("number_passport"), "Номер паспорта")),
+        "first_name": first_name,
+        "last_name": last_name,
+        "middle_name": _text(raw.get("middle_name")),
+    }
+
+
+# Состояние одного импорта: паспорта уже известных пассажиров и места,
+# занятые предыдущими строками этого же файла
+class _ImportState:
+    def __init__(self):
+        self.passengers = {}
+        self.batch_occupancy = {}
+
+    def seat_conflict(self, occupancy, row):
+        train = row["train"]
+        start, end, seat = row["departure_time"], row["arrival_time"], row["seat_number"]
+        if not occupancy.is_free(seat, start, end):
+            return "Место уже продано"
+        batch = self.batch_occupancy.get(train.id)
+        if batch is not None and not batch.is_free(seat, start, end):
+            return "Место занято другой строкой этого файла"
+        return None
+
+    def reserve(self, row, key):
+        train = row["train"]
+        batch = self.batch_occupancy.setdefault(train.id, seats.TrainOccupancy(train.id, train.total_seats))
+        batch.add(key, row["seat_number"], row["departure_time"], row["arrival_time"])
+
+    def resolve_passengers(self, db, rows):
+        unknown = list({row["passport"]: row for row in rows if row["passport"] not in self.passengers}.values())
+
+        for start in range(0, len(unknown), PASSPORT_LOOKUP_SIZE):
+            passports = [row["passport"] for row in unknown[start:start + PASSPORT_LOOKUP_SIZE]]
+            found = db.execute(
+                select(Passenger.id, Passenger.series_passport, Passenger.number_passport)
+                .where(tuple_(Passenger.series_passport, Passenger.number_passport).in_(passports))
+            )
+            for passenger_id, series, number in found:
+                self.passengers[(series, number)] = passenger_id
+
+        new = [row for row in unknown if row["passport"] not in self.passengers]
+        if new:
+            created = db.execute(
+                insert(Passenger).returning(Passenger.id, Passenger.series_passport, Passenger.number_passport),
+                [{
+                    "first_name": row["first_name"],
+                    "last_name": row["last_name"],
+                    "middle_name": row["middle_name"],
+                    "series_passport": row["passport"][0],
+                    "number_passport": row["passport"][1],
+                } for row in new],
+            )
+            for passenger_id, series, number in created:
+                self.passengers[(series, number)] = passenger_id
+
+
+def _import_chunk(db, state, chunk, reference, cashier_id, errors):
+    parsed = []
+    for number, raw in chunk:
+        try:
+            parsed.append((number, parse_row(raw, reference)))
+        except ValueError as e:
+            errors.append((number, str(e)))
+
+    if not parsed:
+        return 0
+
+    # Проверка мест и вставка — под одной блокировкой записи, иначе касса могла бы
+    # продать место между проверкой и вставкой пачки
+    with immediate_transaction(db):
+        accepted = []
+        # Занятость каждого поезда берётся из общего кэша мест один раз на пачку
+        occupancies = {}
+        for number, row in parsed:
+            train = row["train"]
+            if train.id not in occupancies:
+                occupancies[train.id] = seats.inventory.get(db, train)
+            conflict = state.seat_conflict(occupancies[train.id], row)
+            if conflict:
+                errors.append((number, f"{conflict}: поезд {row['train'].train_name}, место {row['seat_number']}"))
+                continue
+            state.reserve(row, ("import", number))
+            accepted.append(row)
+
+        if not accepted:
+            return 0
+
+        state.resolve_passengers(db, accepted)
+        # Ревизия нужна, чтобы новые билеты увидели инкрементальное обновление списка и учёт мест
+        revision = current_revision(db) + 1
+        db.execute(insert(Ticket), [{
+            "train_id": row["train"].id,
+            "departure_station_id": row["departure_station_id"],
+            "arrival_station_id": row["arrival_station_id"],
+            "passenger_id": state.passengers[row["passport"]],
+            "departure_time": row["departure_time"],
+            "arrival_time": row["arrival_time"],
+            "seat_number": row["seat_number"],
+            "cashier_id": cashier_id,
+            "revision": revision,
+        } for row in accepted])
+    return len(accepted)
+
+
+# Импорт билетов из CSV или XLSX. Файл читается потоково, строки записываются
+# пачками по chunk_size в отдельных транзакциях (executemany). Строки с ошибками
+# пропускаются и попадают в отчёт: список (номер строки, описание).
+def import_tickets(path, cashier_id, session_factory=None, progress=None, is_cancelled=None,
+                   chunk_size=CHUNK_SIZE) -> ImportResult:
+    if session_factory is None:
+        from database import SessionLocal as session_factory
+
+    errors = []
+    imported = 0
+    processed = 0
+    state = _ImportState()
+    rows = read_rows(path)
+
+    with session_factory() as db:
+        reference = refdata.cache.get(db)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if is_cancelled and is_cancelled():
+                raise ImportCancelled()
+            imported += _import_chunk(db, state, chunk, reference, cashier_id, errors)
+            processed += len(chunk)
+            if progress:
+                progress(processed, imported)
+
+    return ImportResult(imported, errors)
+
+
+def write_report(path, errors):
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Строка", "Ошибка"])
+        writer.writerows(errors)
+
+
+# Запуск вручную: python importer.py tickets.csv --cashier admin [--report errors.csv]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт билетов из CSV или XLSX")
+    parser.add_argument("path")
+    parser.add_argument("--cashier", required=True, help="имя пользователя кассира")
+    parser.add_argument("--report", help="куда записать отчёт об ошибках (CSV)")
+    parser.add_argument("--profile", default="bulk-load", help="профиль базы данных из database.py")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    from database import make_engine
+
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=make_engine(args.profile))
+    with session_factory() as db:
+        cashier_id = db.scalar(select(User.id).where(User.username == args.cashier))
+    if cashier_id is None:
+        print(f"Пользователь {args.cashier} не найден", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    result = import_tickets(args.path, cashier_id, session_factory, chunk_size=args.chunk_size,
+                            progress=lambda done, ok: print(f"\rОбработано строк: {done}", end="", file=sys.stderr))
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+    print(f"Импортировано билетов: {result.imported} за {elapsed:.1f} с "
+          f"({result.imported / elapsed * 60:.0f} в минуту), ошибок: {len(result.errors)}")
+
+    if result.errors:
+        report = args.report or os.path.splitext(args.path)[0] + "_errors.csv"
+        write_report(report, result.errors)
+        print(f"Отчёт об ошибках: {report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,16 @@
+# Первым: от импорта этого модуля отсчитывается время запуска
+import startup
 import sys
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                           QStackedWidget, QMessageBox)
+                           QStackedWidget, QMessageBox, QProgressDialog)
 from PyQt6.QtCore import Qt
-from qt_material import apply_stylesheet
-from database import engine, SessionLocal
-import models
 from ui.login import LoginWidget
 from ui.register import RegisterWidget
-from ui.main_window import MainWindow
+from ui.theme import apply_theme
+
+# До показа окна входа загружаются только PyQt и экраны входа и регистрации.
+# SQLAlchemy, модели и проверка паролей (около 0,5 с) подключаются в bootstrap,
+# уже после показа окна; главное окно с экспортом и импортом — при входе.
 
 
 class App(QMainWindow):
@@ -17,10 +20,8 @@ class App(QMainWindow):
         self.setGeometry(100, 100, 1200, 800)
 
         self.user = None
-
-        # Создаем базу данных
-        models.Base.metadata.create_all(bind=engine)
-        models.add_default_data()
+        self.bootstrap_worker = None
+        self.bootstrap_progress = None
 
         # Инициализируем центральный виджет
         self.central_widget = QWidget()
@@ -43,6 +44,64 @@ class App(QMainWindow):
         # Начинаем с экрана входа
         self.stack.setCurrentWidget(self.login_widget)
 
+    # Выполняется сразу после показа окна входа. Модули базы загружаются в потоке
+    # интерфейса, сама подготовка базы — в фоне (BootstrapWorker); до её конца
+    # экраны входа и регистрации недоступны.
+    def bootstrap(self):
+        from database import engine
+        import diagnostics
+        from ui.bootstrap_worker import BootstrapWorker
+        from ui.db_executor import get_executor
+        startup.phase("Модули базы загружены")
+
+        # Счётчики запросов по действиям для панели диагностики
+        diagnostics.tracer.install(engine)
+        # Закрываем соединения пула при выходе, чтобы они выполнили PRAGMA optimize
+        QApplication.instance().aboutToQuit.connect(lambda: self.close_database(engine))
+
+        # Готовим базу данных; в режиме сервиса её готовит сервис бронирования
+        if get_executor().client is not None:
+            startup.report()
+            return
+
+        self.stack.setEnabled(False)
+        # Окно прогресса появляется, только если подготовка затянулась (миграции)
+        self.bootstrap_progress = QProgressDialog("Подготовка базы данных...", None, 0, 0, self)
+        self.bootstrap_progress.setWindowTitle("Запуск")
+        self.bootstrap_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.bootstrap_progress.setMinimumDuration(500)
+        self.bootstrap_progress.setAutoClose(False)
+        self.bootstrap_progress.setAutoReset(False)
+        self.bootstrap_progress.setValue(0)
+
+        self.bootstrap_worker = BootstrapWorker(engine, self)
+        self.bootstrap_worker.message.connect(self.on_bootstrap_message)
+        self.bootstrap_worker.succeeded.connect(self.on_bootstrap_succeeded)
+        self.bootstrap_worker.failed.connect(self.on_bootstrap_failed)
+        self.bootstrap_worker.start()
+
+    # Подготовка базы, если ещё идёт, дорабатывает до закрытия соединений
+    def close_database(self, engine):
+        if self.bootstrap_worker is not None:
+            self.bootstrap_worker.wait()
+        engine.dispose()
+
+    def on_bootstrap_message(self, message):
+        # Замечания миграций (с отступом) — в журнале, в окне только сами миграции
+        if not message.startswith(" "):
+            self.bootstrap_progress.setLabelText(message)
+
+    def on_bootstrap_succeeded(self, prepared):
+        self.bootstrap_progress.close()
+        self.stack.setEnabled(True)
+        startup.phase("База подготовлена" if prepared else "База уже готова")
+        startup.report()
+
+    def on_bootstrap_failed(self, message):
+        self.bootstrap_progress.close()
+        self.show_error(f"Не удалось подготовить базу данных: {message}")
+        QApplication.instance().quit()
+
     def show_login(self):
         self.stack.setCurrentWidget(self.login_widget)
 
@@ -50,6 +109,8 @@ class App(QMainWindow):
         self.stack.setCurrentWidget(self.register_widget)
 
     def show_main(self):
+        from ui.main_window import MainWindow
+
         self.main_window = MainWindow(self)
         self.stack.addWidget(self.main_window)
         self.stack.setCurrentWidget(self.main_window)
@@ -62,8 +123,14 @@ class App(QMainWindow):
 
 
 if __name__ == '__main__':
+    startup.phase("Импорт PyQt и экранов входа")
     app = QApplication(sys.argv)
-    apply_stylesheet(app, theme='light_teal.xml')
+    startup.phase("QApplication")
+    apply_theme(app)
+    startup.phase("Тема")
     window = App()
     window.show()
+    app.processEvents()
+    startup.phase("Окно входа показано")
+    window.bootstrap()
     sys.exit(app.exec())
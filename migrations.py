@@ -0,0 +1,468 @@
+import argparse
+import sys
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import OperationalError
+
+# Версия схемы хранится в PRAGMA user_version. Каждая миграция выполняется один раз,
+# в порядке номеров, и написана так, чтобы её можно было безопасно повторить
+# (например, на базе, только что созданной через create_all). Миграция может
+# вернуть список сообщений о том, что она изменила в данных, — они попадают в журнал.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+
+@migration(1, "Колонка Tickets.revision для инкрементального обновления списка")
+def add_ticket_revision(connection):
+    columns = [column["name"] for column in inspect(connection).get_columns("Tickets")]
+    if "revision" not in columns:
+        connection.exec_driver_sql('ALTER TABLE "Tickets" ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+    connection.exec_driver_sql('CREATE INDEX IF NOT EXISTS "ix_Tickets_revision" ON "Tickets" (revision)')
+
+
+@migration(2, "Индексы для бронирования и поиска пассажиров, удаление бесполезных индексов")
+def booking_indexes(connection):
+    # Дубликаты паспортов мешают уникальному индексу: билеты переводим на первую
+    # запись пассажира, остальные записи удаляем. Каждое объединение попадает в
+    # журнал миграции с номерами и ФИО обеих записей — если ФИО различаются,
+    # кассир проверяет, чьи это билеты.
+    merged = connection.exec_driver_sql('''
+        SELECT p.id, p.last_name, p.first_name, p.middle_name, k.id, k.last_name, k.first_name, k.middle_name,
+               p.series_passport, p.number_passport
+        FROM "Passengers" p
+        JOIN "Passengers" k ON k.id = (SELECT min(d.id) FROM "Passengers" d
+                                       WHERE d.series_passport = p.series_passport
+                                         AND d.number_passport = p.number_passport)
+        WHERE k.id < p.id ORDER BY p.id
+    ''').all()
+    notes = []
+    for row in merged:
+        name = " ".join(part for part in row[1:4] if part)
+        kept_name = " ".join(part for part in row[5:8] if part)
+        notes.append(f"Пассажир {row[0]} ({name}) объединён с пассажиром {row[4]} ({kept_name}), паспорт "
+                     f"{row[8]} {row[9]}" + (": ФИО различаются" if row[1:4] != row[5:8] else ""))
+
+    connection.exec_driver_sql('''
+        UPDATE "Tickets" SET passenger_id = (
+            SELECT min(p2.id) FROM "Passengers" p1
+            JOIN "Passengers" p2 ON p2.series_passport = p1.series_passport
+                                AND p2.number_passport = p1.number_passport
+            WHERE p1.id = "Tickets".passenger_id
+        )
+        WHERE passenger_id IN (
+            SELECT p.id FROM "Passengers" p WHERE EXISTS (
+                SELECT 1 FROM "Passengers" d
+                WHERE d.series_passport = p.series_passport AND d.number_passport = p.number_passport AND d.id < p.id
+            )
+        )
+    ''')
+    connection.exec_driver_sql('''
+        DELETE FROM "Passengers" WHERE EXISTS (
+            SELECT 1 FROM "Passengers" d
+            WHERE d.series_passport = "Passengers".series_passport
+              AND d.number_passport = "Passengers".number_passport
+              AND d.id < "Passengers".id
+        )
+    ''')
+
+    connection.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS "ux_Passengers_passport" '
+                               'ON "Passengers" (series_passport, number_passport)')
+    connection.exec_driver_sql('CREATE INDEX IF NOT EXISTS "ix_Tickets_train_seat" '
+                               'ON "Tickets" (train_id, seat_number, departure_time)')
+    connection.exec_driver_sql('CREATE INDEX IF NOT EXISTS "ix_Tickets_passenger_id" ON "Tickets" (passenger_id)')
+    connection.exec_driver_sql('CREATE INDEX IF NOT EXISTS "ix_Tickets_departure_time" ON "Tickets" (departure_time)')
+
+    # Индексы по первичным ключам дублируют rowid, индексы Users по имени и email
+    # дублируют ограничения уникальности, по паролю и ФИО никто не ищет
+    for table in ["City", "Stations", "Trains", "Users", "Passengers", "Tickets"]:
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS "ix_{table}_id"')
+    for column in ["username", "firstname", "lastname", "middle_name", "password", "email"]:
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS "ix_Users_{column}"')
+    return notes
+
+
+@migration(3, "Индексы для фильтров и сортировки списка билетов")
+def ticket_list_indexes(connection):
+    # Равенство по колонке фильтра + диапазон и порядок по времени отправления
+    for name, column in [("train_departure", "train_id"), ("cashier_departure", "cashier_id"),
+                         ("departure_station", "departure_station_id"), ("arrival_station", "arrival_station_id")]:
+        connection.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS "ix_Tickets_{name}" ON "Tickets" ({column}, departure_time)')
+    connection.exec_driver_sql('CREATE INDEX IF NOT EXISTS "ix_Tickets_arrival_time" ON "Tickets" (arrival_time)')
+    # Без статистики SQLite считает любое равенство очень избирательным и для
+    # фильтра по поезду с сортировкой по прибытию сортирует все билеты поезда
+    connection.exec_driver_sql("ANALYZE")
+
+
+# Текст, который индексируется для пассажира: ФИО (фамилия первой) и паспорт —
+# серия и номер раздельно и слитно. «ё» заменяется на «е», как и в запросе поиска.
+def _fts_values(row):
+    name = (f"coalesce({row}.last_name, '') || ' ' || coalesce({row}.first_name, '') || ' ' "
+            f"|| coalesce({row}.middle_name, '')")
+    name = f"replace(replace({name}, 'ё', 'е'), 'Ё', 'Е')"
+    passport = (f"{row}.series_passport || ' ' || {row}.number_passport || ' ' "
+                f"|| {row}.series_passport || {row}.number_passport")
+    return f"{row}.id, {name}, {passport}"
+
+
+@migration(4, "Полнотекстовый поиск пассажиров (FTS5, триграммы)")
+def passenger_search(connection):
+    # Триграммы находят любую подстроку от трёх символов без учёта регистра,
+    # в том числе кириллицы. Индекс хранит свою копию текста и обновляется триггерами.
+    connection.exec_driver_sql('CREATE VIRTUAL TABLE IF NOT EXISTS passengers_fts '
+                               'USING fts5(name, passport, tokenize="trigram")')
+    connection.exec_driver_sql(f'''
+        CREATE TRIGGER IF NOT EXISTS passengers_fts_insert AFTER INSERT ON "Passengers" BEGIN
+            INSERT INTO passengers_fts (rowid, name, passport) SELECT {_fts_values("NEW")};
+        END
+    ''')
+    connection.exec_driver_sql('''
+        CREATE TRIGGER IF NOT EXISTS passengers_fts_delete AFTER DELETE ON "Passengers" BEGIN
+            DELETE FROM passengers_fts WHERE rowid = OLD.id;
+        END
+    ''')
+    connection.exec_driver_sql(f'''
+        CREATE TRIGGER IF NOT EXISTS passengers_fts_update AFTER UPDATE ON "Passengers" BEGIN
+            DELETE FROM passengers_fts WHERE rowid = OLD.id;
+            INSERT INTO passengers_fts (rowid, name, passport) SELECT {_fts_values("NEW")};
+        END
+    ''')
+    connection.exec_driver_sql("DELETE FROM passengers_fts")
+    connection.exec_driver_sql(f'INSERT INTO passengers_fts (rowid, name, passport) '
+                               f'SELECT {_fts_values("Passengers")} FROM "Passengers"')
+    connection.exec_driver_sql("INSERT INTO passengers_fts (passengers_fts) VALUES ('optimize')")
+
+
+# Колонки билета, которые сохраняются в "TicketSeatConflicts"
+SEAT_CONFLICT_COLUMNS = ("id, train_id, departure_station_id, arrival_station_id, passenger_id, departure_time, "
+                         "arrival_time, seat_number, cashier_id, revision")
+
+
+@migration(5, "Уникальность места: поезд, место и время отправления")
+def unique_seat(connection):
+    # Места, уже проданные дважды (гонка двух касс до этой версии), не
+    # пересаживаются автоматически — это решает кассир. Первый билет места
+    # остаётся, остальные переносятся в "TicketSeatConflicts" (kept_id — билет,
+    # который остался на месте) и перечисляются в журнале миграции.
+    connection.exec_driver_sql('''
+        CREATE TABLE IF NOT EXISTS "TicketSeatConflicts" (
+            id INTEGER NOT NULL, train_id INTEGER, departure_station_id INTEGER, arrival_station_id INTEGER,
+            passenger_id INTEGER, departure_time DATETIME NOT NULL, arrival_time DATETIME NOT NULL,
+            seat_number INTEGER NOT NULL, cashier_id INTEGER, revision INTEGER DEFAULT '0' NOT NULL,
+            kept_id INTEGER NOT NULL, PRIMARY KEY (id)
+        )
+    ''')
+    duplicates = connection.exec_driver_sql('''
+        SELECT t.id, d.first_id, t.train_id, t.seat_number, t.departure_time FROM "Tickets" t
+        JOIN (SELECT train_id, seat_number, departure_time, min(id) AS first_id FROM "Tickets"
+              GROUP BY train_id, seat_number, departure_time HAVING count(*) > 1) d
+          ON d.train_id = t.train_id AND d.seat_number = t.seat_number AND d.departure_time = t.departure_time
+        WHERE t.id > d.first_id ORDER BY t.id
+    ''').all()
+    # Кассы, которые обновляют список по ревизиям, узнают об удалении по отметкам
+    tombstones = bool(duplicates) and inspect(connection).has_table("TicketTombstones")
+    if tombstones:
+        revision = connection.exec_driver_sql('''
+            SELECT max(ifnull((SELECT max(revision) FROM "Tickets"), 0),
+                       ifnull((SELECT max(revision) FROM "TicketTombstones"), 0)) + 1
+        ''').scalar()
+    notes = []
+    for ticket_id, kept_id, train_id, seat_number, departure_time in duplicates:
+        connection.exec_driver_sql(f'INSERT INTO "TicketSeatConflicts" ({SEAT_CONFLICT_COLUMNS}, kept_id) '
+                                   f'SELECT {SEAT_CONFLICT_COLUMNS}, ? FROM "Tickets" WHERE id = ?',
+                                   (kept_id, ticket_id))
+        connection.exec_driver_sql('DELETE FROM "Tickets" WHERE id = ?', (ticket_id,))
+        if tombstones:
+            connection.exec_driver_sql('INSERT OR REPLACE INTO "TicketTombstones" (ticket_id, revision) VALUES (?, ?)',
+                                       (ticket_id, revision))
+        notes.append(f"Билет {ticket_id} перенесён в TicketSeatConflicts: место {seat_number} поезда {train_id} "
+                     f"на {departure_time} уже продано билетом {kept_id}")
+
+    connection.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS "ux_Tickets_seat" '
+                               'ON "Tickets" (train_id, seat_number, departure_time)')
+    connection.exec_driver_sql('DROP INDEX IF EXISTS "ix_Tickets_train_seat"')
+    return notes
+
+
+# Сводки продаж (models.TrainDaySales и др.): таблица → колонки ключа, кроме дня;
+# значения берутся из одноимённых колонок билета
+SALES_SUMMARIES = {
+    "TrainDaySales": ["train_id"],
+    "RouteDaySales": ["departure_station_id", "arrival_station_id"],
+    "CashierDaySales": ["cashier_id"],
+}
+
+
+def _sales_key(row, columns):
+    # В ключе сводки не бывает NULL: с ним ON CONFLICT не нашёл бы строку
+    return [f"date({row}.departure_time)"] + [f"ifnull({row}.{column}, 0)" for column in columns]
+
+
+def _sales_add(table, columns, row):
+    return (f'INSERT INTO "{table}" (day, {", ".join(columns)}, tickets) '
+            f'VALUES ({", ".join(_sales_key(row, columns))}, 1) '
+            f'ON CONFLICT (day, {", ".join(columns)}) DO UPDATE SET tickets = tickets + 1;')
+
+
+def _sales_remove(table, columns, row):
+    match = " AND ".join(f"{column} = {value}" for column, value in zip(["day"] + columns, _sales_key(row, columns)))
+    return (f'UPDATE "{table}" SET tickets = tickets - 1 WHERE {match};\n'
+            f'DELETE FROM "{table}" WHERE {match} AND tickets <= 0;')
+
+
+@migration(6, "Сводки продаж по поездам, маршрутам и кассирам для отчётов")
+def sales_summaries(connection):
+    # Каждая сводка — число билетов по дню отправления и своему ключу. Триггеры
+    # обновляют её в той же транзакции, что и запись билета, в том числе при
+    # массовых UPDATE и DELETE и импорте, которые идут мимо ORM.
+    for table, columns in SALES_SUMMARIES.items():
+        key = ", ".join(["day"] + columns)
+        connection.exec_driver_sql(f'''
+            CREATE TABLE IF NOT EXISTS "{table}" (
+                day DATE NOT NULL, {", ".join(f"{column} INTEGER NOT NULL" for column in columns)},
+                tickets INTEGER NOT NULL, PRIMARY KEY ({key})
+            )
+        ''')
+        name = table.lower()
+        connection.exec_driver_sql(f'''
+            CREATE TRIGGER IF NOT EXISTS "{name}_insert" AFTER INSERT ON "Tickets" BEGIN
+                {_sales_add(table, columns, "NEW")}
+            END
+        ''')
+        connection.exec_driver_sql(f'''
+            CREATE TRIGGER IF NOT EXISTS "{name}_delete" AFTER DELETE ON "Tickets" BEGIN
+                {_sales_remove(table, columns, "OLD")}
+            END
+        ''')
+        # Билет переносится между строками сводки, только если изменился её ключ
+        changed = " OR ".join(f"{old} IS NOT {new}" for old, new in
+                              zip(_sales_key("OLD", columns), _sales_key("NEW", columns)))
+        connection.exec_driver_sql(f'''
+            CREATE TRIGGER IF NOT EXISTS "{name}_update"
+            AFTER UPDATE OF departure_time, {", ".join(columns)} ON "Tickets" WHEN {changed} BEGIN
+                {_sales_remove(table, columns, "OLD")}
+                {_sales_add(table, columns, "NEW")}
+            END
+        ''')
+        connection.exec_driver_sql(f'DELETE FROM "{table}"')
+        connection.exec_driver_sql(f'''
+            INSERT INTO "{table}" ({key}, tickets)
+            SELECT {", ".join(_sales_key('"Tickets"', columns))}, count(*) FROM "Tickets"
+            GROUP BY {", ".join(_sales_key('"Tickets"', columns))}
+        ''')
+
+
+# Пересоздаёт "Tickets" с AUTOINCREMENT: иначе SQLite выдаёт новому билету
+# max(id) + 1 и номер удалённого последним билета может достаться другому.
+# Колонки, внешние ключи, индексы и триггеры переносятся как есть.
+def _rebuild_tickets_autoincrement(connection):
+    columns = connection.exec_driver_sql('PRAGMA table_info("Tickets")').all()
+    definitions = []
+    for _, name, type_, notnull, default, pk in columns:
+        definition = f'"{name}" {type_}'
+        if pk:
+            definition += " PRIMARY KEY AUTOINCREMENT"
+        elif notnull:
+            definition += " NOT NULL"
+        if default is not None:
+            definition += f" DEFAULT {default}"
+        definitions.append(definition)
+    for row in connection.exec_driver_sql('PRAGMA foreign_key_list("Tickets")').all():
+        definitions.append(f'FOREIGN KEY ("{row[3]}") REFERENCES "{row[2]}" ("{row[4]}")')
+    dependent = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'Tickets' AND type IN ('index', 'trigger') "
+        "AND sql IS NOT NULL").scalars().all()
+    names = ", ".join(f'"{column[1]}"' for column in columns)
+
+    connection.exec_driver_sql('DROP TABLE IF EXISTS "Tickets_new"')
+    connection.exec_driver_sql(f'CREATE TABLE "Tickets_new" ({", ".join(definitions)})')
+    connection.exec_driver_sql(f'INSERT INTO "Tickets_new" ({names}) SELECT {names} FROM "Tickets"')
+    connection.exec_driver_sql('DROP TABLE "Tickets"')
+    connection.exec_driver_sql('ALTER TABLE "Tickets_new" RENAME TO "Tickets"')
+    for sql in dependent:
+        connection.exec_driver_sql(sql)
+    connection.exec_driver_sql('ANALYZE "Tickets"')
+
+
+@migration(7, "Архив билетов и номера билетов без повторного использования")
+def ticket_archive(connection):
+    autoincrement = connection.exec_driver_sql(
+        "SELECT sql LIKE '%AUTOINCREMENT%' FROM sqlite_master WHERE type = 'table' AND name = 'Tickets'").scalar()
+    if not autoincrement:
+        _rebuild_tickets_autoincrement(connection)
+
+    connection.exec_driver_sql('''
+        CREATE TABLE IF NOT EXISTS "TicketsArchive" (
+            id INTEGER NOT NULL, train_id INTEGER, departure_station_id INTEGER, arrival_station_id INTEGER,
+            passenger_id INTEGER, departure_time DATETIME NOT NULL, arrival_time DATETIME NOT NULL,
+            seat_number INTEGER NOT NULL, cashier_id INTEGER, revision INTEGER DEFAULT '0' NOT NULL,
+            PRIMARY KEY (id)
+        )
+    ''')
+    for name, columns in [("passenger_id", "passenger_id"), ("departure_time", "departure_time"),
+                          ("arrival_time", "arrival_time"), ("train_departure", "train_id, departure_time"),
+                          ("cashier_departure", "cashier_id, departure_time"),
+                          ("departure_station", "departure_station_id, departure_time"),
+                          ("arrival_station", "arrival_station_id, departure_time")]:
+        connection.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS "ix_TicketsArchive_{name}" '
+                                   f'ON "TicketsArchive" ({columns})')
+
+    # Номера уже выданных билетов, в том числе удалённых (отметки об удалении)
+    # и архивных, больше не выдаются
+    issued = connection.exec_driver_sql('''
+        SELECT max(ifnull((SELECT max(seq) FROM sqlite_sequence WHERE name = 'Tickets'), 0),
+                   ifnull((SELECT max(id) FROM "Tickets"), 0),
+                   ifnull((SELECT max(ticket_id) FROM "TicketTombstones"), 0),
+                   ifnull((SELECT max(id) FROM "TicketsArchive"), 0))
+    ''').scalar()
+    connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'Tickets'")
+    connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('Tickets', ?)", (issued,))
+
+    # Перенос билета в архив (удаление из "Tickets" после копирования в архив)
+    # не уменьшает сводки продаж: отчёты считают и архивные билеты
+    for table, columns in SALES_SUMMARIES.items():
+        name = table.lower()
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS "{name}_delete"')
+        connection.exec_driver_sql(f'''
+            CREATE TRIGGER "{name}_delete" AFTER DELETE ON "Tickets"
+            WHEN NOT EXISTS (SELECT 1 FROM "TicketsArchive" WHERE id = OLD.id) BEGIN
+                {_sales_remove(table, columns, "OLD")}
+            END
+        ''')
+
+
+@migration(8, "Полный уникальный индекс места вместо частичного")
+def full_unique_seat(connection):
+    # Прежняя миграция 5 исключала дважды проданные билеты из индекса условием
+    # WHERE id NOT IN (...): такие базы получают индекс, объявленный в модели
+    index_sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'ux_Tickets_seat'").scalar()
+    if index_sql is not None and " WHERE " in index_sql.upper():
+        connection.exec_driver_sql('DROP INDEX "ux_Tickets_seat"')
+    return unique_seat(connection)
+
+
+def current_version(connection):
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def pending(connection):
+    version = current_version(connection)
+    return [item for item in MIGRATIONS if item[0] > version]
+
+
+def upgrade(engine, log=None):
+    with engine.connect() as connection:
+        todo = pending(connection)
+
+    for version, description, func in todo:
+        with engine.begin() as connection:
+            notes = func(connection) or []
+            connection.exec_driver_sql(f"PRAGMA user_version = {version}")
+        if log:
+            log(f"Миграция {version}: {description}")
+            for note in notes:
+                log(f"  {note}")
+    return len(todo)
+
+
+# Горячие запросы приложения и проверка их планов: ни один не должен
+# просматривать таблицу целиком
+HOT_QUERIES = [
+    ("Проверка места на время поездки",
+     'SELECT id FROM "Tickets" WHERE train_id = ? AND seat_number = ? AND departure_time < ? AND arrival_time > ?',
+     (1, 1, "2030-01-02 00:00:00", "2030-01-01 00:00:00")),
+    ("Занятость мест поезда",
+     'SELECT id, seat_number, departure_time, arrival_time FROM "Tickets" WHERE train_id = ?', (1,)),
+    ("Поиск пассажира по паспорту",
+     'SELECT id FROM "Passengers" WHERE series_passport = ? AND number_passport = ?', (1234, 567890)),
+    ("Билеты пассажира", 'SELECT id FROM "Tickets" WHERE passenger_id = ?', (1,)),
+    ("Изменения после ревизии", 'SELECT id FROM "Tickets" WHERE revision > ?', (0,)),
+    ("Удаления после ревизии", 'SELECT ticket_id FROM "TicketTombstones" WHERE revision > ?', (0,)),
+    ("Список: фильтр по поезду и датам",
+     'SELECT id FROM "Tickets" WHERE train_id = ? AND departure_time >= ? AND departure_time < ? '
+     'ORDER BY departure_time, id LIMIT 200', (1, "2030-01-01 00:00:00", "2030-02-01 00:00:00")),
+    ("Список: фильтр по кассиру", 'SELECT id FROM "Tickets" WHERE cashier_id = ? ORDER BY departure_time DESC, id DESC LIMIT 200', (1,)),
+    ("Список: сортировка по прибытию", 'SELECT id FROM "Tickets" ORDER BY arrival_time, id LIMIT 200', ()),
+    ("Отчёт: загрузка поездов за период",
+     'SELECT train_id, sum(tickets) FROM "TrainDaySales" WHERE day >= ? AND day <= ? GROUP BY train_id',
+     ("2030-01-01", "2030-01-31")),
+    ("Архив: билеты для переноса", 'SELECT id FROM "Tickets" WHERE arrival_time < ? ORDER BY arrival_time LIMIT 1000',
+     ("2030-01-01 00:00:00",)),
+    ("Архив: билеты пассажира", 'SELECT id FROM "TicketsArchive" WHERE passenger_id = ?', (1,)),
+    ("Быстрый поиск пассажира", 'SELECT rowid, rank FROM passengers_fts WHERE passengers_fts MATCH ?', ('"петр"',)),
+]
+
+
+def explain(connection, sql, params=()):
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).all()
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(plan):
+    # «SCAN <таблица>» без индекса — полный просмотр; «SCAN ... USING INDEX» допустим,
+    # как и поиск по индексу FTS5 («VIRTUAL TABLE INDEX ...:M»)
+    return any(step.startswith("SCAN") and "USING" not in step and ":M" not in step for step in plan)
+
+
+def check_query_plans(connection):
+    results = []
+    for name, sql, params in HOT_QUERIES:
+        try:
+            plan = explain(connection, sql, params)
+        except OperationalError as e:
+            # Таблицы ещё нет — её создаст одна из миграций
+            results.append((name, [str(e.orig)], False))
+            continue
+        results.append((name, plan, not is_full_scan(plan)))
+    return results
+
+
+def print_query_plans(connection, title):
+    print(title)
+    for name, plan, ok in check_query_plans(connection):
+        print(f"  [{'ok' if ok else 'SCAN'}] {name}")
+        for step in plan:
+            print(f"        {step}")
+
+
+# Запуск вручную: python migrations.py [--database URL] [--dry-run]
+# Печатает планы горячих запросов до и после миграции; код возврата 1,
+# если после миграции какой-то запрос всё ещё читает таблицу целиком.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Миграции схемы базы кассира")
+    parser.add_argument("--database", default=None, help="URL базы SQLAlchemy (по умолчанию — из database.py)")
+    parser.add_argument("--dry-run", action="store_true", help="только показать версию и планы запросов")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        engine = create_engine(args.database)
+    else:
+        from database import engine
+
+    with engine.connect() as connection:
+        print(f"Версия схемы: {current_version(connection)}, последняя: {latest_version()}")
+        print_query_plans(connection, "Планы запросов до миграции:")
+
+    if args.dry_run:
+        return 0
+
+    upgrade(engine, log=print)
+
+    with engine.connect() as connection:
+        print_query_plans(connection, "Планы запросов после миграции:")
+        failed = [name for name, plan, ok in check_query_plans(connection) if not ok]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
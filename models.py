@@ -1,14 +1,17 @@
-from passlib.context import CryptContext
-from sqlalchemy import Boolean, Column, Integer, SmallInteger, ForeignKey, String, DateTime, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import (Boolean, Column, Integer, SmallInteger, ForeignKey, String, Date, DateTime, UniqueConstraint,
+                        Index, event, func, select)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, relationship
 from database import Base, SessionLocal
-from datetime import datetime
+import hashlib
+import migrations
 
 
 class Passenger(Base):
     __tablename__ = "Passengers"
 
-    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     first_name = Column(String, index=True, nullable=False)
     last_name = Column(String, index=True, nullable=False)
     middle_name = Column(String, index=True)
@@ -16,18 +19,22 @@ class Passenger(Base):
     series_passport = Column(SmallInteger, nullable=False)
     number_passport = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        Index('ux_Passengers_passport', 'series_passport', 'number_passport', unique=True),
+    )
+
 
 class City(Base):
     __tablename__ = "City"
 
-    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String)
 
 
 class Station(Base):
     __tablename__ = "Stations"
 
-    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     name_station = Column(String, nullable=False, unique=True)
     city_id = Column(Integer, ForeignKey(City.id), nullable=False)
 
@@ -35,7 +42,7 @@ class Station(Base):
 class Train(Base):
     __tablename__ = "Trains"
 
-    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     train_name = Column(String, unique=True)
     total_seats = Column(Integer)
 
@@ -43,13 +50,13 @@ class Train(Base):
 class User(Base):
     __tablename__ = "Users"
 
-    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
-    username = Column(String, nullable=False, index=True)
-    firstname = Column(String, nullable=False, index=True)
-    lastname = Column(String, nullable=False, index=True)
-    middle_name = Column(String, index=True)
-    password = Column(String, nullable=False, index=True)
-    email = Column(String, nullable=False, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    username = Column(String, nullable=False)
+    firstname = Column(String, nullable=False)
+    lastname = Column(String, nullable=False)
+    middle_name = Column(String)
+    password = Column(String, nullable=False)
+    email = Column(String, nullable=False)
     is_admin = Column(Boolean, nullable=False)
 
     # Добавляем ограничение на уникальность комбинации номера поезда и места
@@ -62,7 +69,7 @@ class User(Base):
 class Ticket(Base):
     __tablename__ = "Tickets"
 
-    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     train_id = Column(Integer, ForeignKey(Train.id))
     departure_station_id = Column(Integer, ForeignKey(Station.id))
     arrival_station_id = Column(Integer, ForeignKey(Station.id))
@@ -71,6 +78,8 @@ class Ticket(Base):
     arrival_time = Column(DateTime, nullable=False)
     seat_number = Column(Integer, nullable=False)
     cashier_id = Column(Integer, ForeignKey(User.id))
+    # Номер ревизии последнего изменения билета (см. assign_ticket_revisions)
+    revision = Column(Integer, nullable=False, default=0, server_default="0", index=True)
 
     train = relationship(Train)
     passenger = relationship(Passenger)
@@ -79,6 +88,123 @@ class Ticket(Base):
     departure_station = relationship(Station, foreign_keys=[departure_station_id])
     arrival_station = relationship(Station, foreign_keys=[arrival_station_id])
 
+    # Индексы под реальные запросы: занятость мест поезда, билеты пассажира, рейсы по времени.
+    # Индекс мест уникален: одно место поезда нельзя продать дважды на одно отправление.
+    # AUTOINCREMENT: номер удалённого или перенесённого в архив билета не достанется новому.
+    __table_args__ = (
+        Index('ux_Tickets_seat', 'train_id', 'seat_number', 'departure_time', unique=True),
+        Index('ix_Tickets_passenger_id', 'passenger_id'),
+        Index('ix_Tickets_departure_time', 'departure_time'),
+        {"sqlite_autoincrement": True},
+    )
+
+
+# Архив билетов уже состоявшихся поездок (archive.py): те же колонки, что у
+# Tickets, и индексы для фильтров списка «с архивом». Архивные билеты не меняются.
+class TicketArchive(Base):
+    __tablename__ = "TicketsArchive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    train_id = Column(Integer)
+    departure_station_id = Column(Integer)
+    arrival_station_id = Column(Integer)
+    passenger_id = Column(Integer, index=True)
+    departure_time = Column(DateTime, nullable=False, index=True)
+    arrival_time = Column(DateTime, nullable=False, index=True)
+    seat_number = Column(Integer, nullable=False)
+    cashier_id = Column(Integer)
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index('ix_TicketsArchive_train_departure', 'train_id', 'departure_time'),
+        Index('ix_TicketsArchive_cashier_departure', 'cashier_id', 'departure_time'),
+        Index('ix_TicketsArchive_departure_station', 'departure_station_id', 'departure_time'),
+        Index('ix_TicketsArchive_arrival_station', 'arrival_station_id', 'departure_time'),
+    )
+
+
+# Отметка об удалённом билете: по ней представление узнаёт, какие строки убрать
+class TicketTombstone(Base):
+    __tablename__ = "TicketTombstones"
+
+    ticket_id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False, index=True)
+
+
+# Сводки продаж для отчётов: число билетов по дню отправления и ключу сводки.
+# Таблицы ведут триггеры на "Tickets" (миграция 6) в той же транзакции, что и
+# продажу, изменение или удаление билета, поэтому отчёты не читают "Tickets".
+class TrainDaySales(Base):
+    __tablename__ = "TrainDaySales"
+
+    day = Column(Date, primary_key=True)
+    train_id = Column(Integer, primary_key=True)
+    tickets = Column(Integer, nullable=False)
+
+
+class RouteDaySales(Base):
+    __tablename__ = "RouteDaySales"
+
+    day = Column(Date, primary_key=True)
+    departure_station_id = Column(Integer, primary_key=True)
+    arrival_station_id = Column(Integer, primary_key=True)
+    tickets = Column(Integer, nullable=False)
+
+
+class CashierDaySales(Base):
+    __tablename__ = "CashierDaySales"
+
+    day = Column(Date, primary_key=True)
+    cashier_id = Column(Integer, primary_key=True)
+    tickets = Column(Integer, nullable=False)
+
+
+# Служебные значения базы, например версия подготовки схемы (см. bootstrap)
+class SchemaInfo(Base):
+    __tablename__ = "SchemaInfo"
+
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+
+def current_revision(db):
+    return db.scalar(select(func.max(
+        func.coalesce(select(func.max(Ticket.revision)).scalar_subquery(), 0),
+        func.coalesce(select(func.max(TicketTombstone.revision)).scalar_subquery(), 0),
+    )))
+
+
+# Каждый flush, который добавляет, меняет или удаляет билеты, получает следующий
+# номер ревизии. Изменённые билеты помечаются им, удалённые оставляют отметку.
+@event.listens_for(Session, "before_flush")
+def assign_ticket_revisions(session, flush_context, instances):
+    changed = [obj for obj in session.new if isinstance(obj, Ticket)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Ticket) and session.is_modified(obj)]
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Ticket)]
+    if not changed and not deleted:
+        return
+
+    revision = current_revision(session.connection()) + 1
+    for ticket in changed:
+        ticket.revision = revision
+    if deleted:
+        session.info.setdefault("deleted_tickets", []).append((revision, deleted))
+
+
+@event.listens_for(Session, "after_flush")
+def write_ticket_tombstones(session, flush_context):
+    for revision, ticket_ids in session.info.pop("deleted_tickets", []):
+        add_ticket_tombstones(session, revision, ticket_ids)
+
+
+# Отметки об удалении билетов с ревизией revision (id билета мог быть удалён и раньше)
+def add_ticket_tombstones(db, revision, ticket_ids):
+    db.execute(
+        sqlite_insert(TicketTombstone)
+        .values([{"ticket_id": ticket_id, "revision": revision} for ticket_id in ticket_ids])
+        .on_conflict_do_update(index_elements=[TicketTombstone.ticket_id], set_={"revision": revision})
+    )
+
 
 def add_default_data():
     with SessionLocal() as db:
@@ -136,13 +262,58 @@ def add_default_data():
 
         # Проверка заполнения данных для администратора
         if not db.query(User).first():
+            from auth import get_password_hash
+
             db.add(User(
                 username="admin",
                 firstname="Administrator",
                 lastname="Administrator",
                 middle_name="Administrator",
-                password=CryptContext(schemes=["bcrypt"], deprecated="auto").hash("admin"),
+                password=get_password_hash("admin", db),
                 email="admin@db.local",
                 is_admin=True,
             ))
             db.commit()
+
+
+# Версия начальных данных add_default_data: увеличить при их изменении, чтобы
+# существующие базы получили их при следующем запуске
+SEED_VERSION = 1
+
+
+# Что готовит bootstrap: таблицы, колонки и индексы моделей, последняя миграция
+# и версия начальных данных. Любое изменение даёт другую версию.
+def bootstrap_version():
+    digest = hashlib.sha1()
+    for table in Base.metadata.sorted_tables:
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"|{column.name}:{column.type}:{column.nullable}".encode())
+        for name in sorted(index.name for index in table.indexes):
+            digest.update(f"|{name}".encode())
+    return f"{migrations.latest_version()}.{SEED_VERSION}.{digest.hexdigest()[:16]}"
+
+
+# Подготовка базы при запуске: таблицы (create_all), миграции и начальные данные.
+# Версия подготовки записывается в базу; если она не изменилась, запуск обходится
+# одним запросом вместо проверки каждой таблицы и справочника. Возвращает True,
+# если подготовка выполнялась.
+def bootstrap(engine, log=None):
+    version = bootstrap_version()
+    try:
+        with engine.connect() as connection:
+            if connection.scalar(select(SchemaInfo.value).where(SchemaInfo.key == "bootstrap")) == version:
+                return False
+    except OperationalError:
+        # Таблицы SchemaInfo нет: база новая или подготовлена прежней версией программы
+        pass
+
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine, log)
+    add_default_data()
+    with engine.begin() as connection:
+        connection.execute(
+            sqlite_insert(SchemaInfo).values(key="bootstrap", value=version)
+            .on_conflict_do_update(index_elements=[SchemaInfo.key], set_={"value": version})
+        )
+    return True
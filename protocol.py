@@ -0,0 +1,153 @@
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from sqlalchemy import inspect
+from sqlalchemy.engine import Row
+from models import Base, City, Passenger, Station, Ticket, Train, User
+import auth
+import booking
+import refdata
+import reports
+import repository
+import seats
+
+# Протокол сервиса бронирования (service.py): по одному JSON-объекту на строку.
+#   запрос: {"op": "save_ticket", "args": [...], "session": "..."}
+#   ответ:  {"result": ...} или {"error": {"type": "BookingError", "message": "..."}}
+# Ключ сессии приходит в ответе на authenticate_user ({"result": ..., "session": "..."}):
+# по нему сервис знает, какой пользователь вошёл в кассе, и проверяет его роль.
+# Значения, которых нет в JSON, передаются объектами с ключом "$" (тип) —
+# только перечисленные ниже типы: ничего, кроме них, сервис и клиент не создают.
+
+# Операции сервиса: имя → функция fn(db, *args), которую интерфейс отдаёт в DbExecutor
+OPERATIONS = {
+    "reference_data": refdata.cache.get,
+    "list_cashiers": repository.list_cashiers,
+    "fetch_first_page": repository.fetch_first_page,
+    "fetch_ticket_page": repository.fetch_ticket_page,
+    "fetch_changes": repository.fetch_changes,
+    "search_truncated": repository.search_truncated,
+    "load_ticket": repository.load_ticket,
+    "available_seats": booking.available_seats,
+    "authenticate_user": auth.authenticate_user,
+    "create_user": auth.create_user,
+    "save_ticket": booking.save_ticket,
+    "delete_ticket": repository.delete_ticket,
+    "update_tickets": booking.update_tickets,
+    "delete_tickets": repository.delete_tickets,
+    "train_load": reports.train_load,
+    "route_sales": reports.route_sales,
+    "cashier_sales": reports.cashier_sales,
+}
+NAMES = {fn: name for name, fn in OPERATIONS.items()}
+
+TUPLES = {cls.__name__: cls for cls in (repository.TicketFilter, refdata.TrainRef, refdata.StationRef, refdata.CityRef)}
+MODELS = {cls.__name__: cls for cls in (User, Ticket, Passenger, Train, Station, City)}
+# Поля моделей, которые не покидают сервис
+HIDDEN = {"password"}
+
+# Ошибки, которые клиент поднимает с тем же типом; остальные — ServiceError
+ERRORS = {"BookingError": booking.BookingError, "ValueError": ValueError}
+
+
+# Ошибка сервиса или связи с ним; текст показывается пользователю
+class ServiceError(Exception):
+    pass
+
+
+def encode(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {"$": "datetime", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {"$": "date", "v": value.isoformat()}
+    if isinstance(value, Row):
+        return {"$": "row", "fields": list(value._fields), "v": [encode(item) for item in value]}
+    if isinstance(value, tuple) and TUPLES.get(type(value).__name__) is type(value):
+        return {"$": "tuple", "type": type(value).__name__, "v": [encode(item) for item in value]}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        if "$" in value or not all(isinstance(key, str) for key in value):
+            raise TypeError("Ключи словаря должны быть строками, кроме «$»")
+        return {key: encode(item) for key, item in value.items()}
+    if isinstance(value, Base):
+        # Только загруженные атрибуты: обращение к остальным вызвало бы запрос
+        loaded = inspect(value).dict
+        fields = {attr.key: encode(loaded[attr.key]) for attr in inspect(type(value)).attrs
+                  if attr.key in loaded and attr.key not in HIDDEN}
+        return {"$": "model", "type": type(value).__name__, "v": fields}
+    if isinstance(value, refdata.ReferenceData):
+        return {"$": "reference", "trains": encode(list(value.trains.values())),
+                "stations": encode(list(value.stations.values())), "cities": encode(list(value.cities.values()))}
+    if isinstance(value, seats.SeatBitmap):
+        return {"$": "seats", "total_seats": value.total_seats, "bits": value.bits}
+    raise TypeError(f"Значение типа {type(value).__name__} не передаётся через сервис")
+
+
+_row_types = {}
+
+
+def _row_type(fields):
+    fields = tuple(fields)
+    row_type = _row_types.get(fields)
+    if row_type is None:
+        row_type = _row_types[fields] = namedtuple("Row", fields)
+    return row_type
+
+
+def decode(value):
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get("$")
+    if kind is None:
+        return {key: decode(item) for key, item in value.items()}
+    if kind == "datetime":
+        return datetime.fromisoformat(value["v"])
+    if kind == "date":
+        return date.fromisoformat(value["v"])
+    if kind == "row":
+        return _row_type(value["fields"])(*decode(value["v"]))
+    if kind == "tuple":
+        return TUPLES[value["type"]](*decode(value["v"]))
+    if kind == "model":
+        obj = MODELS[value["type"]]()
+        for key, item in value["v"].items():
+            setattr(obj, key, decode(item))
+        return obj
+    if kind == "reference":
+        return refdata.ReferenceData(decode(value["trains"]), decode(value["stations"]), decode(value["cities"]))
+    if kind == "seats":
+        bitmap = seats.SeatBitmap(value["total_seats"])
+        bitmap.bits = value["bits"]
+        return bitmap
+    raise ValueError(f"Неизвестный тип значения: {kind}")
+
+
+def dump(message: dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def load(line: bytes) -> dict:
+    return json.loads(line.decode("utf-8"))
+
+
+def request(name, args, session=None) -> bytes:
+    message = {"op": name, "args": encode(list(args))}
+    if session is not None:
+        message["session"] = session
+    return dump(message)
+
+
+def error(e: Exception) -> bytes:
+    return dump({"error": {"type": type(e).__name__, "message": str(e)}})
+
+
+def result(response: dict):
+    if "error" in response:
+        error_type = ERRORS.get(response["error"]["type"], ServiceError)
+        raise error_type(response["error"]["message"])
+    return decode(response["result"])
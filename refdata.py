@@ -0,0 +1,77 @@
+import threading
+from collections import namedtuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models import City, Station, Train
+
+TrainRef = namedtuple("TrainRef", ["id", "train_name", "total_seats"])
+StationRef = namedtuple("StationRef", ["id", "name_station", "city_id"])
+CityRef = namedtuple("CityRef", ["id", "name"])
+
+
+# Снимок справочников: поезда, станции и города по id и по названию
+class ReferenceData:
+    def __init__(self, trains, stations, cities):
+        self.trains = {train.id: train for train in trains}
+        self.stations = {station.id: station for station in stations}
+        self.cities = {city.id: city for city in cities}
+        self.trains_by_name = {train.train_name: train for train in trains}
+        self.stations_by_name = {station.name_station: station for station in stations}
+        self.cities_by_name = {city.name: city for city in cities}
+
+
+# Справочники загружаются один раз (три запроса) и сбрасываются после коммита,
+# который изменил поезда, станции или города
+class ReferenceCache:
+    def __init__(self):
+        self._data = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def peek(self):
+        return self._data
+
+    def get(self, db: Session) -> ReferenceData:
+        data = self._data
+        if data is not None:
+            return data
+        with self._lock:
+            if self._data is None:
+                self._data = ReferenceData(
+                    [TrainRef(*row) for row in db.execute(
+                        select(Train.id, Train.train_name, Train.total_seats).order_by(Train.id))],
+                    [StationRef(*row) for row in db.execute(
+                        select(Station.id, Station.name_station, Station.city_id).order_by(Station.id))],
+                    [CityRef(*row) for row in db.execute(select(City.id, City.name).order_by(City.id))],
+                )
+            return self._data
+
+    # Справочники, загруженные в другом процессе: касса в режиме сервиса
+    # получает их от сервиса бронирования
+    def put(self, data: ReferenceData):
+        with self._lock:
+            self._data = data
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+
+cache = ReferenceCache()
+
+REFERENCE_MODELS = (Train, Station, City)
+
+
+@event.listens_for(Session, "before_flush")
+def track_reference_changes(session, flush_context, instances):
+    if any(isinstance(obj, REFERENCE_MODELS) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["reference_data_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_reference_data(session):
+    if session.info.pop("reference_data_changed", False):
+        cache.invalidate()
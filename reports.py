@@ -0,0 +1,53 @@
+from datetime import date
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+from models import CashierDaySales, RouteDaySales, Station, Train, TrainDaySales, User
+
+# Отчёты по продажам читают только сводки (models.TrainDaySales и др.), которые
+# ведут триггеры на "Tickets": время отчёта зависит от числа дней и поездов
+# (маршрутов, кассиров) в периоде, а не от числа проданных билетов.
+# Период — дни отправления от date_from до date_to включительно.
+
+
+# Загрузка поездов: дней с продажами, продано мест всего и за самый полный день
+def train_load(db: Session, date_from: date, date_to: date):
+    return db.execute(
+        select(Train.train_name, Train.total_seats,
+               func.count(TrainDaySales.day).label("days"),
+               func.sum(TrainDaySales.tickets).label("tickets"),
+               func.max(TrainDaySales.tickets).label("max_tickets"))
+        .join(Train, Train.id == TrainDaySales.train_id)
+        .where(TrainDaySales.day >= date_from, TrainDaySales.day <= date_to)
+        .group_by(TrainDaySales.train_id)
+        .order_by(Train.train_name)
+    ).all()
+
+
+# Продажи по маршрутам по дням
+def route_sales(db: Session, date_from: date, date_to: date):
+    departure = aliased(Station)
+    arrival = aliased(Station)
+    return db.execute(
+        select(RouteDaySales.day,
+               departure.name_station.label("departure_station"),
+               arrival.name_station.label("arrival_station"),
+               RouteDaySales.tickets)
+        .join(departure, departure.id == RouteDaySales.departure_station_id)
+        .join(arrival, arrival.id == RouteDaySales.arrival_station_id)
+        .where(RouteDaySales.day >= date_from, RouteDaySales.day <= date_to)
+        .order_by(RouteDaySales.day, RouteDaySales.tickets.desc(), departure.name_station, arrival.name_station)
+    ).all()
+
+
+# Продажи кассиров: билетов всего, дней и больше всего за день
+def cashier_sales(db: Session, date_from: date, date_to: date):
+    return db.execute(
+        select(User.lastname, User.firstname, User.middle_name,
+               func.count(CashierDaySales.day).label("days"),
+               func.sum(CashierDaySales.tickets).label("tickets"),
+               func.max(CashierDaySales.tickets).label("max_tickets"))
+        .join(User, User.id == CashierDaySales.cashier_id)
+        .where(CashierDaySales.day >= date_from, CashierDaySales.day <= date_to)
+        .group_by(CashierDaySales.cashier_id)
+        .order_by(func.sum(CashierDaySales.tickets).desc())
+    ).all()
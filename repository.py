@@ -0,0 +1,360 @@
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from sqlalchemy import Integer, and_, column, delete, func, literal_column, or_, select, table
+from sqlalchemy.orm import Session, aliased, joinedload
+from sqlalchemy.sql.expression import UnaryExpression
+from sqlalchemy.sql.operators import custom_op
+from database import immediate_transaction
+from models import (Passenger, Train, Ticket, TicketArchive, TicketTombstone, Station, User, add_ticket_tombstones,
+                    current_revision)
+
+# Сколько id билетов в одном условии IN массовых операций — с запасом до лимита
+# переменных SQLite
+ID_CHUNK_SIZE = 500
+
+DepartureStation = aliased(Station)
+ArrivalStation = aliased(Station)
+
+# Фильтр и порядок списка билетов. Все условия — равенства и диапазоны по
+# колонкам Tickets, у которых есть индекс вместе с колонкой сортировки;
+# None означает «без условия». Даты — включительно, по времени отправления.
+# search — быстрый поиск по ФИО и паспорту пассажира (полнотекстовый индекс).
+# include_archive — показывать и билеты из архива (archive.py).
+TicketFilter = namedtuple(
+    "TicketFilter",
+    ["train_id", "departure_station_id", "arrival_station_id", "cashier_id", "date_from", "date_to",
+     "search", "sort", "descending", "include_archive"],
+    defaults=(None, None, None, None, None, None, None, "id", False, False),
+)
+
+NO_FILTER = TicketFilter()
+
+# Колонки, по которым можно сортировать список; id добавляется вторым ключом,
+# чтобы порядок был однозначным и страницы выбирались по ключу
+SORT_COLUMNS = {
+    "id": Ticket.id,
+    "departure_time": Ticket.departure_time,
+    "arrival_time": Ticket.arrival_time,
+}
+
+# Колонки билета, общие для "Tickets" и архива
+TICKET_COLUMNS = [column.name for column in TicketArchive.__table__.columns]
+
+
+# Билеты вместе с архивными: UNION ALL двух таблиц, с которым запросы списка
+# работают как с Ticket. Условия фильтра SQLite переносит в обе части.
+def tickets_with_archive():
+    live = select(*[getattr(Ticket, name) for name in TICKET_COLUMNS])
+    archived = select(*[getattr(TicketArchive, name) for name in TICKET_COLUMNS])
+    return aliased(Ticket, live.union_all(archived).subquery("tickets"), adapt_on_names=True)
+
+
+def _tickets(ticket_filter):
+    return tickets_with_archive() if ticket_filter.include_archive else Ticket
+
+
+# Одна строка на билет: только нужные колонки из всех связанных таблиц,
+# без ленивых relationship() и без identity map сессии. tickets — Ticket или
+# его псевдоним над подзапросом с теми же колонками.
+def ticket_rows_query(tickets=Ticket):
+    return (
+        select(
+            tickets.id,
+            Passenger.first_name,
+            Passenger.middle_name,
+            Passenger.last_name,
+            Passenger.series_passport,
+            Passenger.number_passport,
+            Train.train_name,
+            tickets.seat_number,
+            DepartureStation.name_station.label("departure_station"),
+            ArrivalStation.name_station.label("arrival_station"),
+            tickets.departure_time,
+            tickets.arrival_time,
+            User.lastname.label("cashier_lastname"),
+            User.firstname.label("cashier_firstname"),
+            User.middle_name.label("cashier_middle_name"),
+        )
+        .select_from(tickets)
+        .join(Passenger, tickets.passenger_id == Passenger.id)
+        .join(Train, tickets.train_id == Train.id)
+        .join(DepartureStation, tickets.departure_station_id == DepartureStation.id)
+        .join(ArrivalStation, tickets.arrival_station_id == ArrivalStation.id)
+        .outerjoin(User, tickets.cashier_id == User.id)
+    )
+
+
+# Индекс FTS5 по пассажирам (создаётся миграцией 4), rowid — id пассажира
+passengers_fts = table("passengers_fts", column("rowid", Integer))
+
+# Триграммный индекс находит только фрагменты от трёх символов
+SEARCH_MIN_LENGTH = 3
+# Сколько найденных пассажиров участвует в поиске. Слишком общий запрос
+# («ова») совпадает с сотнями тысяч пассажиров — тогда нужно уточнить запрос.
+SEARCH_LIMIT = 2000
+
+
+# Запрос FTS5 из введённого текста: каждое слово ищется как подстрока, все
+# слова должны найтись. None, если искать нечего.
+def search_query(text):
+    words = [word for word in (text or "").replace("ё", "е").replace("Ё", "Е").split()
+             if len(word) >= SEARCH_MIN_LENGTH]
+    if not words:
+        return None
+    return " ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+def _match(query):
+    return literal_column("passengers_fts").op("MATCH")(query)
+
+
+# Найденные пассажиры и их релевантность rank (меньше — лучше): позиция первого
+# совпадения в ФИО, где фамилия идёт первой, поэтому совпадение с началом фамилии
+# выше совпадения с отчеством; совпадения только по паспорту — в конце.
+# bm25 здесь не подходит: он читает списки всех совпадений и на частых
+# фрагментах занимает секунды, а позиция считается по одной строке.
+def passenger_matches(text):
+    query = search_query(text)
+    if query is None:
+        raise ValueError(f"Для поиска нужно хотя бы {SEARCH_MIN_LENGTH} символа")
+    position = func.instr(func.highlight(literal_column("passengers_fts"), 0, func.char(1), ""), func.char(1))
+    return (
+        select(passengers_fts.c.rowid.label("passenger_id"),
+               func.coalesce(func.nullif(position, 0), 1000).label("rank"))
+        .where(_match(query))
+        .limit(SEARCH_LIMIT)
+        .cte("matches")
+        # Сначала находим пассажиров, затем их билеты по индексу passenger_id —
+        # иначе SQLite может перебирать билеты и искать каждого пассажира в индексе
+        .prefix_with("MATERIALIZED")
+    )
+
+
+# Больше ли найдено пассажиров, чем участвует в поиске (SEARCH_LIMIT)
+def search_truncated(db: Session, text) -> bool:
+    query = search_query(text)
+    if query is None:
+        return False
+    found = db.scalar(select(func.count()).select_from(
+        select(passengers_fts.c.rowid).where(_match(query)).limit(SEARCH_LIMIT + 1).subquery()))
+    return found > SEARCH_LIMIT
+
+
+# Унарный плюс не меняет значение, но запрещает SQLite использовать индекс
+# по колонке. При поиске так мы заставляем его идти от найденных пассажиров
+# (их не больше SEARCH_LIMIT) к билетам, а не перебирать билеты по индексу
+# фильтра или сортировки, проверяя каждого пассажира.
+def _no_index(column, matches):
+    return column if matches is None else UnaryExpression(column, operator=custom_op("+"))
+
+
+# matches — результат passenger_matches для фильтра с поиском
+def apply_filter(stmt, ticket_filter: TicketFilter, matches=None, tickets=Ticket):
+    if matches is not None:
+        stmt = stmt.join(matches, matches.c.passenger_id == tickets.passenger_id)
+    for attr, value in [(tickets.train_id, ticket_filter.train_id),
+                        (tickets.departure_station_id, ticket_filter.departure_station_id),
+                        (tickets.arrival_station_id, ticket_filter.arrival_station_id),
+                        (tickets.cashier_id, ticket_filter.cashier_id)]:
+        if value is not None:
+            stmt = stmt.where(_no_index(attr, matches) == value)
+    departure_time = _no_index(tickets.departure_time, matches)
+    if ticket_filter.date_from is not None:
+        stmt = stmt.where(departure_time >= datetime.combine(ticket_filter.date_from, time.min))
+    if ticket_filter.date_to is not None:
+        stmt = stmt.where(departure_time < datetime.combine(ticket_filter.date_to + timedelta(days=1), time.min))
+    return stmt
+
+
+# Ключ строки в порядке сортировки фильтра; по нему выбирается следующая страница
+def sort_key(row, ticket_filter: TicketFilter = NO_FILTER):
+    if ticket_filter.sort == "id":
+        return (row.id,)
+    return (getattr(row, ticket_filter.sort), row.id)
+
+
+def _matches(ticket_filter):
+    if ticket_filter.search is None:
+        if ticket_filter.sort == "rank":
+            raise ValueError("Сортировка по релевантности возможна только при поиске")
+        return None
+    return passenger_matches(ticket_filter.search)
+
+
+def _sort_column(ticket_filter, matches, tickets=Ticket):
+    if ticket_filter.sort == "rank":
+        return matches.c.rank
+    return _no_index(getattr(tickets, SORT_COLUMNS[ticket_filter.sort].key), matches)
+
+
+def _after(ticket_filter, key, matches, tickets=Ticket):
+    descending = ticket_filter.descending
+    ticket_id_column = _no_index(tickets.id, matches)
+    if ticket_filter.sort == "id":
+        return ticket_id_column < key[0] if descending else ticket_id_column > key[0]
+    column = _sort_column(ticket_filter, matches, tickets)
+    value, ticket_id = key
+    # Отдельное условие на колонку (>= / <=) даёт SQLite диапазон индекса,
+    # иначе он просматривает индекс с начала
+    if descending:
+        return and_(column <= value, or_(column < value, tickets.id < ticket_id))
+    return and_(column >= value, or_(column > value, tickets.id > ticket_id))
+
+
+def _order_by(ticket_filter, columns):
+    return [column.desc() if ticket_filter.descending else column for column in columns]
+
+
+# Страница списка после ключа after (None — первая страница). Сначала по
+# индексам Tickets выбираются id страницы (вместе со значением сортировки),
+# и только эти строки соединяются с пассажирами, поездами и станциями — даже
+# если фильтру соответствует много строк и SQLite приходится их сортировать.
+# С архивом страница выбирается сразу со всеми колонками билета: соединить
+# объединение с архивом со страницей по id SQLite смог бы только через его копию.
+def fetch_ticket_page(db: Session, ticket_filter: TicketFilter = NO_FILTER, after=None, limit: int = 200):
+    tickets = _tickets(ticket_filter)
+    matches = _matches(ticket_filter)
+    sort_column = _sort_column(ticket_filter, matches, tickets)
+    columns = [tickets.id] if tickets is Ticket else [getattr(tickets, name) for name in TICKET_COLUMNS]
+    if ticket_filter.sort != "id":
+        columns.append(sort_column.label("sort_value"))
+    page = apply_filter(select(*columns), ticket_filter, matches, tickets)
+    if after is not None:
+        page = page.where(_after(ticket_filter, after, matches, tickets))
+    order = [sort_column, tickets.id] if ticket_filter.sort != "id" else [sort_column]
+    page = page.order_by(*_order_by(ticket_filter, order)).limit(limit).subquery("page")
+
+    if tickets is Ticket:
+        stmt = ticket_rows_query().join(page, page.c.id == Ticket.id)
+    else:
+        tickets = aliased(Ticket, page, adapt_on_names=True)
+        stmt = ticket_rows_query(tickets)
+    if ticket_filter.sort == "rank":
+        stmt = stmt.add_columns(page.c.sort_value.label("rank"))
+    order = [page.c.sort_value, tickets.id] if ticket_filter.sort != "id" else [tickets.id]
+    return db.execute(stmt.order_by(*_order_by(ticket_filter, order))).all()
+
+
+# Первая страница списка и ревизия, от которой список потом обновляется (fetch_changes)
+def fetch_first_page(db: Session, ticket_filter: TicketFilter = NO_FILTER, limit: int = 200):
+    return current_revision(db), fetch_ticket_page(db, ticket_filter, None, limit)
+
+
+# yield_per включает потоковое чтение: строки приходят из курсора пачками,
+# а не загружаются в память целиком. С архивом сначала идут архивные билеты
+# (они старше), затем действующие — каждая таблица читается по своему id.
+# ticket_filter отбирает билеты по поезду, станциям, кассиру и датам (без поиска).
+def iter_ticket_rows(db: Session, yield_per: int = None, include_archive: bool = False,
+                     ticket_filter: TicketFilter = NO_FILTER):
+    sources = [aliased(Ticket, TicketArchive.__table__, adapt_on_names=True), Ticket] if include_archive else [Ticket]
+    for tickets in sources:
+        stmt = apply_filter(ticket_rows_query(tickets), ticket_filter, None, tickets).order_by(tickets.id)
+        if yield_per:
+            stmt = stmt.execution_options(yield_per=yield_per)
+        yield from db.execute(stmt)
+
+
+def count_tickets(db: Session, include_archive: bool = False):
+    count = db.scalar(select(func.count(Ticket.id)))
+    if include_archive:
+        count += db.scalar(select(func.count(TicketArchive.id)))
+    return count
+
+
+# Изменения после ревизии since: (текущая ревизия, новые и изменённые строки,
+# подходящие под фильтр, id билетов, которые надо убрать из списка — удалённые
+# и переставшие подходить под фильтр). Запросы идут по индексам на revision,
+# поэтому их стоимость зависит от числа изменений, а не от размера таблицы.
+def fetch_changes(db: Session, since: int, ticket_filter: TicketFilter = NO_FILTER):
+    revision = current_revision(db)
+    matches = _matches(ticket_filter)
+    stmt = apply_filter(ticket_rows_query(), ticket_filter, matches)
+    if matches is not None:
+        stmt = stmt.add_columns(matches.c.rank)
+    rows = db.execute(stmt.where(Ticket.revision > since).order_by(Ticket.id)).all()
+    deleted = select(TicketTombstone.ticket_id).where(TicketTombstone.revision > since)
+    deleted = deleted.where(~select(Ticket.id).where(Ticket.id == TicketTombstone.ticket_id).exists())
+    if ticket_filter.include_archive:
+        # Перенесённый в архив билет остаётся в списке «с архивом»
+        deleted = deleted.where(~select(TicketArchive.id).where(TicketArchive.id == TicketTombstone.ticket_id).exists())
+    deleted = db.scalars(deleted).all()
+    if ticket_filter != NO_FILTER:
+        matching = {row.id for row in rows}
+        changed = db.scalars(select(Ticket.id).where(Ticket.revision > since)).all()
+        deleted = [*deleted, *(ticket_id for ticket_id in changed if ticket_id not in matching)]
+    return revision, rows, deleted
+
+
+# Кассиры для фильтра списка: (id, ФИО)
+def list_cashiers(db: Session):
+    rows = db.execute(select(User.id, User.lastname, User.firstname, User.middle_name).order_by(User.lastname))
+    return [(user_id, ' '.join(part for part in names if part)) for user_id, *names in rows]
+
+
+# Билет со всеми связями для формы редактирования: загружается одним запросом,
+# чтобы объект можно было использовать после закрытия сессии
+def load_ticket(db: Session, ticket_id: int):
+    return db.get(Ticket, ticket_id, options=[
+        joinedload(Ticket.passenger),
+        joinedload(Ticket.train),
+        joinedload(Ticket.departure_station),
+        joinedload(Ticket.arrival_station),
+        joinedload(Ticket.cashier),
+    ])
+
+
+def delete_ticket(db: Session, ticket_id: int) -> bool:
+    # Ревизия удаления выдаётся под блокировкой записи, как и при продаже билета
+    with immediate_transaction(db):
+        return remove_ticket(db, ticket_id)
+
+
+# То же внутри уже открытой транзакции записи (см. booking.write_ticket)
+def remove_ticket(db: Session, ticket_id: int) -> bool:
+    ticket = db.get(Ticket, ticket_id)
+    if not ticket:
+        return False
+    db.delete(ticket)
+    db.flush()
+    return True
+
+
+def chunks(ids, size: int = ID_CHUNK_SIZE):
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+# Массовое удаление выбранных билетов: DELETE ... WHERE id IN (...) пачками по
+# ID_CHUNK_SIZE в одной транзакции и отметки об удалении с одной ревизией —
+# представление убирает все строки одним обновлением. Возвращает число удалённых.
+def delete_tickets(db: Session, ticket_ids) -> int:
+    with immediate_transaction(db):
+        return remove_tickets(db, ticket_ids)
+
+
+# То же внутри уже открытой транзакции записи
+def remove_tickets(db: Session, ticket_ids) -> int:
+    revision = current_revision(db) + 1
+    deleted = 0
+    for chunk in chunks(ticket_ids):
+        removed = db.scalars(
+            delete(Ticket).where(Ticket.id.in_(chunk)).returning(Ticket.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if removed:
+            add_ticket_tombstones(db, revision, removed)
+            deleted += len(removed)
+    return deleted
+
+
+def passenger_full_name(row):
+    return ' '.join(part for part in [row.first_name, row.middle_name, row.last_name] if part)
+
+
+def passport(row):
+    return ' '.join(map(str, [row.series_passport, row.number_passport]))
+
+
+def cashier_full_name(row):
+    return ' '.join(part for part in [row.cashier_lastname, row.cashier_firstname, row.cashier_middle_name] if part)
@@ -0,0 +1,204 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Ticket, TicketTombstone, current_revision
+
+
+# Битовая карта мест одного рейса: бит с номером места равен 1, если место занято.
+# Проверка, поиск первого свободного места и подсчёт выполняются над одним целым
+# числом, без множеств и сортировок.
+class SeatBitmap:
+    __slots__ = ("total_seats", "bits", "_all")
+
+    def __init__(self, total_seats: int, taken=()):
+        self.total_seats = total_seats
+        # Маска всех существующих мест: биты 1..total_seats
+        self._all = ((1 << total_seats) - 1) << 1
+        self.bits = 0
+        for seat in taken:
+            self.take(seat)
+
+    def is_taken(self, seat: int) -> bool:
+        return bool(self.bits >> seat & 1)
+
+    def take(self, seat: int):
+        if 1 <= seat <= self.total_seats:
+            self.bits |= 1 << seat
+
+    def release(self, seat: int):
+        self.bits &= ~(1 << seat)
+
+    def _free_mask(self, start: int = 1):
+        return ~self.bits & self._all & ~((1 << start) - 1)
+
+    def first_free(self, start: int = 1):
+        free = self._free_mask(start)
+        return (free & -free).bit_length() - 1 if free else None
+
+    def free_count(self) -> int:
+        return bin(self._free_mask()).count("1")
+
+
+# Интервальный индекс занятости одного места: поездки [отправление, прибытие),
+# отсортированные по началу, и префиксный максимум концов. Место свободно на
+# [start, end), если у всех поездок, начинающихся раньше end, конец не позже start —
+# это один бинарный поиск и одно сравнение.
+class SeatIntervals:
+    __slots__ = ("starts", "ends", "ids", "max_ends")
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.max_ends = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _rebuild_max_ends(self, position):
+        current = self.max_ends[position - 1] if position else None
+        del self.max_ends[position:]
+        for end in self.ends[position:]:
+            current = end if current is None or end > current else current
+            self.max_ends.append(current)
+
+    def add(self, start, end, ticket_id):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.ids.insert(position, ticket_id)
+        self._rebuild_max_ends(position)
+
+    def remove(self, start, ticket_id):
+        position = bisect_left(self.starts, start)
+        while self.ids[position] != ticket_id:
+            position += 1
+        del self.starts[position], self.ends[position], self.ids[position]
+        self._rebuild_max_ends(position)
+
+    def overlaps(self, start, end, exclude_id=None, exclude_ids=()) -> bool:
+        position = bisect_left(self.starts, end) - 1
+        # Пересечения идут подряд с конца префикса, пока максимум концов больше start;
+        # обход нужен только чтобы пропустить редактируемые билеты
+        while position >= 0 and self.max_ends[position] > start:
+            ticket_id = self.ids[position]
+            if self.ends[position] > start and ticket_id != exclude_id and ticket_id not in exclude_ids:
+                return True
+            position -= 1
+        return False
+
+
+# Занятость всех мест поезда. Билеты хранятся по местам в интервальных индексах,
+# поэтому место можно продать повторно на непересекающиеся по времени поездки и участки.
+class TrainOccupancy:
+    def __init__(self, train_id: int, total_seats: int):
+        self.train_id = train_id
+        self.total_seats = total_seats
+        self.revision = 0
+        self.seats = {}
+        self.tickets = {}
+        self._bitmaps = {}
+
+    def add(self, ticket_id, seat, start, end):
+        self.remove(ticket_id)
+        self.seats.setdefault(seat, SeatIntervals()).add(start, end, ticket_id)
+        self.tickets[ticket_id] = (seat, start)
+        self._bitmaps.clear()
+
+    def remove(self, ticket_id):
+        ticket = self.tickets.pop(ticket_id, None)
+        if ticket is None:
+            return
+        seat, start = ticket
+        intervals = self.seats[seat]
+        intervals.remove(start, ticket_id)
+        if not intervals:
+            del self.seats[seat]
+        self._bitmaps.clear()
+
+    def is_free(self, seat, start, end, exclude_id=None, exclude_ids=()) -> bool:
+        intervals = self.seats.get(seat)
+        return intervals is None or not intervals.overlaps(start, end, exclude_id, exclude_ids)
+
+    # Битовая карта мест, занятых хотя бы частью поездки [start, end)
+    def bitmap(self, start, end, exclude_id=None) -> SeatBitmap:
+        key = (start, end, exclude_id)
+        bitmap = self._bitmaps.get(key)
+        if bitmap is None:
+            bitmap = SeatBitmap(self.total_seats, [
+                seat for seat, intervals in self.seats.items() if intervals.overlaps(start, end, exclude_id)
+            ])
+            if len(self._bitmaps) >= 32:
+                self._bitmaps.clear()
+            self._bitmaps[key] = bitmap
+        return bitmap
+
+
+# Кэш занятости по поездам. Поезд загружается одним запросом, а затем
+# синхронизируется по ревизиям билетов: догружаются только изменённые
+# и удалённые после последней синхронизации билеты, в том числе с других касс.
+class SeatInventory:
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, train) -> TrainOccupancy:
+        with self._lock:
+            revision = current_revision(db)
+            occupancy = self._entries.get(train.id)
+            if occupancy is None or occupancy.total_seats != train.total_seats:
+                occupancy = self._load(db, train, revision)
+            elif occupancy.revision != revision:
+                self._sync(db, occupancy, revision)
+
+            self._entries[train.id] = occupancy
+            self._entries.move_to_end(train.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return occupancy
+
+    def trip(self, db: Session, train, start, end, exclude_id=None) -> SeatBitmap:
+        return self.get(db, train).bitmap(start, end, exclude_id)
+
+    def is_free(self, db: Session, train, seat, start, end, exclude_id=None) -> bool:
+        return self.get(db, train).is_free(seat, start, end, exclude_id)
+
+    @staticmethod
+    def _load(db, train, revision):
+        occupancy = TrainOccupancy(train.id, train.total_seats)
+        rows = db.execute(
+            select(Ticket.id, Ticket.seat_number, Ticket.departure_time, Ticket.arrival_time)
+            .where(Ticket.train_id == train.id)
+        )
+        for ticket_id, seat, start, end in rows:
+            occupancy.add(ticket_id, seat, start, end)
+        occupancy.revision = revision
+        return occupancy
+
+    @staticmethod
+    def _sync(db, occupancy, revision):
+        # Сначала удаления: id удалённого билета может достаться новому
+        deleted = db.scalars(select(TicketTombstone.ticket_id).where(TicketTombstone.revision > occupancy.revision))
+        for ticket_id in deleted:
+            occupancy.remove(ticket_id)
+
+        changed = db.execute(
+            select(Ticket.id, Ticket.train_id, Ticket.seat_number, Ticket.departure_time, Ticket.arrival_time)
+            .where(Ticket.revision > occupancy.revision)
+        )
+        for ticket_id, train_id, seat, start, end in changed:
+            if train_id == occupancy.train_id:
+                occupancy.add(ticket_id, seat, start, end)
+            else:
+                occupancy.remove(ticket_id)
+        occupancy.revision = revision
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+inventory = SeatInventory()
@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from database import SessionLocal, engine, immediate_transaction
+import booking
+import models
+import protocol
+import repository
+import seats
+
+# Сервис бронирования: один процесс работает с файлом базы за все кассы.
+# Запуск: python service.py [--listen 127.0.0.1:8765 | --listen unix:/run/cashier.sock]
+# Кассы подключаются к нему, если задан адрес (CASHIER_SERVICE или cashier.ini,
+# см. service_client.py). Чтение идёт в пуле потоков со своими соединениями,
+# запись — через одну очередь: всё, что накопилось, пока шла предыдущая запись,
+# записывается одной транзакцией (group commit), каждый билет — в своей точке
+# сохранения, чтобы отказ по одному билету не отменял остальные.
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+# Потоков (и соединений) для чтения
+READ_THREADS = 4
+# Сколько записей самое большее попадает в один коммит
+GROUP_COMMIT_MAX = 256
+# Предел длины строки запроса
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+# Записи, которые объединяются в один коммит: функции для уже открытой транзакции
+GROUP_COMMIT = {
+    "save_ticket": booking.write_ticket,
+    "delete_ticket": repository.remove_ticket,
+    "update_tickets": booking.change_tickets,
+    "delete_tickets": repository.remove_tickets,
+}
+# Остальные записи выполняются в потоке записи по одной. Вход тоже: при нём
+# может перезаписаться хеш пароля
+WRITES = {"create_user", "authenticate_user"}
+# Операции до входа в систему; остальные требуют сессию из ответа authenticate_user
+PUBLIC = {"authenticate_user", "create_user"}
+# Операции только для администратора, как и кнопки интерфейса. Сохранение
+# билета с ticket_id — изменение билета, тоже только для администратора
+ADMIN_ONLY = {"delete_ticket", "update_tickets", "delete_tickets", "train_load", "route_sales", "cashier_sales"}
+
+log = logging.getLogger("cashier.service")
+
+
+class _Write:
+    def __init__(self, name, args, future):
+        self.name = name
+        self.args = args
+        self.future = future
+
+
+class BookingService:
+    def __init__(self, session_factory=SessionLocal, read_threads=READ_THREADS, group_commit_max=GROUP_COMMIT_MAX):
+        self.session_factory = session_factory
+        self.group_commit_max = group_commit_max
+        self.reads = ThreadPoolExecutor(read_threads, thread_name_prefix="service-read")
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix="service-write")
+        self.queue = None
+        # Сессии касс: ключ сессии → (id, is_admin) вошедшего пользователя
+        self.sessions = {}
+        # Задачи открытых соединений касс: при остановке они завершаются до закрытия цикла
+        self.connections = set()
+        # Счётчики для журнала: записей и коммитов с ними
+        self.writes = 0
+        self.commits = 0
+
+    async def serve(self, address, started=None):
+        self.queue = asyncio.Queue()
+        write_loop = asyncio.create_task(self._write_loop())
+        if address.startswith("unix:"):
+            path = address[len("unix:"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self._handle, path, limit=MAX_REQUEST_BYTES)
+            # Сокет доступен только пользователю, под которым запущен сервис
+            os.chmod(path, 0o600)
+        else:
+            host, port = address.rsplit(":", 1)
+            server = await asyncio.start_server(self._handle, host, int(port), limit=MAX_REQUEST_BYTES)
+        log.info("Сервис бронирования слушает %s", address)
+        self._stop_on_signals()
+        if started:
+            started()
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            # Остановка по сигналу
+            pass
+        finally:
+            write_loop.cancel()
+            connections = list(self.connections)
+            for task in connections:
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+            self.reads.shutdown(wait=False)
+            self.writer.shutdown(wait=True)
+
+    # SIGTERM и Ctrl+C отменяют задачу serve, и соединения закрываются через
+    # отмену их задач. Без обработчиков сигналов в цикле (Windows) SIGTERM
+    # останавливает сервис как Ctrl+C — исключением KeyboardInterrupt.
+    def _stop_on_signals(self):
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        try:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, task.cancel)
+        except NotImplementedError:
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    # Отмена при остановке сервиса — штатное завершение соединения: задача
+    # заканчивается без исключения, иначе asyncio пишет в журнал трассировку
+    # «Unhandled exception in client_connected_cb»
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(await self.execute(line))
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            log.warning("Соединение закрыто: %s", e)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def execute(self, line: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        try:
+            message = protocol.load(line)
+            name = message["op"]
+            if name not in protocol.OPERATIONS:
+                raise protocol.ServiceError(f"Неизвестная операция: {name}")
+            args = protocol.decode(message.get("args", []))
+            session = message.get("session")
+            self._check_access(name, args, self.sessions.get(session))
+            if name in GROUP_COMMIT or name in WRITES:
+                future = loop.create_future()
+                await self.queue.put(_Write(name, args, future))
+                result = await future
+            else:
+                result = await loop.run_in_executor(self.reads, self._read, name, args)
+        except Exception as e:
+            if not isinstance(e, (protocol.ServiceError, *protocol.ERRORS.values())):
+                log.exception("Ошибка операции")
+            return protocol.error(e)
+        if name == "authenticate_user":
+            return self._login(result, session)
+        return protocol.dump({"result": result})
+
+    def _check_access(self, name, args, user):
+        if name in PUBLIC:
+            return
+        if user is None:
+            raise protocol.ServiceError("Войдите в систему")
+        edit = name == "save_ticket" and args and isinstance(args[0], dict) and args[0].get("ticket_id")
+        if (name in ADMIN_ONLY or edit) and not user[1]:
+            raise protocol.ServiceError("Операция доступна только администратору")
+
+    # Успешный вход открывает новую сессию вместо прежней сессии этой кассы
+    def _login(self, result, previous):
+        self.sessions.pop(previous, None)
+        if not result:
+            return protocol.dump({"result": result})
+        session = secrets.token_urlsafe(32)
+        self.sessions[session] = (result["v"]["id"], result["v"]["is_admin"])
+        return protocol.dump({"result": result, "session": session})
+
+    # Результат кодируется в потоке, пока сессия открыта: объектам ORM ещё
+    # доступны загруженные связи
+    def _read(self, name, args):
+        with self.session_factory() as db:
+            return protocol.encode(protocol.OPERATIONS[name](db, *args))
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.group_commit_max and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            results = await loop.run_in_executor(self.writer, self._write_batch, batch)
+            for item, (ok, value) in zip(batch, results):
+                if item.future.done():
+                    continue
+                if ok:
+                    item.future.set_result(value)
+                else:
+                    item.future.set_exception(value)
+
+    # Выполняется в потоке записи. Возвращает для каждой записи (успех, результат
+    # или исключение) в порядке пачки.
+    def _write_batch(self, batch):
+        results = {}
+        grouped = [item for item in batch if item.name in GROUP_COMMIT]
+        for item in batch:
+            if item.name not in GROUP_COMMIT:
+                results[id(item)] = self._write_one(item)
+        if grouped:
+            results.update(self._group_commit(grouped))
+        return [results[id(item)] for item in batch]
+
+    def _write_one(self, item):
+        try:
+            with self.session_factory() as db:
+                return True, protocol.encode(protocol.OPERATIONS[item.name](db, *item.args))
+        except Exception as e:
+            return False, e
+
+    def _group_commit(self, items):
+        results = {}
+        try:
+            with self.session_factory() as db, immediate_transaction(db):
+                for item in items:
+                    try:
+                        with db.begin_nested():
+                            results[id(item)] = True, protocol.encode(GROUP_COMMIT[item.name](db, *item.args))
+                    except Exception as e:
+                        results[id(item)] = False, e
+        except Exception as e:
+            # Коммит не состоялся: кэш мест мог увидеть незакоммиченные билеты пачки
+            seats.inventory.clear()
+            log.exception("Пачка записей не записана")
+            return {id(item): (False, e) for item in items}
+        self.writes += len(items)
+        self.commits += 1
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервис бронирования для нескольких касс")
+    parser.add_argument("--listen", default=DEFAULT_ADDRESS,
+                        help="адрес: хост:порт или unix:/путь/к/сокету (по умолчанию %(default)s)")
+    parser.add_argument("--read-threads", type=int, default=READ_THREADS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # Схему базы готовит сервис: кассы в режиме сервиса файл базы не открывают
+    # (экспорт и импорт, которые работают с файлом, у них отключены)
+    models.bootstrap(engine, log.info)
+
+    service = BookingService(read_threads=args.read_threads)
+    try:
+        asyncio.run(service.serve(args.listen))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log.info("Записей: %d, коммитов: %d", service.writes, service.commits)
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
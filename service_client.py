@@ -0,0 +1,87 @@
+import configparser
+import os
+import socket
+import threading
+from database import CONFIG_FILE
+import protocol
+
+# Адрес сервиса бронирования (service.py): переменная CASHIER_SERVICE или
+# секция [service] файла настроек:
+#   address = 127.0.0.1:8765 | unix:/run/cashier.sock
+# Без адреса касса работает с файлом базы напрямую.
+# Сколько ждать ответа сервиса, секунд
+TIMEOUT_S = 60
+
+
+def read_address():
+    address = os.environ.get("CASHIER_SERVICE")
+    if address is None:
+        config = configparser.ConfigParser()
+        config.read(CONFIG_FILE, encoding="utf-8")
+        address = config.get("service", "address", fallback="")
+    return address.strip() or None
+
+
+# Клиент сервиса. У каждого потока своё соединение: запросы одного потока идут
+# по очереди, потоки пула DbExecutor работают с сервисом параллельно. Сессия
+# вошедшего пользователя общая для всех соединений кассы.
+class ServiceClient:
+    def __init__(self, address, timeout=TIMEOUT_S):
+        self.address = address
+        self.timeout = timeout
+        self.session = None
+        self._local = threading.local()
+
+    def _connect(self):
+        if self.address.startswith("unix:"):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            target = self.address[len("unix:"):]
+        else:
+            host, port = self.address.rsplit(":", 1)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            target = (host, int(port))
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(target)
+        except OSError:
+            sock.close()
+            raise
+        return sock, sock.makefile("rb")
+
+    # Выполняет на сервисе операцию fn(db, *args) из protocol.OPERATIONS
+    def call(self, fn, *args):
+        name = protocol.NAMES.get(fn)
+        if name is None:
+            raise protocol.ServiceError(f"Операция {getattr(fn, '__name__', fn)} недоступна через сервис")
+        message = protocol.request(name, args, self.session)
+        try:
+            if getattr(self._local, "connection", None) is None:
+                self._local.connection = self._connect()
+            sock, reader = self._local.connection
+            sock.sendall(message)
+            line = reader.readline()
+            if not line:
+                raise ConnectionError("сервис закрыл соединение")
+        except OSError as e:
+            # Запрос не повторяется: запись могла уже выполниться. Следующий
+            # запрос откроет новое соединение.
+            self.close()
+            raise protocol.ServiceError(f"Нет связи с сервисом бронирования ({self.address}): {e}")
+        response = protocol.load(line)
+        if "session" in response:
+            self.session = response["session"]
+        return protocol.result(response)
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            sock, reader = connection
+            reader.close()
+            sock.close()
+
+
+def client_from_settings():
+    address = read_address()
+    return ServiceClient(address) if address else None
@@ -0,0 +1,36 @@
+import logging
+import os
+import sys
+import time
+
+# Замер запуска приложения: фазы отмечаются по ходу запуска, время — от начала
+# выполнения main.py (этот модуль импортируется первым). С CASHIER_STARTUP_REPORT=1
+# отчёт печатается в stderr, иначе пишется в журнал cashier.startup.
+REPORT = bool(os.environ.get("CASHIER_STARTUP_REPORT"))
+
+log = logging.getLogger("cashier.startup")
+
+_started = time.perf_counter()
+# (фаза, мс от начала запуска)
+phases = []
+
+
+def phase(name):
+    phases.append((name, (time.perf_counter() - _started) * 1000))
+
+
+def report_lines():
+    lines = []
+    previous = 0.0
+    for name, at in phases:
+        lines.append(f"{name:<32} {at:8.1f} мс  (+{at - previous:.1f})")
+        previous = at
+    return lines
+
+
+def report():
+    lines = report_lines()
+    if REPORT:
+        print("Запуск:", *lines, sep="\n  ", file=sys.stderr, flush=True)
+    else:
+        log.info("Запуск:\n  %s", "\n  ".join(lines))
@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Модули проекта создают движок при импорте (database.py): направляем его во
+# временный файл, чтобы тесты не трогали cashier.db, и берём дешёвый bcrypt
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.environ["CASHIER_DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'cashier.db')}"
+os.environ["CASHIER_DB_PROFILE"] = "production"
+os.environ.setdefault("CASHIER_BCRYPT_ROUNDS", "4")
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from database import Base, make_engine
+from models import City, Passenger, Station, Ticket, Train, User
+import migrations
+import refdata
+import seats
+
+START = datetime(2030, 1, 1, 10, 0)
+
+
+# Пустая база с текущей схемой в каталоге теста; кэши справочников и занятости
+# мест — общие для процесса, поэтому сбрасываются
+@pytest.fixture
+def engine(tmp_path):
+    engine = make_engine("production", f"sqlite:///{tmp_path / 'cashier.db'}")
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
+    refdata.cache.invalidate()
+    seats.inventory.clear()
+    yield engine
+    engine.dispose()
+    refdata.cache.invalidate()
+    seats.inventory.clear()
+
+
+# Сессия над базой с одним городом, двумя станциями, поездом на 100 мест,
+# кассиром и пассажиром
+@pytest.fixture
+def db(engine):
+    with sessionmaker(autocommit=False, autoflush=False, bind=engine)() as session:
+        city = City(name="Москва")
+        session.add(city)
+        session.flush()
+        session.add_all([
+            Station(name_station="Ленинградский вокзал", city_id=city.id),
+            Station(name_station="Казанский вокзал", city_id=city.id),
+            Train(train_name="Ласточка", total_seats=100),
+            User(username="cashier", firstname="Иван", lastname="Петров", password="-", email="cashier@db.local",
+                 is_admin=False),
+            Passenger(first_name="Анна", last_name="Иванова", series_passport=1234, number_passport=567890),
+        ])
+        session.commit()
+        yield session
+
+
+# Добавляет count билетов: место seat (по умолчанию — по порядку) и рейсы
+# через день, начиная с START
+@pytest.fixture
+def add_tickets(db):
+    def add(count, seat=None):
+        tickets = [Ticket(train_id=1, departure_station_id=1, arrival_station_id=2, passenger_id=1, cashier_id=1,
+                          seat_number=seat or i % 100 + 1, departure_time=START + timedelta(days=i),
+                          arrival_time=START + timedelta(days=i, hours=5))
+                   for i in range(count)]
+        db.add_all(tickets)
+        db.commit()
+        return [ticket.id for ticket in tickets]
+    return add
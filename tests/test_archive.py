@@ -0,0 +1,38 @@
+from datetime import timedelta
+from sqlalchemy import func, select
+from models import Ticket, TicketArchive, TicketTombstone, TrainDaySales, current_revision
+import archive
+import repository
+from conftest import START
+
+
+# Пачки по три: билеты уходят из "Tickets" в архив, получают отметки об
+# удалении, сводки продаж не уменьшаются, а список «с архивом» их показывает
+def test_archive_batches_keep_sales_and_archive_rows(db, add_tickets):
+    ticket_ids = add_tickets(10)
+    since = current_revision(db)
+    before = START + timedelta(days=5)
+
+    assert [archive.archive_batch(db, before, batch_size=3) for _ in range(3)] == [3, 2, 0]
+
+    archived = ticket_ids[:5]
+    assert db.scalars(select(Ticket.id).order_by(Ticket.id)).all() == ticket_ids[5:]
+    assert db.scalars(select(TicketArchive.id).order_by(TicketArchive.id)).all() == archived
+    assert db.scalar(select(func.sum(TrainDaySales.tickets))) == 10
+    assert db.scalars(select(TicketTombstone.ticket_id).where(TicketTombstone.revision > since)
+                      .order_by(TicketTombstone.ticket_id)).all() == archived
+
+    assert [row.id for row in repository.iter_ticket_rows(db)] == ticket_ids[5:]
+    assert sorted(row.id for row in repository.iter_ticket_rows(db, include_archive=True)) == ticket_ids
+    assert repository.count_tickets(db, include_archive=True) == 10
+
+    # Удаление билета не из архива по-прежнему уменьшает сводку
+    db.delete(db.get(Ticket, ticket_ids[5]))
+    db.commit()
+    assert db.scalar(select(func.sum(TrainDaySales.tickets))) == 9
+
+    # Обычный список убирает перенесённые билеты, список с архивом — нет
+    _, _, deleted = repository.fetch_changes(db, since)
+    assert sorted(deleted) == archived + ticket_ids[5:6]
+    _, _, deleted = repository.fetch_changes(db, since, repository.NO_FILTER._replace(include_archive=True))
+    assert deleted == ticket_ids[5:6]
@@ -0,0 +1,37 @@
+from passlib.hash import bcrypt
+import pytest
+from models import SchemaInfo, User
+import auth
+
+
+# Контекст хеширования строится заново, стоимость берётся из базы; подбор
+# подменён, чтобы тест не ждал настоящего bcrypt
+@pytest.fixture
+def shared_context(monkeypatch):
+    monkeypatch.delenv("CASHIER_BCRYPT_ROUNDS", raising=False)
+    monkeypatch.setattr(auth, "calibrate_rounds", lambda: 5)
+    monkeypatch.setattr(auth, "_pwd_context", None)
+    monkeypatch.setattr(auth, "_pwd_context_shared", False)
+
+
+def test_rounds_are_stored_once_for_all_cashiers(db, shared_context, monkeypatch):
+    assert auth.get_pwd_context(db).hash("x").startswith("$2b$05$")
+    assert db.get(SchemaInfo, auth.ROUNDS_KEY).value == "5"
+
+    # Другая касса подобрала бы другую стоимость, но берёт сохранённую
+    monkeypatch.setattr(auth, "calibrate_rounds", lambda: 4)
+    monkeypatch.setattr(auth, "_pwd_context", None)
+    assert auth.get_pwd_context(db).hash("x").startswith("$2b$05$")
+
+
+def test_only_cheaper_hashes_are_rehashed(db, shared_context):
+    cheaper = bcrypt.using(rounds=4).hash("secret")
+    costlier = bcrypt.using(rounds=6).hash("secret")
+    context = auth.get_pwd_context(db)
+    assert context.needs_update(cheaper)
+    assert not context.needs_update(costlier)
+
+    db.add(User(username="old", firstname="a", lastname="b", password=costlier, email="old@db.local",
+                is_admin=False))
+    db.commit()
+    assert auth.authenticate_user(db, "old", "secret").password == costlier
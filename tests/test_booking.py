@@ -0,0 +1,61 @@
+import threading
+from datetime import timedelta
+import pytest
+from sqlalchemy.orm import sessionmaker
+from models import Ticket
+import booking
+from conftest import START
+
+
+# Три ежедневных рейса одного места сдвигаются на сутки: каждый билет встаёт на
+# старое время следующего, и порядок строк в UPDATE не должен приводить к
+# ложному «место занято»
+def test_shift_tickets_onto_each_others_times(db, add_tickets):
+    ticket_ids = add_tickets(3, seat=5)
+
+    assert booking.update_tickets(db, ticket_ids, {"shift_minutes": 24 * 60}) == 3
+
+    db.expire_all()
+    tickets = db.query(Ticket).order_by(Ticket.id).all()
+    assert [ticket.seat_number for ticket in tickets] == [5, 5, 5]
+    assert [ticket.departure_time for ticket in tickets] == [START + timedelta(days=i) for i in range(1, 4)]
+
+
+def test_shift_onto_other_ticket_is_rejected(db, add_tickets):
+    ticket_ids = add_tickets(3, seat=5)
+
+    with pytest.raises(booking.BookingError):
+        booking.update_tickets(db, ticket_ids[:1], {"shift_minutes": 24 * 60})
+
+    db.expire_all()
+    tickets = db.query(Ticket).order_by(Ticket.id).all()
+    assert [ticket.departure_time for ticket in tickets] == [START + timedelta(days=i) for i in range(3)]
+    assert [ticket.seat_number for ticket in tickets] == [5, 5, 5]
+
+
+# Две кассы одновременно продают одно место на одно время: каждая в своём
+# потоке и со своим соединением. Продаёт ровно одна, другая получает отказ.
+def test_concurrent_sale_of_one_seat(engine, db):
+    form = {"train_id": 1, "seat_number": 7, "departure_time": START, "arrival_time": START + timedelta(hours=5),
+            "first_name": "Анна", "last_name": "Иванова", "middle_name": None, "series_passport": 1234,
+            "number_passport": 567890, "departure_station_id": 1, "arrival_station_id": 2, "cashier_id": 1}
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    start = threading.Barrier(2)
+    results = []
+
+    def sell():
+        with session_factory() as session:
+            start.wait()
+            try:
+                results.append(booking.save_ticket(session, dict(form)))
+            except booking.BookingError as e:
+                results.append(e)
+
+    threads = [threading.Thread(target=sell) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(type(result).__name__ for result in results) == ["BookingError", "int"]
+    assert db.query(Ticket).count() == 1
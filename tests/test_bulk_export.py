@@ -0,0 +1,63 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+from datetime import timedelta
+import pytest
+from models import Ticket, Train
+import archive
+import bulk_export
+from conftest import START
+
+
+# id билетов в файле шарда
+def file_ids(filename, fmt, compress):
+    with open(filename, "rb") as file:
+        data = file.read()
+    text = (gzip.decompress(data) if compress else data).decode("utf-8")
+    if fmt == "csv":
+        return [int(row[0]) for row in list(csv.reader(io.StringIO(text)))[1:]]
+    return [json.loads(line)["id"] for line in text.splitlines()]
+
+
+# Выгрузка с архивом двумя процессами spawn: число строк и sha256 в манифесте
+# совпадают с записанными файлами, и каждый билет попадает ровно в свой шард
+@pytest.mark.parametrize("by, fmt, compress", [("train", "csv", False), ("date", "jsonl", True)])
+def test_export_manifest_matches_files(engine, db, add_tickets, tmp_path, by, fmt, compress):
+    db.add(Train(train_name="Сапсан", total_seats=100))
+    db.commit()
+    ticket_ids = add_tickets(12)
+    for ticket_id in ticket_ids[::3]:
+        db.get(Ticket, ticket_id).train_id = 2
+    db.commit()
+    archive.archive_batch(db, START + timedelta(days=2))
+    tickets = {ticket.id: ticket for ticket in db.query(Ticket)}
+    assert len(tickets) == 10
+
+    plan = bulk_export.plan_shards(db, by, include_archive=True)
+    manifest = bulk_export.export_shards(tmp_path / "export", fmt, by, compress, include_archive=True, workers=2,
+                                         profile="production", url=str(engine.url))
+
+    assert manifest["rows"] == 12
+    assert [(shard["key"], shard["rows"]) for shard in manifest["shards"]] == [(shard.key, shard.rows)
+                                                                               for shard in plan]
+    with open(tmp_path / "export" / bulk_export.MANIFEST, encoding="utf-8") as file:
+        assert json.load(file) == manifest
+
+    exported = []
+    for shard in manifest["shards"]:
+        filename = tmp_path / "export" / shard["file"]
+        with open(filename, "rb") as file:
+            assert shard["sha256"] == hashlib.sha256(file.read()).hexdigest()
+        assert shard["size"] == os.path.getsize(filename)
+        ids = file_ids(filename, fmt, compress)
+        assert len(ids) == shard["rows"]
+        exported += ids
+        # В шарде только билеты его поезда или дня (архивные в "Tickets" не ищем)
+        for ticket in map(tickets.get, ids):
+            if ticket is not None:
+                key = ticket.train.train_name if by == "train" else ticket.departure_time.date().isoformat()
+                assert key == shard["key"]
+    assert sorted(exported) == ticket_ids
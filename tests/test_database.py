@@ -0,0 +1,25 @@
+import pytest
+from sqlalchemy.pool import QueuePool
+from database import Base, make_engine
+import migrations
+
+
+# База в памяти (sqlite://) получает пул без pool_size и max_overflow, и
+# на ней проходят все миграции; файл базы — пул из профиля
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:"])
+def test_memory_database(url):
+    engine = make_engine("production", url)
+    try:
+        Base.metadata.create_all(bind=engine)
+        migrations.upgrade(engine)
+        with engine.connect() as connection:
+            assert migrations.current_version(connection) == migrations.latest_version()
+    finally:
+        engine.dispose()
+
+
+def test_file_database_pool(tmp_path):
+    engine = make_engine("bulk-load", f"sqlite:///{tmp_path / 'cashier.db'}")
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 2
+    engine.dispose()
@@ -0,0 +1,24 @@
+import logging
+from sqlalchemy import select
+from models import Passenger
+import diagnostics
+
+
+# В журнал медленных запросов и панель попадают число и типы параметров,
+# но не сами значения: ФИО и паспорт пассажира остаются в базе
+def test_slow_query_log_hides_parameter_values(engine, db, caplog):
+    tracer = diagnostics.QueryTracer(slow_query_ms=0)
+    tracer.install(engine)
+
+    with caplog.at_level(logging.WARNING, logger=diagnostics.log.name), tracer.action("Поиск"):
+        db.scalars(select(Passenger.id).where(Passenger.last_name == "Иванова", Passenger.number_passport == 567890)
+                   .limit(5)).all()
+
+    _, slow_queries = tracer.snapshot()
+    entry = next(entry for entry in slow_queries if "Passengers" in entry.statement)
+    assert entry.action == "Поиск"
+    assert entry.parameters == "4 (str, int, int, int)"
+    assert entry.plan
+    logged = "\n".join(record.getMessage() for record in caplog.records)
+    assert "Passengers" in logged
+    assert "Иванова" not in logged and "567890" not in logged
@@ -0,0 +1,56 @@
+import csv
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from models import Passenger, Ticket, current_revision
+import importer
+
+HEADER = ["last_name", "first_name", "middle_name", "series_passport", "number_passport", "train", "seat_number",
+          "departure_station", "arrival_station", "departure_time", "arrival_time"]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(HEADER)
+        for last_name, first_name, passport, seat in rows:
+            writer.writerow([last_name, first_name, "", *passport.split(), "Ласточка", seat,
+                             "Ленинградский вокзал", "Казанский вокзал", "01.01.2030 10:00", "01.01.2030 15:00"])
+
+
+# Пачки по три строки. Пассажир 1 из conftest и новый пассажир с билетами
+# в разных пачках заводятся по одному разу. Место, занятое строкой той же пачки,
+# отклоняется; записанная прошлая пачка и билет, проданный раньше, видны через
+# общий кэш мест как проданные
+def test_import_deduplicates_passengers_and_rejects_taken_seats(engine, db, add_tickets, tmp_path):
+    add_tickets(1, seat=5)
+    since = current_revision(db)
+    path = tmp_path / "tickets.csv"
+    write_csv(path, [
+        ("Иванова", "Анна", "1234 567890", 10),
+        ("Сидоров", "Пётр", "4000 111111", 10),
+        ("Сидоров", "Пётр", "4000 111111", 11),
+        ("Сидоров", "Пётр", "4000 111111", 12),
+        ("Сидоров", "Пётр", "4000 111111", 5),
+        ("Иванова", "Анна", "1234 567890", 10),
+    ])
+
+    result = importer.import_tickets(str(path), 1, sessionmaker(bind=engine), chunk_size=3)
+
+    assert result.imported == 3
+    assert result.errors == [
+        (3, "Место занято другой строкой этого файла: поезд Ласточка, место 10"),
+        (6, "Место уже продано: поезд Ласточка, место 5"),
+        (7, "Место уже продано: поезд Ласточка, место 10"),
+    ]
+
+    db.expire_all()
+    passengers = db.execute(select(Passenger.series_passport, Passenger.number_passport, Passenger.id)).all()
+    assert sorted((series, number) for series, number, _ in passengers) == [(1234, 567890), (4000, 111111)]
+    sidorov = next(passenger_id for series, _, passenger_id in passengers if series == 4000)
+
+    tickets = db.execute(select(Ticket.seat_number, Ticket.passenger_id, Ticket.revision)
+                         .where(Ticket.revision > since).order_by(Ticket.seat_number)).all()
+    assert [(seat, passenger_id) for seat, passenger_id, _ in tickets] == [(10, 1), (11, sidorov), (12, sidorov)]
+    # Каждая пачка записывается со своей, следующей ревизией
+    assert tickets[0].revision == tickets[1].revision == since + 1
+    assert tickets[2].revision == since + 2 == current_revision(db)
@@ -0,0 +1,183 @@
+import pytest
+from database import Base, make_engine
+import migrations
+
+# Схема базы первой версии программы, до миграций
+BASELINE_SCHEMA = '''
+CREATE TABLE "Passengers" (
+    id INTEGER NOT NULL, first_name VARCHAR NOT NULL, last_name VARCHAR NOT NULL, middle_name VARCHAR,
+    email VARCHAR, series_passport SMALLINT NOT NULL, number_passport INTEGER NOT NULL, PRIMARY KEY (id)
+);
+CREATE INDEX "ix_Passengers_first_name" ON "Passengers" (first_name);
+CREATE INDEX "ix_Passengers_id" ON "Passengers" (id);
+CREATE INDEX "ix_Passengers_middle_name" ON "Passengers" (middle_name);
+CREATE INDEX "ix_Passengers_last_name" ON "Passengers" (last_name);
+CREATE UNIQUE INDEX "ix_Passengers_email" ON "Passengers" (email);
+CREATE TABLE "City" (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id));
+CREATE INDEX "ix_City_id" ON "City" (id);
+CREATE TABLE "Trains" (
+    id INTEGER NOT NULL, train_name VARCHAR, total_seats INTEGER, PRIMARY KEY (id), UNIQUE (train_name)
+);
+CREATE INDEX "ix_Trains_id" ON "Trains" (id);
+CREATE TABLE "Users" (
+    id INTEGER NOT NULL, username VARCHAR NOT NULL, firstname VARCHAR NOT NULL, lastname VARCHAR NOT NULL,
+    middle_name VARCHAR, password VARCHAR NOT NULL, email VARCHAR NOT NULL, is_admin BOOLEAN NOT NULL,
+    PRIMARY KEY (id), CONSTRAINT unique_username UNIQUE (username), CONSTRAINT unique_mail UNIQUE (email)
+);
+CREATE INDEX "ix_Users_password" ON "Users" (password);
+CREATE INDEX "ix_Users_firstname" ON "Users" (firstname);
+CREATE INDEX "ix_Users_middle_name" ON "Users" (middle_name);
+CREATE INDEX "ix_Users_email" ON "Users" (email);
+CREATE INDEX "ix_Users_username" ON "Users" (username);
+CREATE INDEX "ix_Users_id" ON "Users" (id);
+CREATE INDEX "ix_Users_lastname" ON "Users" (lastname);
+CREATE TABLE "Stations" (
+    id INTEGER NOT NULL, name_station VARCHAR NOT NULL, city_id INTEGER NOT NULL, PRIMARY KEY (id),
+    UNIQUE (name_station), FOREIGN KEY(city_id) REFERENCES "City" (id)
+);
+CREATE INDEX "ix_Stations_id" ON "Stations" (id);
+CREATE TABLE "Tickets" (
+    id INTEGER NOT NULL, train_id INTEGER, departure_station_id INTEGER, arrival_station_id INTEGER,
+    passenger_id INTEGER, departure_time DATETIME NOT NULL, arrival_time DATETIME NOT NULL,
+    seat_number INTEGER NOT NULL, cashier_id INTEGER, PRIMARY KEY (id),
+    FOREIGN KEY(train_id) REFERENCES "Trains" (id),
+    FOREIGN KEY(departure_station_id) REFERENCES "Stations" (id),
+    FOREIGN KEY(arrival_station_id) REFERENCES "Stations" (id),
+    FOREIGN KEY(passenger_id) REFERENCES "Passengers" (id),
+    FOREIGN KEY(cashier_id) REFERENCES "Users" (id)
+);
+CREATE INDEX "ix_Tickets_id" ON "Tickets" (id);
+INSERT INTO "City" VALUES (1, 'Москва');
+INSERT INTO "Stations" VALUES (1, 'Ленинградский вокзал', 1), (2, 'Казанский вокзал', 1);
+INSERT INTO "Trains" VALUES (1, 'Ласточка', 100);
+INSERT INTO "Users" VALUES (1, 'cashier', 'Иван', 'Петров', NULL, '-', 'cashier@db.local', 0);
+'''
+
+
+def add_ticket(connection, ticket_id, seat, passenger_id=1, departure="2030-01-01 10:00:00.000000", train_id=1):
+    connection.exec_driver_sql(
+        'INSERT INTO "Tickets" (id, train_id, departure_station_id, arrival_station_id, passenger_id, departure_time, '
+        'arrival_time, seat_number, cashier_id) VALUES (?, ?, 1, 2, ?, ?, ?, ?, 1)',
+        (ticket_id, train_id, passenger_id, departure, departure.replace("10:00", "15:00"), seat))
+
+
+# База первой версии программы в каталоге теста; fill(connection) добавляет в неё данные
+@pytest.fixture
+def baseline(tmp_path):
+    engines = []
+
+    def create(fill):
+        engine = make_engine("production", f"sqlite:///{tmp_path / 'baseline.db'}")
+        engines.append(engine)
+        connection = engine.raw_connection()
+        try:
+            connection.executescript(BASELINE_SCHEMA)
+            connection.commit()
+        finally:
+            connection.close()
+        with engine.begin() as connection:
+            fill(connection)
+        return engine
+
+    yield create
+    for engine in engines:
+        engine.dispose()
+
+
+# Обновление как при запуске программы (models.bootstrap): новые таблицы, затем миграции
+def upgrade(engine):
+    messages = []
+    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine, messages.append)
+    return messages
+
+
+def seat_index_sql(connection):
+    return connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'ux_Tickets_seat'").scalar()
+
+
+# Дважды проданное место: второй билет уходит в "TicketSeatConflicts" и в журнал,
+# индекс места — полный, как в модели
+def test_duplicate_seats_move_to_conflicts(baseline):
+    def fill(connection):
+        connection.exec_driver_sql('INSERT INTO "Passengers" (id, first_name, last_name, series_passport, '
+                                   'number_passport) VALUES (1, \'Анна\', \'Иванова\', 1234, 567890)')
+        for ticket_id, seat in [(1, 5), (2, 5), (3, 6)]:
+            add_ticket(connection, ticket_id, seat)
+
+    engine = baseline(fill)
+    messages = upgrade(engine)
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('SELECT id FROM "Tickets" ORDER BY id').scalars().all() == [1, 3]
+        assert connection.exec_driver_sql('SELECT id, kept_id FROM "TicketSeatConflicts"').all() == [(2, 1)]
+        assert "WHERE" not in seat_index_sql(connection).upper()
+        assert connection.exec_driver_sql('SELECT revision FROM "TicketTombstones" WHERE ticket_id = 2').scalar()
+        assert connection.exec_driver_sql('SELECT sum(tickets) FROM "TrainDaySales"').scalar() == 2
+    assert any("Билет 2 перенесён в TicketSeatConflicts" in message for message in messages)
+
+
+# База, обновлённая прежней миграцией 5 с частичным индексом, получает полный индекс
+def test_partial_seat_index_is_replaced(engine, db, add_tickets):
+    ticket_ids = add_tickets(2, seat=5)
+    with engine.begin() as connection:
+        connection.exec_driver_sql('DROP INDEX "ux_Tickets_seat"')
+        connection.exec_driver_sql(f'UPDATE "Tickets" SET departure_time = (SELECT departure_time FROM "Tickets" '
+                                   f'WHERE id = {ticket_ids[0]}) WHERE id = {ticket_ids[1]}')
+        connection.exec_driver_sql(f'CREATE UNIQUE INDEX "ux_Tickets_seat" ON "Tickets" '
+                                   f'(train_id, seat_number, departure_time) WHERE id NOT IN ({ticket_ids[1]})')
+        connection.exec_driver_sql("PRAGMA user_version = 7")
+
+    messages = []
+    migrations.upgrade(engine, messages.append)
+
+    with engine.connect() as connection:
+        assert "WHERE" not in seat_index_sql(connection).upper()
+        assert connection.exec_driver_sql('SELECT id FROM "Tickets"').scalars().all() == ticket_ids[:1]
+        assert connection.exec_driver_sql('SELECT kept_id FROM "TicketSeatConflicts"').scalars().all() == ticket_ids[:1]
+    assert len(messages) == 2
+
+
+# Пассажиры с одним паспортом объединяются в первую запись, и каждое
+# объединение попадает в журнал — с пометкой, если ФИО различаются
+def test_passport_duplicates_are_merged_and_reported(baseline):
+    def fill(connection):
+        for passenger_id, first_name, last_name in [(1, "Анна", "Иванова"), (2, "Мария", "Петрова"),
+                                                    (3, "Анна", "Иванова")]:
+            connection.exec_driver_sql('INSERT INTO "Passengers" (id, first_name, last_name, series_passport, '
+                                       'number_passport) VALUES (?, ?, ?, 1234, 567890)',
+                                       (passenger_id, first_name, last_name))
+        for ticket_id in [1, 2, 3]:
+            add_ticket(connection, ticket_id, ticket_id, passenger_id=ticket_id)
+
+    engine = baseline(fill)
+    messages = upgrade(engine)
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('SELECT id FROM "Passengers"').scalars().all() == [1]
+        assert connection.exec_driver_sql('SELECT DISTINCT passenger_id FROM "Tickets"').scalars().all() == [1]
+    assert ("  Пассажир 2 (Петрова Мария) объединён с пассажиром 1 (Иванова Анна), паспорт 1234 567890: "
+            "ФИО различаются") in messages
+    assert "  Пассажир 3 (Иванова Анна) объединён с пассажиром 1 (Иванова Анна), паспорт 1234 567890" in messages
+
+
+# После всех миграций ни один горячий запрос не просматривает таблицу целиком.
+# Билеты распределены по поездам: с одним поездом в статистике ANALYZE полный
+# просмотр для фильтра по поезду был бы верным выбором.
+def test_upgraded_baseline_has_no_full_scans(baseline):
+    def fill(connection):
+        connection.exec_driver_sql('INSERT INTO "Passengers" (id, first_name, last_name, series_passport, '
+                                   'number_passport) VALUES (1, \'Анна\', \'Иванова\', 1234, 567890)')
+        for train_id in range(2, 11):
+            connection.exec_driver_sql('INSERT INTO "Trains" VALUES (?, ?, 100)', (train_id, f"Поезд {train_id}"))
+        for ticket_id in range(1, 201):
+            add_ticket(connection, ticket_id, ticket_id // 10 + 1, train_id=ticket_id % 10 + 1)
+
+    engine = baseline(fill)
+    upgrade(engine)
+
+    with engine.connect() as connection:
+        assert migrations.current_version(connection) == migrations.latest_version()
+        failed = [(name, plan) for name, plan, ok in migrations.check_query_plans(connection) if not ok]
+    assert failed == []
@@ -0,0 +1,55 @@
+from datetime import timedelta
+from sqlalchemy import text, update
+from models import Station, Ticket, Train, User
+import migrations
+import reports
+from conftest import START
+
+
+# Сводка, посчитанная заново по "Tickets", и та, что ведут триггеры
+def summaries(db):
+    result = {}
+    for table, columns in migrations.SALES_SUMMARIES.items():
+        key = ", ".join(["date(departure_time)"] + [f"ifnull({column}, 0)" for column in columns])
+        expected = db.execute(text(f'SELECT {key}, count(*) FROM "Tickets" GROUP BY {key} ORDER BY {key}')).all()
+        actual = db.execute(text(f'SELECT * FROM "{table}" ORDER BY {", ".join(["day"] + columns)}')).all()
+        result[table] = (actual, expected)
+    return result
+
+
+def assert_summaries_match(db):
+    for table, (actual, expected) in summaries(db).items():
+        assert actual == expected, table
+
+
+# Сводки сходятся с GROUP BY по билетам после вставки, переноса на другой
+# день, поезд, маршрут и кассира, удаления и массовых UPDATE и DELETE мимо ORM
+def test_sales_summaries_follow_ticket_changes(db, add_tickets):
+    db.add_all([Train(train_name="Сапсан", total_seats=100), Station(name_station="Курский вокзал", city_id=1),
+                User(username="clerk", firstname="Пётр", lastname="Сидоров", password="-", email="clerk@db.local",
+                     is_admin=False)])
+    db.commit()
+    ticket_ids = add_tickets(20)
+    assert_summaries_match(db)
+
+    moved = db.get(Ticket, ticket_ids[0])
+    moved.departure_time += timedelta(days=1)
+    moved.arrival_time += timedelta(days=1)
+    db.get(Ticket, ticket_ids[1]).train_id = 2
+    db.get(Ticket, ticket_ids[2]).arrival_station_id = 3
+    db.get(Ticket, ticket_ids[3]).cashier_id = 2
+    db.get(Ticket, ticket_ids[4]).cashier_id = None
+    db.get(Ticket, ticket_ids[5]).seat_number = 99
+    db.delete(db.get(Ticket, ticket_ids[6]))
+    db.commit()
+    assert_summaries_match(db)
+
+    db.execute(update(Ticket).where(Ticket.id.in_(ticket_ids[10:15])).values(train_id=2, cashier_id=2))
+    db.execute(text('DELETE FROM "Tickets" WHERE id IN (:a, :b)'), {"a": ticket_ids[15], "b": ticket_ids[16]})
+    db.commit()
+    assert_summaries_match(db)
+
+    # Отчёт по сводке — то же, что и подсчёт по билетам
+    load = {row.train_name: row.tickets for row in
+            reports.train_load(db, START.date(), (START + timedelta(days=30)).date())}
+    assert load == {"Ласточка": 20 - 1 - 5 - 1 - 2, "Сапсан": 1 + 5}
@@ -0,0 +1,151 @@
+from datetime import timedelta
+import pytest
+from sqlalchemy import event, select
+from models import Passenger, Ticket, Train, current_revision
+import repository
+from conftest import START
+
+
+# Число запросов к базе при загрузке всех билетов: строки с пассажиром,
+# поездом и станциями приходят одним запросом, без запроса на каждый билет
+def load_statements(engine, db):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        rows = db.execute(repository.ticket_rows_query()).all()
+        streamed = list(repository.iter_ticket_rows(db, yield_per=100))
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert len(rows) == len(streamed)
+    return len(rows), len(statements)
+
+
+def test_ticket_rows_query_count_does_not_grow_with_tickets(engine, db, add_tickets):
+    add_tickets(10)
+    rows, few = load_statements(engine, db)
+    assert rows == 10
+
+    db.query(Ticket).delete()
+    db.commit()
+    add_tickets(1000)
+    rows, many = load_statements(engine, db)
+    assert rows == 1000
+
+    assert many == few == 2
+
+
+# Изменения после ревизии since: изменённые и новые билеты — строками,
+# удалённые — номерами; с фильтром удалёнными считаются и ушедшие из него
+def test_fetch_changes_returns_edits_deletions_and_inserts(db, add_tickets):
+    first, second, third = add_tickets(3)
+    since = current_revision(db)
+
+    db.get(Ticket, first).seat_number = 50
+    db.delete(db.get(Ticket, second))
+    new = Ticket(train_id=1, departure_station_id=1, arrival_station_id=2, passenger_id=1, cashier_id=1,
+                 seat_number=1, departure_time=START + timedelta(days=10),
+                 arrival_time=START + timedelta(days=10, hours=5))
+    db.add(new)
+    db.commit()
+
+    revision, rows, deleted = repository.fetch_changes(db, since)
+    assert revision == current_revision(db) > since
+    assert [(row.id, row.seat_number) for row in rows] == [(first, 50), (new.id, 1)]
+    assert deleted == [second]
+    assert repository.fetch_changes(db, revision) == (revision, [], [])
+
+    db.add(Train(train_name="Сапсан", total_seats=100))
+    db.flush()
+    db.get(Ticket, third).train_id = 2
+    db.commit()
+    _, rows, deleted = repository.fetch_changes(db, revision, repository.NO_FILTER._replace(train_id=1))
+    assert rows == []
+    assert deleted == [third]
+
+
+# id всех страниц списка: следующая страница выбирается по ключу последней строки предыдущей
+def page_through(db, ticket_filter, limit=4):
+    ids, after = [], None
+    while True:
+        rows = repository.fetch_ticket_page(db, ticket_filter, after, limit)
+        ids += [row.id for row in rows]
+        if len(rows) < limit:
+            return ids
+        last = rows[-1]
+        after = (last.id,) if ticket_filter.sort == "id" else (getattr(last, ticket_filter.sort), last.id)
+
+
+# По 10 билетов с одинаковым временем отправления и прибытия: страницы
+# делятся внутри группы равных ключей, и порядок внутри неё задаёт id
+@pytest.mark.parametrize("sort", ["id", "departure_time", "arrival_time"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_with_equal_sort_keys(db, sort, descending):
+    db.add(Train(train_name="Сапсан", total_seats=100))
+    tickets = [Ticket(train_id=i % 2 + 1, departure_station_id=1, arrival_station_id=2, passenger_id=1, cashier_id=1,
+                      seat_number=i + 1, departure_time=START + timedelta(days=i % 3),
+                      arrival_time=START + timedelta(days=i % 3, hours=5))
+               for i in range(30)]
+    db.add_all(tickets)
+    db.commit()
+
+    for train_id in [None, 2]:
+        ticket_filter = repository.NO_FILTER._replace(sort=sort, descending=descending, train_id=train_id)
+        selected = [ticket for ticket in tickets if train_id is None or ticket.train_id == train_id]
+        expected = sorted(selected, key=lambda ticket: (getattr(ticket, sort), ticket.id), reverse=descending)
+
+        ids = page_through(db, ticket_filter)
+        assert len(ids) == len(set(ids))
+        assert ids == [ticket.id for ticket in expected]
+
+
+def found(db, text):
+    matches = repository.passenger_matches(text)
+    return set(db.scalars(select(matches.c.passenger_id)))
+
+
+# Поиск по фрагменту ФИО или паспорта; триггеры обновляют индекс вместе с
+# пассажиром. У пассажира 1 из conftest — Анна Иванова, паспорт 1234 567890.
+def test_search_follows_passenger_changes(db, add_tickets):
+    semenov = Passenger(first_name="Пётр", last_name="Семёнов", series_passport=4510, number_passport=123456)
+    db.add(semenov)
+    db.commit()
+    add_tickets(1)
+
+    assert found(db, "иван") == {1}
+    assert found(db, "ИВАНОВА анна") == {1}
+    assert found(db, "семен") == {semenov.id}
+    assert found(db, "4510") == {semenov.id}
+    assert found(db, "4567") == {1}
+    assert found(db, "ова петр") == set()
+    rows = repository.fetch_ticket_page(db, repository.NO_FILTER._replace(search="иванова", sort="rank"))
+    assert [row.last_name for row in rows] == ["Иванова"]
+
+    db.get(Passenger, 1).last_name = "Смирнова"
+    db.commit()
+    assert found(db, "иван") == set()
+    assert found(db, "смирн") == {1}
+
+    db.delete(semenov)
+    db.commit()
+    assert found(db, "4510") == set()
+
+
+# Слишком общий запрос: в поиске участвуют первые SEARCH_LIMIT пассажиров,
+# и search_truncated просит уточнить запрос
+def test_search_truncated_at_limit(db, monkeypatch):
+    db.add_all([Passenger(first_name="Ольга", last_name="Ковалёва", series_passport=1000, number_passport=number)
+                for number in range(3)])
+    db.commit()
+
+    monkeypatch.setattr(repository, "SEARCH_LIMIT", 3)
+    assert not repository.search_truncated(db, "ковал")
+    assert len(found(db, "ковал")) == 3
+
+    monkeypatch.setattr(repository, "SEARCH_LIMIT", 2)
+    assert repository.search_truncated(db, "ковал")
+    assert len(found(db, "ковал")) == 2
+    assert not repository.search_truncated(db, "ко")
@@ -0,0 +1,125 @@
+from datetime import timedelta
+from models import Ticket, Train
+import protocol
+from conftest import START
+from seats import SeatBitmap, SeatIntervals, SeatInventory, TrainOccupancy
+
+
+# Места по обе стороны границ 64-битных слов
+BOUNDARY_SEATS = [1, 63, 64, 65, 127, 128, 129]
+
+
+def test_bitmap_take_at_word_boundaries():
+    bitmap = SeatBitmap(130, BOUNDARY_SEATS)
+
+    assert [seat for seat in range(1, 131) if bitmap.is_taken(seat)] == BOUNDARY_SEATS
+    assert bitmap.free_count() == 130 - len(BOUNDARY_SEATS)
+    assert bitmap.first_free() == 2
+    assert bitmap.first_free(63) == 66
+    assert bitmap.first_free(127) == 130
+
+
+# Места вне поезда (0 и дальше последнего) не занимаются
+def test_bitmap_ignores_seats_outside_train():
+    bitmap = SeatBitmap(100, [0, 101, 128])
+
+    assert bitmap.bits == 0
+    assert bitmap.free_count() == 100
+
+
+# Число мест не кратно размеру слова: после последнего места свободных нет
+def test_bitmap_full_train():
+    bitmap = SeatBitmap(100, range(1, 100))
+
+    assert bitmap.first_free() == 100
+    assert bitmap.free_count() == 1
+    bitmap.take(100)
+    assert bitmap.first_free() is None
+    assert bitmap.first_free(64) is None
+    assert bitmap.free_count() == 0
+    bitmap.release(64)
+    assert bitmap.first_free() == 64
+
+
+# Клиент сервиса получает карту как число bits и восстанавливает ту же занятость
+def test_bitmap_survives_protocol():
+    bitmap = SeatBitmap(130, BOUNDARY_SEATS)
+
+    decoded = protocol.decode(protocol.load(protocol.dump({"result": protocol.encode(bitmap)}))["result"])
+
+    assert decoded.total_seats == 130
+    assert decoded.bits == bitmap.bits == sum(1 << seat for seat in BOUNDARY_SEATS)
+    assert decoded.free_count() == bitmap.free_count()
+    assert decoded.first_free(63) == 66
+
+
+def hours(start, end):
+    return START + timedelta(hours=start), START + timedelta(hours=end)
+
+
+# Поездки встык: прибытие одной — отправление следующей, место свободно
+def test_touching_intervals_do_not_overlap():
+    intervals = SeatIntervals()
+    intervals.add(*hours(0, 5), 1)
+    intervals.add(*hours(10, 15), 2)
+
+    assert not intervals.overlaps(*hours(5, 10))
+    assert not intervals.overlaps(*hours(15, 20))
+    assert not intervals.overlaps(*hours(-5, 0))
+    assert intervals.overlaps(*hours(4, 6))
+    assert intervals.overlaps(*hours(9, 11))
+
+
+# Длинная поездка, внутри которой начинается и кончается короткая: префиксный
+# максимум концов находит длинную и после короткой
+def test_nested_intervals():
+    intervals = SeatIntervals()
+    intervals.add(*hours(0, 24), 1)
+    intervals.add(*hours(2, 3), 2)
+
+    assert intervals.overlaps(*hours(10, 11))
+    assert intervals.overlaps(*hours(10, 11), exclude_id=2)
+    assert not intervals.overlaps(*hours(10, 11), exclude_id=1)
+    assert intervals.overlaps(*hours(2, 3), exclude_id=1)
+
+    intervals.remove(hours(0, 24)[0], 1)
+    assert not intervals.overlaps(*hours(10, 11))
+    assert intervals.overlaps(*hours(2, 3))
+    assert len(intervals) == 1
+
+
+def test_occupancy_moves_ticket_between_seats():
+    occupancy = TrainOccupancy(1, 100)
+    occupancy.add(1, 5, *hours(0, 5))
+    assert occupancy.bitmap(*hours(1, 2)).is_taken(5)
+
+    occupancy.add(1, 6, *hours(0, 5))
+    assert occupancy.is_free(5, *hours(0, 5))
+    assert not occupancy.is_free(6, *hours(0, 5))
+    assert occupancy.bitmap(*hours(1, 2)).bits == 1 << 6
+    assert occupancy.bitmap(*hours(5, 6)).bits == 0
+
+
+# Кэш синхронизируется по ревизиям: удаление — по отметке об удалении,
+# пересадка на другой поезд убирает билет из занятости прежнего
+def test_inventory_syncs_deletions_and_moves(db, add_tickets):
+    inventory = SeatInventory()
+    train = db.get(Train, 1)
+    first, second, third = add_tickets(3, seat=5)
+
+    def free(occupancy):
+        return [occupancy.is_free(5, START + timedelta(days=i), START + timedelta(days=i, hours=1)) for i in range(3)]
+
+    occupancy = inventory.get(db, train)
+    assert free(occupancy) == [False, False, False]
+
+    db.delete(db.get(Ticket, first))
+    db.add(Train(train_name="Сапсан", total_seats=100))
+    db.flush()
+    db.get(Ticket, second).train_id = 2
+    db.commit()
+
+    # Тот же объект: кэш догрузил изменения, а не перечитал поезд
+    assert inventory.get(db, train) is occupancy
+    assert free(occupancy) == [True, True, False]
+    assert set(occupancy.tickets) == {third}
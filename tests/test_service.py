@@ -0,0 +1,53 @@
+import asyncio
+from sqlalchemy.orm import sessionmaker
+from models import Ticket
+import auth
+import protocol
+import service
+
+
+# Запросы к сервису без сети: execute() получает строку запроса, как от кассы
+def run_requests(engine, requests):
+    bookings = service.BookingService(sessionmaker(autocommit=False, autoflush=False, bind=engine), read_threads=1)
+
+    async def run():
+        bookings.queue = asyncio.Queue()
+        write_loop = asyncio.create_task(bookings._write_loop())
+        try:
+            responses = []
+            for name, args, session in requests:
+                response = protocol.load(await bookings.execute(protocol.request(name, args, session(responses))))
+                responses.append(response)
+            return responses
+        finally:
+            write_loop.cancel()
+
+    try:
+        return asyncio.run(run())
+    finally:
+        bookings.reads.shutdown()
+        bookings.writer.shutdown()
+
+
+# Сервис проверяет роль пользователя, вошедшего в кассе, а не доверяет
+# интерфейсу, который прячет кнопки
+def test_ticket_deletion_requires_admin_session(engine, db, add_tickets):
+    ticket_ids = add_tickets(1)
+    auth.create_user(db, "clerk", "Пётр", "Сидоров", "", "clerk@db.local", "secret")
+    admin = auth.create_user(db, "boss", "Ольга", "Смирнова", "", "boss@db.local", "secret")
+    admin.is_admin = True
+    db.commit()
+
+    responses = run_requests(engine, [
+        ("delete_tickets", [ticket_ids], lambda responses: None),
+        ("authenticate_user", ["clerk", "secret"], lambda responses: None),
+        ("delete_tickets", [ticket_ids], lambda responses: responses[1]["session"]),
+        ("authenticate_user", ["boss", "secret"], lambda responses: None),
+        ("delete_tickets", [ticket_ids], lambda responses: responses[3]["session"]),
+    ])
+
+    assert responses[0]["error"]["message"] == "Войдите в систему"
+    assert responses[2]["error"]["message"] == "Операция доступна только администратору"
+    assert responses[4] == {"result": 1}
+    db.expire_all()
+    assert db.query(Ticket).count() == 0
@@ -0,0 +1,81 @@
+import pytest
+from PyQt6.QtCore import QCoreApplication
+from models import Ticket
+import repository
+from ui import ticket_model
+from ui.ticket_model import TicketTableModel
+
+
+# Исполнитель без потоков: функция выполняется сразу на сессии теста
+class SyncExecutor:
+    client = None
+
+    def __init__(self, db):
+        self.db = db
+
+    def submit(self, fn, *args, on_result=None, on_error=None, key=None):
+        try:
+            result = fn(self.db, *args)
+        except Exception as e:
+            on_error(e)
+        else:
+            on_result(result)
+
+    def cancel(self, key):
+        pass
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+# Модель со всеми билетами на одной странице; resets — сколько раз она сбрасывалась
+@pytest.fixture
+def model(app, db):
+    model = TicketTableModel(page_size=1000, executor=SyncExecutor(db))
+    model.resets = []
+    model.modelReset.connect(lambda: model.resets.append(True))
+    return model
+
+
+def shown(model):
+    return [(model.ticket_id(row), model.data(model.index(row, 4))) for row in range(model.rowCount())]
+
+
+def expected(db):
+    _, rows = repository.fetch_first_page(db, limit=1000)
+    return [(row.id, str(row.seat_number)) for row in rows]
+
+
+# Несколько изменений правят строки на месте, без сброса модели
+def test_refresh_applies_few_changes_in_place(db, add_tickets, model):
+    ticket_ids = add_tickets(10)
+    model.reload()
+    model.resets.clear()
+
+    db.get(Ticket, ticket_ids[0]).seat_number = 50
+    db.delete(db.get(Ticket, ticket_ids[1]))
+    db.commit()
+    model.refresh()
+
+    assert shown(model) == expected(db)
+    assert model.resets == []
+
+
+# От BULK_CHANGES изменений хранилище пересобирается целиком со сбросом модели
+def test_refresh_rebuilds_after_bulk_changes(db, add_tickets, model, monkeypatch):
+    monkeypatch.setattr(ticket_model, "BULK_CHANGES", 20)
+    ticket_ids = add_tickets(50)
+    model.reload()
+    model.resets.clear()
+
+    for ticket_id in ticket_ids[:15]:
+        db.get(Ticket, ticket_id).seat_number = 99
+    for ticket_id in ticket_ids[40:]:
+        db.delete(db.get(Ticket, ticket_id))
+    db.commit()
+    model.refresh()
+
+    assert shown(model) == expected(db)
+    assert len(model.resets) == 1
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from types import SimpleNamespace
+import pytest
+from ui.ticket_rows import TicketRows
+from conftest import START
+
+SORTS = [("id", False), ("id", True), ("departure_time", False), ("departure_time", True), ("rank", True)]
+
+
+# Строка, как из repository.fetch_ticket_page; у билетов с одинаковым остатком
+# от деления на 3 (day) — одно время отправления и один ранг
+def row(ticket_id, seat=1, middle_name="Сергеевна", day=None):
+    day = ticket_id % 3 if day is None else day
+    departure = START + timedelta(days=day)
+    return SimpleNamespace(id=ticket_id, first_name="Анна", middle_name=middle_name, last_name="Иванова",
+                           series_passport=1234, number_passport=567890, train_name="Ласточка", seat_number=seat,
+                           departure_station="Ленинградский вокзал", arrival_station="Казанский вокзал",
+                           departure_time=departure, arrival_time=departure + timedelta(hours=5),
+                           cashier_lastname="Петров", cashier_firstname="Иван", cashier_middle_name=None,
+                           rank=day)
+
+
+def filled(sort, descending, ticket_ids):
+    rows = TicketRows(sort, descending)
+    rows.update_many([], [rows.encode(row(ticket_id)) for ticket_id in ticket_ids])
+    return rows
+
+
+def expected(rows, ticket_ids):
+    return sorted(ticket_ids, key=lambda ticket_id: rows.key(rows.encode(row(ticket_id))), reverse=rows.descending)
+
+
+# update_many удаляет, переставляет изменённые и вставляет новые строки за один
+# проход: порядок тот же, что у сортировки всех строк заново
+@pytest.mark.parametrize("sort, descending", SORTS)
+def test_update_many_keeps_sort_order(sort, descending):
+    rows = filled(sort, descending, range(1, 31))
+    assert list(rows.ids) == expected(rows, range(1, 31))
+
+    # Билет 5 меняет место и время отправления (и ранг) — на те же, что у билета 6
+    changed = rows.encode(row(5, seat=50, day=0))
+    rows.update_many([1, 2, 30, 99], [changed] + [rows.encode(row(ticket_id)) for ticket_id in [31, 32, 33]])
+
+    ticket_ids = [ticket_id for ticket_id in range(1, 34) if ticket_id not in (1, 2, 30)]
+    order = sorted(ticket_ids, key=lambda ticket_id: rows.key(changed if ticket_id == 5 else
+                                                               rows.encode(row(ticket_id))), reverse=descending)
+    assert list(rows.ids) == order
+    assert len(rows) == len(ticket_ids)
+    assert all(len(column) == len(rows) for column in rows.columns)
+    assert rows.text(rows.find(5), 4) == "50"
+    assert rows.text(rows.find(5), 7) == rows.text(rows.find(6), 7)
+
+
+# Без keep_tail строки, которые встали бы после последней загруженной, не вставляются
+def test_update_many_without_tail():
+    rows = filled("id", False, range(1, 11))
+    rows.update_many([], [rows.encode(row(ticket_id)) for ticket_id in [0, 5, 11, 12]], keep_tail=False)
+    assert list(rows.ids) == list(range(0, 11))
+
+
+@pytest.mark.parametrize("sort, descending", SORTS)
+def test_position_and_find(sort, descending):
+    ticket_ids = list(range(2, 40, 2))
+    rows = filled(sort, descending, ticket_ids)
+
+    for position in range(len(rows)):
+        assert rows.find(rows.ids[position]) == position
+        assert rows.position(rows.key_at(position)) == position
+    assert rows.find(3) is None
+    assert rows.find(100) is None
+
+    # Новая строка встаёт туда, куда её поставила бы сортировка
+    key = rows.key(rows.encode(row(3)))
+    assert rows.position(key) == expected(rows, ticket_ids + [3]).index(3)
+
+
+def test_text_formatting():
+    rows = filled("departure_time", False, [])
+    rows.update_many([], [rows.encode(row(7)), rows.encode(row(8, seat=12, middle_name=None))])
+    first, second = rows.find(7), rows.find(8)
+
+    assert [rows.text(first, column) for column in range(11)] == [
+        "7", "Анна Сергеевна Иванова", "1234 567890", "Ласточка", "1", "Ленинградский вокзал",
+        "Казанский вокзал", "2030-01-02 10:00", "2030-01-02 15:00", "Петров Иван", None,
+    ]
+    assert rows.text(second, 1) == "Анна Иванова"
+    assert rows.text(second, 4) == "12"
+    assert rows.text(second, 7) == "2030-01-03 10:00"
+    assert rows.sort_key(second) == (START + timedelta(days=2), 8)
@@ -0,0 +1,32 @@
+import logging
+from PyQt6.QtCore import QThread, pyqtSignal
+import models
+
+log = logging.getLogger("cashier.bootstrap")
+
+
+# Подготовка базы (models.bootstrap) в отдельном потоке: миграции вроде
+# пересборки "Tickets" на большой базе идут секунды, и окно входа всё это время
+# должно отрисовываться. Сообщения миграций пишутся в журнал и передаются в
+# окно сигналом message; succeeded получает True, если подготовка выполнялась.
+class BootstrapWorker(QThread):
+    message = pyqtSignal(str)
+    succeeded = pyqtSignal(bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+
+    def _log(self, message):
+        log.info(message)
+        self.message.emit(message)
+
+    def run(self):
+        try:
+            prepared = models.bootstrap(self.engine, self._log)
+        except Exception as e:
+            log.exception("Ошибка подготовки базы")
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(prepared)
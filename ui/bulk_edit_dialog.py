@@ -0,0 +1,166 @@
+from PyQt6.QtWidgets import (QDialog, QFormLayout, QHBoxLayout, QPushButton, QComboBox, QCheckBox,
+                             QSpinBox, QMessageBox, QLabel)
+
+import booking
+import diagnostics
+import refdata
+from .db_executor import get_executor
+
+
+# Массовое изменение выбранных билетов: поезд, станции и сдвиг времени поездки.
+# Меняются только отмеченные поля; всё выполняется одной транзакцией на сервере
+# (booking.update_tickets) — либо изменены все билеты, либо ни один.
+class BulkEditDialog(QDialog):
+    def __init__(self, parent, ticket_ids):
+        super().__init__(parent)
+        self.ticket_ids = list(ticket_ids)
+        self.executor = get_executor()
+        self.setup_ui()
+
+    def setup_ui(self):
+        self.setWindowTitle("Изменить билеты")
+        self.setFixedWidth(500)
+        layout = QFormLayout()
+        self.setLayout(layout)
+
+        input_style = """
+            QComboBox, QSpinBox {
+                padding: 8px;
+                border: 2px solid #BDBDBD;
+                border-radius: 4px;
+                margin: 5px;
+            }
+            QComboBox:focus, QSpinBox:focus {
+                border: 2px solid #1976D2;
+            }
+        """
+
+        layout.addRow(QLabel(f"Выбрано билетов: {len(self.ticket_ids)}"))
+
+        # Поле меняется, только если отмечен его флажок
+        self.train_name = QComboBox(self)
+        self.departure_station = QComboBox(self)
+        self.arrival_station = QComboBox(self)
+        self.checks = {}
+        for label, key, combo in [("Поезд:", "train_id", self.train_name),
+                                  ("Станция отправления:", "departure_station_id", self.departure_station),
+                                  ("Станция прибытия:", "arrival_station_id", self.arrival_station)]:
+            check = QCheckBox(label, self)
+            check.setEnabled(False)
+            check.toggled.connect(combo.setEnabled)
+            combo.setEnabled(False)
+            combo.setStyleSheet(input_style)
+            self.checks[key] = (check, combo)
+            layout.addRow(check, combo)
+
+        # Сдвиг отправления и прибытия; отрицательный — на более раннее время
+        shift_layout = QHBoxLayout()
+        self.shift_days = QSpinBox(self)
+        self.shift_days.setRange(-365, 365)
+        self.shift_days.setSuffix(" дн.")
+        self.shift_hours = QSpinBox(self)
+        self.shift_hours.setRange(-23, 23)
+        self.shift_hours.setSuffix(" ч")
+        self.shift_minutes = QSpinBox(self)
+        self.shift_minutes.setRange(-59, 59)
+        self.shift_minutes.setSuffix(" мин")
+        for spin in [self.shift_days, self.shift_hours, self.shift_minutes]:
+            spin.setStyleSheet(input_style)
+            shift_layout.addWidget(spin)
+        layout.addRow("Сдвиг времени:", shift_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.save_button = save_button = QPushButton("Сохранить")
+        save_button.setEnabled(False)
+        save_button.clicked.connect(self.save)
+        save_button.setStyleSheet("""
+            QPushButton {
+                background-color: #4CAF50;
+                color: white;
+                border: none;
+                padding: 10px;
+                border-radius: 4px;
+                min-width: 100px;
+                margin: 10px;
+            }
+            QPushButton:hover {
+                background-color: #43A047;
+            }
+            QPushButton:pressed {
+                background-color: #388E3C;
+            }
+        """)
+
+        cancel_button = QPushButton("Отмена")
+        cancel_button.clicked.connect(self.reject)
+        cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #757575;
+                color: white;
+                border: none;
+                padding: 10px;
+                border-radius: 4px;
+                min-width: 100px;
+                margin: 10px;
+            }
+            QPushButton:hover {
+                background-color: #616161;
+            }
+            QPushButton:pressed {
+                background-color: #424242;
+            }
+        """)
+
+        buttons_layout.addWidget(save_button)
+        buttons_layout.addWidget(cancel_button)
+        layout.addRow(buttons_layout)
+
+        # Справочники берём из кэша; если он ещё пуст — загружаем в фоне
+        reference = refdata.cache.peek()
+        if reference is not None:
+            self.reference_data_loaded(reference)
+        else:
+            self.executor.submit(refdata.cache.get, on_result=self.reference_data_loaded, on_error=self.show_error)
+
+    def reference_data_loaded(self, reference):
+        for train in reference.trains.values():
+            self.train_name.addItem(train.train_name, train.id)
+        for combo in [self.departure_station, self.arrival_station]:
+            for station in reference.stations.values():
+                combo.addItem(station.name_station, station.id)
+        for check, _ in self.checks.values():
+            check.setEnabled(True)
+        self.save_button.setEnabled(True)
+
+    def changes(self):
+        changes = {key: combo.currentData() for key, (check, combo) in self.checks.items() if check.isChecked()}
+        shift = (self.shift_days.value() * 24 + self.shift_hours.value()) * 60 + self.shift_minutes.value()
+        if shift:
+            changes["shift_minutes"] = shift
+        return changes
+
+    def save(self):
+        changes = self.changes()
+        if not changes:
+            QMessageBox.warning(self, "Предупреждение", "Отметьте, что изменить, или задайте сдвиг времени")
+            return
+
+        self.save_button.setEnabled(False)
+        with diagnostics.tracer.action("Массовое изменение билетов"):
+            self.executor.submit(booking.update_tickets, self.ticket_ids, changes,
+                                 on_result=self.tickets_updated, on_error=self.save_failed)
+
+    def tickets_updated(self, count):
+        self.save_button.setEnabled(True)
+        QMessageBox.information(self, "Успех", f"Изменено билетов: {count}")
+        self.accept()
+
+    def save_failed(self, error):
+        self.save_button.setEnabled(True)
+        self.show_error(error)
+
+    def show_error(self, error):
+        if isinstance(error, booking.BookingError):
+            QMessageBox.warning(self, "Ошибка", str(error))
+        else:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка базы данных: {error}")
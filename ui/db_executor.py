@@ -0,0 +1,129 @@
+import contextvars
+import threading
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from database import SessionLocal
+import service_client
+
+
+# Запрос к базе, отправленный в пул потоков. Отменённый запрос не запускается,
+# а если уже выполняется — прерывается через sqlite3.Connection.interrupt();
+# его результат в интерфейс не доставляется.
+class DbRequest:
+    def __init__(self, key=None):
+        self.key = key
+        # Контекст отправившего кода (например, текущее действие диагностики):
+        # в нём выполняется задача и вызывается обработчик результата
+        self.context = contextvars.copy_context()
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._dbapi_connection = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._dbapi_connection is not None:
+                self._dbapi_connection.interrupt()
+
+    def _attach(self, dbapi_connection):
+        with self._lock:
+            self._dbapi_connection = dbapi_connection
+            return not self.cancelled
+
+    def _detach(self):
+        with self._lock:
+            self._dbapi_connection = None
+
+
+class _DbJob(QRunnable):
+    def __init__(self, executor, request, fn, args, on_result, on_error):
+        super().__init__()
+        self.executor = executor
+        self.request = request
+        self.fn = fn
+        self.args = args
+        self.on_result = on_result
+        self.on_error = on_error
+
+    def run(self):
+        if self.request.cancelled:
+            return
+        self.request.context.copy().run(self._run)
+
+    def _run(self):
+        try:
+            if self.executor.client is not None:
+                # Режим сервиса: выполняется на сервисе, прервать его нельзя —
+                # отменённый результат просто не доставляется
+                result = self.executor.client.call(self.fn, *self.args)
+            else:
+                result = self._run_local()
+        except Exception as e:
+            self.executor._finished.emit(self.request, self.on_error, e)
+        else:
+            self.executor._finished.emit(self.request, self.on_result, result)
+
+    def _run_local(self):
+        # У каждого потока своя сессия, объекты ORM из неё в интерфейс
+        # попадают уже отсоединёнными
+        with SessionLocal() as db:
+            connection = db.connection().connection.dbapi_connection
+            if not self.request._attach(connection):
+                return None
+            try:
+                return self.fn(db, *self.args)
+            finally:
+                self.request._detach()
+
+
+# Выполняет функции вида fn(db, *args) в пуле потоков и возвращает результат
+# в поток интерфейса через сигнал. Запрос с ключом отменяет предыдущий запрос
+# с тем же ключом: например, новая перезагрузка списка — старую.
+# С клиентом сервиса (service_client) функции выполняются в сервисе бронирования.
+class DbExecutor(QObject):
+    _finished = pyqtSignal(object, object, object)
+
+    def __init__(self, parent=None, max_threads=4, client=None):
+        super().__init__(parent)
+        self.client = client
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._latest = {}
+        self._finished.connect(self._deliver)
+
+    def submit(self, fn, *args, on_result=None, on_error=None, key=None) -> DbRequest:
+        if key is not None:
+            self.cancel(key)
+        request = DbRequest(key)
+        if key is not None:
+            self._latest[key] = request
+        self.pool.start(_DbJob(self, request, fn, args, on_result, on_error))
+        return request
+
+    def cancel(self, key):
+        request = self._latest.pop(key, None)
+        if request is not None:
+            request.cancel()
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+    def _deliver(self, request, callback, payload):
+        if request.cancelled:
+            return
+        if request.key is not None and self._latest.get(request.key) is request:
+            del self._latest[request.key]
+        if callback is not None:
+            # Копия: исходный контекст ещё может быть занят потоком задачи
+            request.context.copy().run(callback, payload)
+        elif isinstance(payload, Exception):
+            raise payload
+
+
+_executor = None
+
+
+def get_executor() -> DbExecutor:
+    global _executor
+    if _executor is None:
+        _executor = DbExecutor(client=service_client.client_from_settings())
+    return _executor
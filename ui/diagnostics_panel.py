@@ -0,0 +1,211 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTabWidget, QTableWidget, QTableWidgetItem,
+                             QPlainTextEdit, QSplitter, QLabel, QSpinBox, QPushButton, QHeaderView,
+                             QAbstractItemView)
+from PyQt6.QtCore import Qt, QTimer
+import diagnostics
+
+# Как часто панель перечитывает счётчики, мс
+REFRESH_MS = 1000
+
+# Сколько символов запроса показывать в таблице; полный текст — в поле ниже
+SQL_PREVIEW = 120
+
+
+def _one_line(statement):
+    text = " ".join(statement.split())
+    return text if len(text) <= SQL_PREVIEW else text[:SQL_PREVIEW] + "…"
+
+
+def _item(value, align_right=False):
+    item = QTableWidgetItem(str(value))
+    if align_right:
+        item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+    return item
+
+
+def _table(headers):
+    table = QTableWidget(0, len(headers))
+    table.setHorizontalHeaderLabels(headers)
+    table.verticalHeader().setVisible(False)
+    table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+    table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    table.horizontalHeader().setSectionResizeMode(len(headers) - 1, QHeaderView.ResizeMode.Stretch)
+    return table
+
+
+# Панель диагностики для администратора: запросы к базе по действиям пользователя,
+# сводка по типам действий и журнал медленных запросов с планами выполнения
+class DiagnosticsPanel(QDialog):
+    def __init__(self, parent=None, tracer=diagnostics.tracer):
+        super().__init__(parent)
+        self.tracer = tracer
+        self.actions = []
+        self.slow_queries = []
+        self.setWindowTitle("Диагностика запросов")
+        self.resize(1100, 700)
+        self.setup_ui()
+        self.refresh()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        self.tabs = QTabWidget(self)
+        layout.addWidget(self.tabs)
+
+        # Последние действия: по выбранному — его самые медленные запросы
+        self.actions_table = _table(["Время", "Действие", "Запросов", "В базе, мс", "Длительность, мс",
+                                     "Самый медленный запрос"])
+        self.actions_table.itemSelectionChanged.connect(self.show_action)
+        self.action_details = QPlainTextEdit(self)
+        self.action_details.setReadOnly(True)
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        splitter.addWidget(self.actions_table)
+        splitter.addWidget(self.action_details)
+        self.tabs.addTab(splitter, "Действия")
+
+        self.summary_table = _table(["Действие", "Раз", "Запросов в среднем", "В базе в среднем, мс",
+                                     "В базе макс., мс"])
+        self.tabs.addTab(self.summary_table, "Сводка")
+
+        self.slow_table = _table(["Время", "Действие", "мс", "Полный просмотр", "Запрос"])
+        self.slow_table.itemSelectionChanged.connect(self.show_slow_query)
+        self.slow_details = QPlainTextEdit(self)
+        self.slow_details.setReadOnly(True)
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        splitter.addWidget(self.slow_table)
+        splitter.addWidget(self.slow_details)
+        self.tabs.addTab(splitter, "Медленные запросы")
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Медленный запрос — дольше, мс:", self))
+        self.threshold = QSpinBox(self)
+        self.threshold.setRange(1, 60000)
+        self.threshold.setValue(int(self.tracer.slow_query_ms))
+        self.threshold.valueChanged.connect(self.threshold_changed)
+        controls.addWidget(self.threshold)
+        controls.addStretch()
+        clear_button = QPushButton("Очистить", self)
+        clear_button.clicked.connect(self.clear)
+        controls.addWidget(clear_button)
+        close_button = QPushButton("Закрыть", self)
+        close_button.clicked.connect(self.close)
+        controls.addWidget(close_button)
+        layout.addLayout(controls)
+
+    # Таблицы обновляются по таймеру, только пока панель открыта
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def threshold_changed(self, value):
+        self.tracer.slow_query_ms = value
+
+    def clear(self):
+        self.tracer.clear()
+        self.refresh()
+
+    def refresh(self):
+        selected_action = self._selected(self.actions_table, self.actions)
+        selected_query = self._selected(self.slow_table, self.slow_queries)
+        self.actions, self.slow_queries = self.tracer.snapshot()
+        self.fill_actions(selected_action)
+        self.fill_summary()
+        self.fill_slow_queries(selected_query)
+
+    @staticmethod
+    def _selected(table, items):
+        row = table.currentRow()
+        return items[row] if 0 <= row < len(items) else None
+
+    # Новые записи добавляются сверху, поэтому выбранная запись ищется заново,
+    # чтобы выделение и детали не перескакивали при обновлении
+    @staticmethod
+    def _refill(table, rows, select=-1):
+        table.blockSignals(True)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, (value, align_right) in enumerate(values):
+                table.setItem(row, column, _item(value, align_right))
+        if select >= 0:
+            table.selectRow(select)
+        else:
+            table.clearSelection()
+        table.blockSignals(False)
+
+    @staticmethod
+    def _index(items, item):
+        for index, candidate in enumerate(items):
+            if candidate is item:
+                return index
+        return -1
+
+    def fill_actions(self, selected=None):
+        rows = []
+        for stats in self.actions:
+            slowest = stats.slowest()
+            rows.append([
+                (stats.started_at.strftime("%H:%M:%S"), False),
+                (stats.name, False),
+                (stats.queries, True),
+                (f"{stats.db_time * 1000:.1f}", True),
+                (f"{stats.duration * 1000:.1f}", True),
+                (f"{slowest[0][0] * 1000:.1f} мс: {_one_line(slowest[0][1])}" if slowest else "", False),
+            ])
+        self._refill(self.actions_table, rows, self._index(self.actions, selected))
+
+    def fill_summary(self):
+        rows = []
+        for summary in self.tracer.summary():
+            count = summary.count or 1
+            rows.append([
+                (summary.name, False),
+                (summary.count or "—", True),
+                (f"{summary.queries / count:.1f}", True),
+                (f"{summary.db_time * 1000 / count:.1f}", True),
+                (f"{summary.max_db_time * 1000:.1f}" if summary.count else "—", True),
+            ])
+        self._refill(self.summary_table, rows)
+
+    def fill_slow_queries(self, selected=None):
+        rows = []
+        for entry in self.slow_queries:
+            rows.append([
+                (entry.at.strftime("%H:%M:%S"), False),
+                (entry.action, False),
+                (f"{entry.duration_ms:.0f}", True),
+                ("да" if diagnostics.has_full_scan(entry) else "", False),
+                (_one_line(entry.statement), False),
+            ])
+        self._refill(self.slow_table, rows, self._index(self.slow_queries, selected))
+
+    def show_action(self):
+        row = self.actions_table.currentRow()
+        if not 0 <= row < len(self.actions):
+            self.action_details.clear()
+            return
+        stats = self.actions[row]
+        lines = [f"{stats.name}: {stats.queries} запросов, в базе {stats.db_time * 1000:.1f} мс", ""]
+        for duration, statement in stats.slowest():
+            lines += [f"{duration * 1000:.1f} мс", statement.strip(), ""]
+        self.action_details.setPlainText("\n".join(lines))
+
+    def show_slow_query(self):
+        row = self.slow_table.currentRow()
+        if not 0 <= row < len(self.slow_queries):
+            self.slow_details.clear()
+            return
+        entry = self.slow_queries[row]
+        plan = "\n".join(f"  {step}" for step in entry.plan) or "  —"
+        self.slow_details.setPlainText(
+            f"{entry.action}, {entry.duration_ms:.1f} мс\n\n{entry.statement.strip()}\n\n"
+            f"Параметры: {entry.parameters}\n\nПлан (EXPLAIN QUERY PLAN):\n{plan}")
@@ -0,0 +1,31 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+import diagnostics
+
+
+# Экспорт выполняется в отдельном потоке, чтобы не блокировать интерфейс.
+# Отмена — через requestInterruption(), который проверяется между пачками строк.
+class ExportWorker(QThread):
+    progress = pyqtSignal(int, int)
+    succeeded = pyqtSignal(str, int)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, filename, parent=None, include_archive=False):
+        super().__init__(parent)
+        self.filename = filename
+        self.include_archive = include_archive
+
+    def run(self):
+        # Экспорт тянет openpyxl, поэтому загружается при первом экспорте, а не при запуске
+        import exporter
+
+        try:
+            with diagnostics.tracer.action("Экспорт"):
+                rows = exporter.export_tickets(self.filename, self.progress.emit, self.isInterruptionRequested,
+                                               include_archive=self.include_archive)
+        except exporter.ExportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(self.filename, rows)
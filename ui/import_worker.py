@@ -0,0 +1,29 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+import diagnostics
+import importer
+
+
+# Импорт выполняется в отдельном потоке, как и экспорт. Отмена проверяется
+# между пачками: уже записанные пачки остаются в базе.
+class ImportWorker(QThread):
+    progress = pyqtSignal(int, int)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, filename, cashier_id, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.cashier_id = cashier_id
+
+    def run(self):
+        try:
+            with diagnostics.tracer.action("Импорт"):
+                result = importer.import_tickets(self.filename, self.cashier_id, progress=self.progress.emit,
+                                                 is_cancelled=self.isInterruptionRequested)
+        except importer.ImportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(result)
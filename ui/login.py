@@ -1,8 +1,6 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QLineEdit,
                            QPushButton, QGridLayout, QSpacerItem, QSizePolicy)
 from PyQt6.QtCore import Qt
-from database import SessionLocal
-import auth
 
 
 class LoginWidget(QWidget):
@@ -93,7 +91,7 @@ class LoginWidget(QWidget):
             }
         """
 
-        login_btn = QPushButton("Войти")
+        self.login_btn = login_btn = QPushButton("Войти")
         login_btn.clicked.connect(self.login)
         login_btn.setStyleSheet(button_style + """
             QPushButton {
@@ -145,10 +143,26 @@ class LoginWidget(QWidget):
             self.parent.show_error("Пожалуйста, заполните все поля")
             return
 
-        with SessionLocal() as db:
-            user = auth.authenticate_user(db, username, password)
-            if user:
-                self.parent.user = user
-                self.parent.show_main()
-            else:
-                self.parent.show_error("Неверное имя пользователя или пароль")
+        # Окно входа показывается до загрузки модулей базы (см. App.bootstrap в main.py);
+        # к нажатию «Войти» они уже загружены, и импорт ничего не стоит
+        import auth
+        import diagnostics
+        from .db_executor import get_executor
+
+        # Проверка пароля занимает заметное время, поэтому выполняется в фоне
+        self.login_btn.setEnabled(False)
+        with diagnostics.tracer.action("Вход"):
+            get_executor().submit(auth.authenticate_user, username, password, key="login",
+                                  on_result=self.login_finished, on_error=self.login_failed)
+
+    def login_finished(self, user):
+        self.login_btn.setEnabled(True)
+        if user:
+            self.parent.user = user
+            self.parent.show_main()
+        else:
+            self.parent.show_error("Неверное имя пользователя или пароль")
+
+    def login_failed(self, error):
+        self.login_btn.setEnabled(True)
+        self.parent.show_error(f"Ошибка при входе: {error}")
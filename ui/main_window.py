@@ -1,44 +1,75 @@
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QTableWidget,
-                             QTableWidgetItem, QDialog, QFormLayout, QLineEdit,
-                             QDateTimeEdit, QMessageBox, QHBoxLayout, QHeaderView,
-                             QDialogButtonBox, QComboBox, QSpinBox)
-from PyQt6.QtCore import Qt, QDateTime
-from database import SessionLocal
-from models import Passenger, Train, Ticket, Station
-import openpyxl
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QTableView, QAbstractItemView,
+                             QMessageBox, QHBoxLayout, QHeaderView, QProgressDialog, QFileDialog)
+from PyQt6.QtCore import Qt
 from datetime import datetime
+import os
+import diagnostics
+import importer
+import refdata
+import repository
+from .bulk_edit_dialog import BulkEditDialog
+from .db_executor import get_executor
+from .diagnostics_panel import DiagnosticsPanel
+from .export_worker import ExportWorker
+from .import_worker import ImportWorker
+from .reports_window import ReportsWindow
 from .ticket_dialog import TicketDialog
+from .ticket_filter_bar import TicketFilterBar
+from .ticket_model import TicketTableModel, HEADERS, SORTABLE_COLUMNS
 
 
 class MainWindow(QWidget):
     def __init__(self, parent=None):
         super().__init__()
         self.parent = parent
+        self.executor = get_executor()
+        self.export_worker = None
+        self.import_worker = None
+        self.diagnostics_panel = None
+        self.reports_window = None
         self.setup_ui()
         self.load_data()
+        # Справочники для формы билета загружаем заранее, чтобы она открывалась без запросов.
+        # В режиме сервиса get заполняет кэш сервиса, поэтому результат кладём в кэш кассы
+        self.executor.submit(refdata.cache.get, on_result=refdata.cache.put)
 
     def setup_ui(self):
         layout = QVBoxLayout()
         self.setLayout(layout)
 
         # Создаем таблицу
-        self.table = QTableWidget()
-        headers = ["ID", "ФИО", "Паспорт", "Название поезда", "Место", "Станция отправления", "Станция прибытия",
-                   "Время отправления", "Время прибытия", "ФИО Кассира"]
-        self.table.setColumnCount(len(headers))
-        self.table.setHorizontalHeaderLabels(headers)
+        self.model = TicketTableModel(self, executor=self.executor)
+        self.model.load_failed.connect(self.show_db_error)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.verticalHeader().setVisible(False)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        # Фиксированная высота строк: представлению не нужно измерять каждую строку
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        # Несколько билетов выделяются через Ctrl и Shift для массового изменения и удаления
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        # Фильтры и сортировка выполняются в базе; сортировать можно только
+        # по колонкам из SORTABLE_COLUMNS
+        self.filter_bar = TicketFilterBar(self)
+        self.filter_bar.changed.connect(self.apply_filter)
+        self.filter_bar.load_failed.connect(self.show_db_error)
+        sort_header = self.table.horizontalHeader()
+        sort_header.setSectionsClickable(True)
+        sort_header.setSortIndicatorShown(True)
+        sort_header.setSortIndicator(0, Qt.SortOrder.AscendingOrder)
+        sort_header.sortIndicatorChanged.connect(self.sort_changed)
         # Настраиваем внешний вид таблицы
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: white;
                 alternate-background-color: #F5F5F5;
                 border: 1px solid #E0E0E0;
                 color: black;
                 gridline-color: #E0E0E0;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
                 color: black;
             }
@@ -49,7 +80,7 @@ class MainWindow(QWidget):
                 border: none;
                 font-weight: bold;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #BBDEFB;
                 color: black;
             }
@@ -57,7 +88,7 @@ class MainWindow(QWidget):
 
         # Устанавливаем растягивание колонок
         header = self.table.horizontalHeader()
-        for i in range(len(headers)):
+        for i in range(len(HEADERS)):
             header.setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
 
         # Кнопки управления
@@ -66,18 +97,27 @@ class MainWindow(QWidget):
         buttons_data = [
             ("Добавить", "#4CAF50", self.add_passenger),
             ("Экспорт в Excel", "#FF9800", self.export_to_excel),
-            ("Обновить", "#9C27B0", self.load_data)
+            ("Импорт", "#009688", self.import_tickets),
+            ("Обновить", "#9C27B0", self.refresh_data)
         ]
 
-        if self.parent.user:
-            with SessionLocal() as db:
-                if self.parent.user.is_admin:
-                    buttons_data.append(("Редактировать", "#2196F3", self.edit_passenger))
-                    buttons_data.append(("Удалить", "#F44336", self.delete_passenger))
+        if self.parent.user and self.parent.user.is_admin:
+            buttons_data.append(("Редактировать", "#2196F3", self.edit_passenger))
+            buttons_data.append(("Удалить", "#F44336", self.delete_passenger))
+            buttons_data.append(("Отчёты", "#3F51B5", self.show_reports))
+            buttons_data.append(("Диагностика", "#607D8B", self.show_diagnostics))
+
+        # Экспорт и импорт читают и пишут файл базы напрямую, а в режиме сервиса
+        # касса его не открывает: их выполняют на компьютере сервиса
+        local_only = {self.export_to_excel: "python bulk_export.py", self.import_tickets: "python importer.py"}
 
         for text, color, callback in buttons_data:
             button = QPushButton(text)
             button.clicked.connect(callback)
+            if self.executor.client is not None and callback in local_only:
+                button.setEnabled(False)
+                button.setToolTip(f"В режиме сервиса недоступно: запустите {local_only[callback]} "
+                                  f"на компьютере сервиса")
             button.setStyleSheet(f"""
                 QPushButton {{
                     background-color: {color};
@@ -94,125 +134,209 @@ class MainWindow(QWidget):
                 QPushButton:pressed {{
                     background-color: {color}AA;
                 }}
+                QPushButton:disabled {{
+                    background-color: #BDBDBD;
+                }}
             """)
             button_layout.addWidget(button)
 
         layout.addLayout(button_layout)
+        layout.addWidget(self.filter_bar)
         layout.addWidget(self.table)
 
     def load_data(self):
-        with SessionLocal() as db:
-            tickets = db.query(Ticket).all()
-            self.table.setRowCount(len(tickets))
-
-            for i, ticket in enumerate(tickets):
-                full_name = ' '.join(
-                    [ticket.passenger.first_name, ticket.passenger.middle_name, ticket.passenger.last_name])
-                passport = ' '.join(map(str, [ticket.passenger.series_passport, ticket.passenger.number_passport]))
-                cashier_full_name = ' '.join([ticket.cashier.lastname, ticket.cashier.firstname,
-                                              ticket.cashier.middle_name]) if ticket.cashier else ""
-
-                items = [
-                    QTableWidgetItem(str(ticket.id)),
-                    QTableWidgetItem(full_name),
-                    QTableWidgetItem(passport),
-                    QTableWidgetItem(ticket.train.train_name),
-                    QTableWidgetItem(str(ticket.seat_number)),
-                    QTableWidgetItem(ticket.departure_station.name_station),
-                    QTableWidgetItem(ticket.arrival_station.name_station),
-                    QTableWidgetItem(ticket.departure_time.strftime("%Y-%m-%d %H:%M")),
-                    QTableWidgetItem(ticket.arrival_time.strftime("%Y-%m-%d %H:%M")),
-                    QTableWidgetItem(cashier_full_name),
-                ]
-
-                for j, item in enumerate(items):
-                    self.table.setItem(i, j, item)
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.model.reload()
+
+    def refresh_data(self):
+        self.model.refresh()
+
+    def apply_filter(self):
+        current = self.model.ticket_filter
+        ticket_filter = self.filter_bar.ticket_filter(current)
+        # Результаты поиска сначала показываются по релевантности; после поиска
+        # возвращаемся к порядку по номеру билета
+        if ticket_filter.search and not current.search:
+            ticket_filter = ticket_filter._replace(sort="rank", descending=False)
+        elif not ticket_filter.search and ticket_filter.sort == "rank":
+            ticket_filter = ticket_filter._replace(sort="id", descending=False)
+        self.show_sort_indicator(ticket_filter)
+        self.model.set_filter(ticket_filter)
+
+    def sort_changed(self, column, order):
+        if column in SORTABLE_COLUMNS:
+            self.model.sort(column, order)
+        else:
+            # По этой колонке база сортировать не умеет — возвращаем прежний индикатор
+            self.show_sort_indicator(self.model.ticket_filter)
+
+    def show_sort_indicator(self, ticket_filter):
+        # У релевантности нет колонки — индикатор снимаем
+        column = next((index for index, sort in SORTABLE_COLUMNS.items() if sort == ticket_filter.sort), -1)
+        header = self.table.horizontalHeader()
+        header.blockSignals(True)
+        header.setSortIndicator(column, Qt.SortOrder.DescendingOrder if ticket_filter.descending
+                                else Qt.SortOrder.AscendingOrder)
+        header.blockSignals(False)
 
     def add_passenger(self):
         dialog = TicketDialog(self, self.parent.user)
         dialog.exec()
-        self.load_data()
+        self.refresh_data()
+
+    # id выделенных билетов в порядке строк таблицы
+    def selected_ticket_ids(self):
+        rows = sorted(index.row() for index in self.table.selectionModel().selectedRows())
+        return [self.model.ticket_id(row) for row in rows]
 
     def edit_passenger(self):
-        current_row = self.table.currentRow()
-        if current_row < 0:
+        ticket_ids = self.selected_ticket_ids()
+        if not ticket_ids:
             QMessageBox.warning(self, "Предупреждение", "Выберите пассажира для редактирования")
             return
 
-        with SessionLocal() as db:
-            ticket_id = int(self.table.item(current_row, 0).text())
-            ticket = db.query(Ticket).filter_by(id=ticket_id).first()
+        # Несколько билетов меняются одним запросом в базе
+        if len(ticket_ids) > 1:
+            dialog = BulkEditDialog(self, ticket_ids)
+            dialog.exec()
+            self.refresh_data()
+            return
 
-            if not ticket:
-                QMessageBox.warning(self, "Предупреждение", "Пассажир не найден")
-                return
+        with diagnostics.tracer.action("Открытие билета"):
+            self.executor.submit(repository.load_ticket, ticket_ids[0], key="edit_ticket",
+                                 on_result=self.open_edit_dialog, on_error=self.show_db_error)
 
-            dialog = TicketDialog(self, self.parent.user, ticket)
+    def open_edit_dialog(self, ticket):
+        if not ticket:
+            # Архивные билеты не редактируются
+            QMessageBox.warning(self, "Предупреждение", "Билет не найден: он удалён или перенесён в архив")
+            return
 
+        dialog = TicketDialog(self, self.parent.user, ticket)
         dialog.exec()
-        self.load_data()
+        self.refresh_data()
 
     def delete_passenger(self):
-        current_row = self.table.currentRow()
-        if current_row < 0:
+        ticket_ids = self.selected_ticket_ids()
+        if not ticket_ids:
             QMessageBox.warning(self, "Предупреждение", "Выберите пассажира для удаления")
             return
 
-        with SessionLocal() as db:
-            ticket_id = int(self.table.item(current_row, 0).text())
-            ticket = db.query(Ticket).filter_by(id=ticket_id).first()
+        question = ("Вы уверены, что хотите удалить этого пассажира?" if len(ticket_ids) == 1
+                    else f"Вы уверены, что хотите удалить выбранные билеты ({len(ticket_ids)})?")
+        reply = QMessageBox.question(self, "Подтверждение", question,
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+
+        if reply == QMessageBox.StandardButton.Yes:
+            # Все выбранные билеты удаляются одной транзакцией, после неё — одно обновление таблицы
+            with diagnostics.tracer.action("Удаление билетов" if len(ticket_ids) > 1 else "Удаление билета"):
+                self.executor.submit(repository.delete_tickets, ticket_ids,
+                                     on_result=self.on_tickets_deleted, on_error=self.show_db_error)
 
-            if not ticket:
-                QMessageBox.warning(self, "Предупреждение", "Пассажир не найден")
-                return
+    def on_tickets_deleted(self, deleted):
+        if not deleted:
+            QMessageBox.warning(self, "Предупреждение", "Пассажир не найден")
+        self.refresh_data()
 
-            reply = QMessageBox.question(self, "Подтверждение",
-                                         "Вы уверены, что хотите удалить этого пассажира?",
-                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+    # Окно отчётов (только для администратора) не модальное, как и панель диагностики
+    def show_reports(self):
+        if self.reports_window is None:
+            self.reports_window = ReportsWindow(self)
+        else:
+            self.reports_window.refresh()
+        self.reports_window.show()
+        self.reports_window.raise_()
+        self.reports_window.activateWindow()
 
-            if reply == QMessageBox.StandardButton.Yes:
-                db.delete(ticket)
-                db.commit()
-                self.load_data()
+    # Панель диагностики (только для администратора) не модальная и живёт,
+    # пока открыто главное окно
+    def show_diagnostics(self):
+        if self.diagnostics_panel is None:
+            self.diagnostics_panel = DiagnosticsPanel(self)
+        self.diagnostics_panel.show()
+        self.diagnostics_panel.raise_()
+        self.diagnostics_panel.activateWindow()
+
+    def show_db_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка базы данных: {error}")
 
     def export_to_excel(self):
-        try:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Пассажиры"
-
-            # Записываем заголовки
-            headers = ["ID", "ФИО", "Паспорт", "Название поезда", "Место", "Станция отправления", "Станция прибытия",
-                       "Время отправления", "Время прибытия"]
-            for col, header in enumerate(headers, 1):
-                ws.cell(row=1, column=col, value=header)
-
-            # Записываем данные
-            with SessionLocal() as db:
-                tickets = db.query(Ticket).all()
-                for row, ticket in enumerate(tickets, 2):
-                    full_name = ' '.join(
-                        [ticket.passenger.first_name, ticket.passenger.middle_name, ticket.passenger.last_name])
-                    passport = ' '.join(map(str, [ticket.passenger.series_passport, ticket.passenger.number_passport]))
-
-                    values = [
-                        ticket.id,
-                        full_name,
-                        passport,
-                        ticket.train.train_name,
-                        ticket.seat_number,
-                        ticket.departure_station.name_station,
-                        ticket.arrival_station.name_station,
-                        ticket.departure_time.strftime("%Y-%m-%d %H:%M"),
-                        ticket.arrival_time.strftime("%Y-%m-%d %H:%M"),
-                    ]
-                    for col, value in enumerate(values, 1):
-                        ws.cell(row=row, column=col, value=str(value))
-
-            # Сохраняем файл
-            filename = f"passengers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            wb.save(filename)
-            QMessageBox.information(self, "Успех", f"Данные экспортированы в файл {filename}")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при экспорте данных: {str(e)}")
+        if self.export_worker and self.export_worker.isRunning():
+            return
+
+        filename = f"passengers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+        self.export_progress = QProgressDialog("Экспорт данных...", "Отмена", 0, 0, self)
+        self.export_progress.setWindowTitle("Экспорт в Excel")
+        self.export_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.export_progress.setMinimumDuration(0)
+        self.export_progress.setAutoClose(False)
+        self.export_progress.setAutoReset(False)
+
+        # Экспорт включает архив, если он показан в списке
+        self.export_worker = ExportWorker(filename, self, self.model.ticket_filter.include_archive)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.succeeded.connect(self.on_export_succeeded)
+        self.export_worker.failed.connect(self.on_export_failed)
+        self.export_worker.cancelled.connect(self.export_progress.close)
+        self.export_progress.canceled.connect(self.export_worker.requestInterruption)
+        self.export_worker.start()
+
+    def on_export_progress(self, done, total):
+        self.export_progress.setMaximum(max(total, done))
+        self.export_progress.setValue(done)
+
+    def on_export_succeeded(self, filename, rows):
+        self.export_progress.close()
+        QMessageBox.information(self, "Успех", f"Данные экспортированы в файл {filename} (строк: {rows})")
+
+    def on_export_failed(self, message):
+        self.export_progress.close()
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при экспорте данных: {message}")
+
+    def import_tickets(self):
+        if self.import_worker and self.import_worker.isRunning():
+            return
+
+        filename, _ = QFileDialog.getOpenFileName(self, "Импорт билетов", "",
+                                                  "Таблицы (*.csv *.xlsx);;Все файлы (*)")
+        if not filename:
+            return
+
+        self.import_progress = QProgressDialog("Импорт данных...", "Отмена", 0, 0, self)
+        self.import_progress.setWindowTitle("Импорт билетов")
+        self.import_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.import_progress.setMinimumDuration(0)
+        self.import_progress.setAutoClose(False)
+        self.import_progress.setAutoReset(False)
+
+        self.import_worker = ImportWorker(filename, self.parent.user.id, self)
+        self.import_worker.progress.connect(self.on_import_progress)
+        self.import_worker.succeeded.connect(self.on_import_succeeded)
+        self.import_worker.failed.connect(self.on_import_failed)
+        self.import_worker.cancelled.connect(self.on_import_cancelled)
+        self.import_progress.canceled.connect(self.import_worker.requestInterruption)
+        self.import_worker.start()
+
+    def on_import_progress(self, done, imported):
+        self.import_progress.setLabelText(f"Обработано строк: {done}, импортировано билетов: {imported}")
+
+    def on_import_succeeded(self, result):
+        self.import_progress.close()
+        self.refresh_data()
+        message = f"Импортировано билетов: {result.imported}"
+        if result.errors:
+            report = os.path.splitext(self.import_worker.filename)[0] + "_errors.csv"
+            importer.write_report(report, result.errors)
+            message += f"\nСтрок с ошибками: {len(result.errors)}, отчёт сохранён в файл {report}"
+            QMessageBox.warning(self, "Импорт", message)
+        else:
+            QMessageBox.information(self, "Успех", message)
+
+    def on_import_cancelled(self):
+        self.import_progress.close()
+        self.refresh_data()
+
+    def on_import_failed(self, message):
+        self.import_progress.close()
+        self.refresh_data()
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при импорте данных: {message}")
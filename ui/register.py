@@ -1,8 +1,6 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QLineEdit,
                              QPushButton, QGridLayout, QSpacerItem, QSizePolicy)
 from PyQt6.QtCore import Qt
-from database import SessionLocal
-import auth
 
 
 class RegisterWidget(QWidget):
@@ -113,7 +111,7 @@ class RegisterWidget(QWidget):
         layout.addWidget(self.confirm_password_input, 7, 1)
 
         # Кнопки
-        register_btn = QPushButton("Зарегистрироваться")
+        self.register_btn = register_btn = QPushButton("Зарегистрироваться")
         register_btn.clicked.connect(self.register)
         register_btn.setStyleSheet("""
             QPushButton {
@@ -215,10 +213,19 @@ class RegisterWidget(QWidget):
             self.parent.show_error("Пароли не совпадают")
             return
 
-        with SessionLocal() as db:
-            try:
-                auth.create_user(db, username, name, lastname, middlename, email, password)
-                self.parent.show_success("Регистрация успешна")
-                self.parent.show_login()
-            except Exception as e:
-                self.parent.show_error("Ошибка при регистрации: пользователь с таким именем уже занят")
+        # Модули базы к этому времени загружены (см. App.bootstrap в main.py)
+        import auth
+        from .db_executor import get_executor
+
+        self.register_btn.setEnabled(False)
+        get_executor().submit(auth.create_user, username, name, lastname, middlename, email, password,
+                              on_result=self.register_finished, on_error=self.register_failed)
+
+    def register_finished(self, user):
+        self.register_btn.setEnabled(True)
+        self.parent.show_success("Регистрация успешна")
+        self.parent.show_login()
+
+    def register_failed(self, error):
+        self.register_btn.setEnabled(True)
+        self.parent.show_error("Ошибка при регистрации: пользователь с таким именем уже занят")
@@ -0,0 +1,135 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTabWidget, QTableWidget, QTableWidgetItem,
+                             QDateEdit, QLabel, QPushButton, QHeaderView, QAbstractItemView, QMessageBox)
+from PyQt6.QtCore import Qt, QDate
+import diagnostics
+import reports
+from .db_executor import get_executor
+
+DATE_FORMAT = "%d.%m.%Y"
+
+
+def _full_name(*parts):
+    return ' '.join(part for part in parts if part)
+
+
+def _percent(sold, seats):
+    return f"{sold * 100 / seats:.1f}" if seats else "—"
+
+
+def _table(headers):
+    table = QTableWidget(0, len(headers))
+    table.setHorizontalHeaderLabels(headers)
+    table.verticalHeader().setVisible(False)
+    table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+    return table
+
+
+# Отчёты по продажам за период дат отправления: загрузка поездов, продажи по
+# маршрутам и кассирам. Данные берутся из сводок (reports.py), поэтому окно
+# открывается одинаково быстро при любом числе проданных билетов.
+class ReportsWindow(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.executor = get_executor()
+        self.setWindowTitle("Отчёты")
+        self.resize(1000, 650)
+        self.setup_ui()
+        self.refresh()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        # По умолчанию — месяц до и месяц после сегодняшнего дня
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Отправление с", self))
+        self.date_from = QDateEdit(QDate.currentDate().addDays(-30), self)
+        self.date_to = QDateEdit(QDate.currentDate().addDays(30), self)
+        for date_edit in [self.date_from, self.date_to]:
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("dd.MM.yyyy")
+        controls.addWidget(self.date_from)
+        controls.addWidget(QLabel("по", self))
+        controls.addWidget(self.date_to)
+        refresh_button = QPushButton("Показать", self)
+        refresh_button.clicked.connect(self.refresh)
+        controls.addWidget(refresh_button)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        self.tabs = QTabWidget(self)
+        layout.addWidget(self.tabs)
+        self.trains_table = _table(["Поезд", "Мест", "Дней с продажами", "Продано билетов",
+                                    "Средняя загрузка, %", "Наибольшая загрузка, %"])
+        self.tabs.addTab(self.trains_table, "Загрузка поездов")
+        self.routes_table = _table(["Дата", "Станция отправления", "Станция прибытия", "Продано билетов"])
+        self.tabs.addTab(self.routes_table, "Продажи по маршрутам")
+        self.cashiers_table = _table(["Кассир", "Дней", "Продано билетов", "В среднем за день", "Больше всего за день"])
+        self.tabs.addTab(self.cashiers_table, "Кассиры")
+
+        close_button = QPushButton("Закрыть", self)
+        close_button.clicked.connect(self.close)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(close_button)
+        layout.addLayout(buttons)
+
+    def refresh(self):
+        date_from = self.date_from.date().toPyDate()
+        date_to = self.date_to.date().toPyDate()
+        if date_to < date_from:
+            QMessageBox.warning(self, "Предупреждение", "Дата окончания периода раньше даты начала")
+            return
+
+        # Новый запрос отчёта отменяет ещё не выполненный прежний
+        with diagnostics.tracer.action("Отчёты"):
+            for fn, fill in [(reports.train_load, self.fill_trains), (reports.route_sales, self.fill_routes),
+                             (reports.cashier_sales, self.fill_cashiers)]:
+                self.executor.submit(fn, date_from, date_to, key=(fn.__name__, id(self)),
+                                     on_result=fill, on_error=self.show_error)
+
+    @staticmethod
+    def _fill(table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, (value, align_right) in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                if align_right:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                table.setItem(row, column, item)
+
+    def fill_trains(self, rows):
+        self._fill(self.trains_table, [[
+            (row.train_name, False),
+            (row.total_seats, True),
+            (row.days, True),
+            (row.tickets, True),
+            (_percent(row.tickets, row.total_seats * row.days), True),
+            (_percent(row.max_tickets, row.total_seats), True),
+        ] for row in rows])
+
+    def fill_routes(self, rows):
+        self._fill(self.routes_table, [[
+            (row.day.strftime(DATE_FORMAT), False),
+            (row.departure_station, False),
+            (row.arrival_station, False),
+            (row.tickets, True),
+        ] for row in rows])
+
+    def fill_cashiers(self, rows):
+        self._fill(self.cashiers_table, [[
+            (_full_name(row.lastname, row.firstname, row.middle_name), False),
+            (row.days, True),
+            (row.tickets, True),
+            (f"{row.tickets / row.days:.1f}", True),
+            (row.max_tickets, True),
+        ] for row in rows])
+
+    def show_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка базы данных: {error}")
+
+    def closeEvent(self, event):
+        for fn in [reports.train_load, reports.route_sales, reports.cashier_sales]:
+            self.executor.cancel((fn.__name__, id(self)))
+        super().closeEvent(event)
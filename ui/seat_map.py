@@ -0,0 +1,135 @@
+from PyQt6.QtWidgets import QWidget, QToolTip
+from PyQt6.QtCore import Qt, QEvent, QRect, QSize, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QPainter, QPen
+
+# Клетка места и промежуток между клетками, пикселей; мест в ряду
+CELL_SIZE = 20
+CELL_SPACING = 2
+COLUMNS = 20
+PITCH = CELL_SIZE + CELL_SPACING
+
+UNKNOWN_COLOR = QColor("#F5F5F5")
+FREE_COLOR = QColor("#C8E6C9")
+TAKEN_COLOR = QColor("#BDBDBD")
+SELECTED_COLOR = QColor("#1976D2")
+# Выбрано занятое место
+CONFLICT_COLOR = QColor("#E53935")
+
+
+# Схема мест поезда: клетка на каждое место, свободные — зелёные, занятые —
+# серые, выбранное — синее (красное, если оно занято). Занятость задаётся
+# битовой картой мест (seats.SeatBitmap). При новой карте перерисовываются
+# только клетки, чья занятость изменилась, а paintEvent рисует только клетки
+# из области перерисовки, поэтому схема поезда в 1000 мест не тормозит ни при
+# обновлении, ни при прокрутке. Щелчок по свободному месту — сигнал seat_clicked.
+class SeatMap(QWidget):
+    seat_clicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.total_seats = 0
+        # Биты занятых мест (бит с номером места), как в SeatBitmap
+        self.taken = 0
+        # Занятость ещё не загружена: клетки рисуются без цвета
+        self.loaded = False
+        self.selected = None
+        font = QFont(self.font())
+        font.setPointSize(7)
+        self.setFont(font)
+        self.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.set_total_seats(0)
+
+    def rows(self):
+        return (self.total_seats + COLUMNS - 1) // COLUMNS
+
+    def sizeHint(self):
+        return QSize(COLUMNS * PITCH + CELL_SPACING, max(self.rows(), 1) * PITCH + CELL_SPACING)
+
+    def cell_rect(self, seat):
+        row, column = divmod(seat - 1, COLUMNS)
+        return QRect(CELL_SPACING + column * PITCH, CELL_SPACING + row * PITCH, CELL_SIZE, CELL_SIZE)
+
+    def seat_at(self, point):
+        column, x = divmod(point.x() - CELL_SPACING, PITCH)
+        row, y = divmod(point.y() - CELL_SPACING, PITCH)
+        if point.x() < CELL_SPACING or point.y() < CELL_SPACING or x >= CELL_SIZE or y >= CELL_SIZE:
+            return None
+        if column >= COLUMNS:
+            return None
+        seat = row * COLUMNS + column + 1
+        return seat if seat <= self.total_seats else None
+
+    def is_taken(self, seat):
+        return bool(self.taken >> seat & 1)
+
+    # Другой поезд: занятость неизвестна до следующей set_occupancy
+    def set_total_seats(self, total_seats):
+        self.total_seats = total_seats
+        self.taken = 0
+        self.loaded = False
+        self.setFixedSize(self.sizeHint())
+        self.update()
+
+    def set_occupancy(self, bitmap):
+        if bitmap.total_seats != self.total_seats:
+            self.set_total_seats(bitmap.total_seats)
+        if not self.loaded:
+            self.taken = bitmap.bits
+            self.loaded = True
+            self.update()
+            return
+
+        changed = self.taken ^ bitmap.bits
+        self.taken = bitmap.bits
+        while changed:
+            lowest = changed & -changed
+            self.update(self.cell_rect(lowest.bit_length() - 1))
+            changed ^= lowest
+
+    def set_selected(self, seat):
+        previous, self.selected = self.selected, seat
+        for changed in {previous, seat}:
+            if changed and changed <= self.total_seats:
+                self.update(self.cell_rect(changed))
+
+    def _color(self, seat):
+        if seat == self.selected:
+            return CONFLICT_COLOR if self.is_taken(seat) else SELECTED_COLOR
+        if not self.loaded:
+            return UNKNOWN_COLOR
+        return TAKEN_COLOR if self.is_taken(seat) else FREE_COLOR
+
+    def paintEvent(self, event):
+        area = event.rect()
+        first_row = max(0, (area.top() - CELL_SPACING) // PITCH)
+        last_row = min(self.rows() - 1, area.bottom() // PITCH)
+        border = QPen(QColor("#9E9E9E"))
+        painter = QPainter(self)
+        for row in range(first_row, last_row + 1):
+            for seat in range(row * COLUMNS + 1, min(row * COLUMNS + COLUMNS, self.total_seats) + 1):
+                rect = self.cell_rect(seat)
+                painter.fillRect(rect, self._color(seat))
+                painter.setPen(border)
+                painter.drawRect(rect.adjusted(0, 0, -1, -1))
+                painter.setPen(Qt.GlobalColor.white if seat == self.selected else Qt.GlobalColor.black)
+                painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, str(seat))
+        painter.end()
+
+    def mousePressEvent(self, event):
+        seat = self.seat_at(event.position().toPoint())
+        if event.button() == Qt.MouseButton.LeftButton and seat and self.loaded and not self.is_taken(seat):
+            self.seat_clicked.emit(seat)
+        super().mousePressEvent(event)
+
+    def event(self, event):
+        if event.type() == QEvent.Type.ToolTip:
+            seat = self.seat_at(event.pos())
+            if seat is None:
+                QToolTip.hideText()
+            elif not self.loaded:
+                QToolTip.showText(event.globalPos(), f"Место {seat}", self)
+            else:
+                QToolTip.showText(event.globalPos(), f"Место {seat}: {'занято' if self.is_taken(seat) else 'свободно'}",
+                                  self)
+            return True
+        return super().event(event)
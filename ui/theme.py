@@ -0,0 +1,87 @@
+import json
+import os
+from importlib.util import find_spec
+from PyQt6.QtCore import QDir
+from PyQt6.QtGui import QColor, QFontDatabase, QGuiApplication, QPalette
+
+THEME = "light_teal.xml"
+
+# Каталог темы внутри ~/.qt_material: свой, чтобы другие приложения
+# на qt_material не перекрашивали наши иконки
+ICONS_PARENT = "cashier"
+
+# Сборка темы qt_material (импорт пакета, генерация иконок, шаблон jinja2) занимает
+# около 200 мс. Тема собирается один раз публичной qt_material.export_theme в
+# THEME_DIR: таблица стилей, ссылающаяся на иконки как icon:/, и сами иконки.
+# При следующих запусках таблица применяется из файла, без импорта qt_material;
+# кэш пересобирается, если сменилась тема или версия qt_material.
+THEME_DIR = os.path.join(os.path.expanduser("~"), ".qt_material", ICONS_PARENT)
+ICONS_DIR = os.path.join(THEME_DIR, "icons")
+STYLESHEET_FILE = os.path.join(THEME_DIR, "stylesheet.qss")
+CACHE_FILE = os.path.join(THEME_DIR, "theme.json")
+
+
+def _package_dir():
+    # find_spec находит пакет, не выполняя его
+    return os.path.dirname(find_spec("qt_material").origin)
+
+
+def _cache_key(theme):
+    init = os.path.join(_package_dir(), "__init__.py")
+    return f"{theme}:{os.path.getmtime(init)}"
+
+
+def _read_cache(key):
+    try:
+        with open(CACHE_FILE, encoding="utf-8") as file:
+            cached = json.load(file)
+        with open(STYLESHEET_FILE, encoding="utf-8") as file:
+            cached["stylesheet"] = file.read()
+    except (OSError, ValueError):
+        return None
+    if cached.get("key") != key or not os.path.isdir(os.path.join(ICONS_DIR, "primary")):
+        return None
+    return cached
+
+
+# Собирает тему в THEME_DIR; None — если записать её не удалось
+def _build(theme, key):
+    from qt_material import export_theme, get_theme
+
+    try:
+        os.makedirs(THEME_DIR, exist_ok=True)
+        export_theme(theme, qss=STYLESHEET_FILE, output=ICONS_DIR)
+        cached = {"key": key, "primary": get_theme(theme)["primaryColor"]}
+        with open(CACHE_FILE, "w", encoding="utf-8") as file:
+            json.dump(cached, file)
+    except OSError:
+        return None
+    return _read_cache(key)
+
+
+# Шрифты Roboto из пакета, на которые ссылается таблица стилей, каталог иконок
+# для ссылок icon:/, цвет подсказок в полях ввода и сама таблица
+def _apply(app, cached):
+    fonts = os.path.join(_package_dir(), "fonts", "roboto")
+    for font in sorted(os.listdir(fonts)):
+        if font.endswith(".ttf"):
+            QFontDatabase.addApplicationFont(os.path.join(fonts, font))
+    QDir.addSearchPath("icon", ICONS_DIR)
+
+    palette = QGuiApplication.palette()
+    color = QColor(cached["primary"])
+    color.setAlpha(92)
+    palette.setColor(QPalette.ColorRole.PlaceholderText, color)
+    QGuiApplication.setPalette(palette)
+    app.setStyleSheet(cached["stylesheet"])
+
+
+def apply_theme(app, theme=THEME):
+    key = _cache_key(theme)
+    cached = _read_cache(key) or _build(theme, key)
+    if cached is None:
+        # Каталог темы недоступен для записи: тема собирается при каждом запуске
+        from qt_material import apply_stylesheet
+        apply_stylesheet(app, theme=theme, parent=ICONS_PARENT)
+        return
+    _apply(app, cached)
@@ -1,20 +1,24 @@
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QTableWidget,
-                             QTableWidgetItem, QDialog, QFormLayout, QLineEdit,
-                             QDateTimeEdit, QMessageBox, QHBoxLayout, QHeaderView,
-                             QDialogButtonBox, QComboBox, QSpinBox)
-from PyQt6.QtCore import Qt, QDateTime
-from sqlalchemy import update
+from PyQt6.QtWidgets import (QPushButton, QDialog, QFormLayout, QLineEdit, QDateTimeEdit,
+                             QMessageBox, QHBoxLayout, QComboBox, QSpinBox, QLabel, QScrollArea)
+from PyQt6.QtCore import Qt, QDateTime, QTimer
 
-from database import SessionLocal
-from models import Passenger, Train, Ticket, Station
-import openpyxl
-from datetime import datetime
+from models import Ticket
+import booking
+import diagnostics
+import refdata
+from .db_executor import get_executor
+from .seat_map import SeatMap
+
+# Сколько мс ждать после изменения поезда или времени поездки, прежде чем
+# загружать занятость мест
+SEATS_DEBOUNCE_MS = 300
 
 
 class TicketDialog(QDialog):
     def __init__(self, parent, user, ticket: Ticket = None):
         super().__init__(parent)
         self.user = user
+        self.executor = get_executor()
 
         self.ticket = ticket
         self.setup_ui()
@@ -51,32 +55,19 @@ class TicketDialog(QDialog):
         self.number_passport.setInputMask("000000")
         self.number_passport.setText(str(self.ticket.passenger.number_passport) if self.ticket else "")
 
-        with SessionLocal() as db:
-            trains = [train.train_name for train in db.query(Train).all()]
-            self.train_name = QComboBox(self)
-            self.train_name.addItems(trains)
-            self.train_name.setCurrentIndex(
-                self.train_name.findData(self.ticket.train.train_name) if self.ticket else 0)
-            self.train_name.currentTextChanged.connect(self.update_seats_range)
-
-            stations = [station.name_station for station in db.query(Station).all()]
-
-            self.departure_station = QComboBox(self)
-            self.departure_station.addItems(stations)
-            self.departure_station.setCurrentIndex(
-                self.departure_station.findData(self.ticket.departure_station.name_station) if self.ticket else 0)
-
-            self.arrival_station = QComboBox(self)
-            self.arrival_station.addItems(stations)
-            self.arrival_station.setCurrentIndex(
-                self.arrival_station.findData(self.ticket.arrival_station.name_station) if self.ticket else 0)
+        # Combo-боксы хранят id поездов и станций в данных элементов
+        self.reference = None
+        self.train_name = QComboBox(self)
+        self.departure_station = QComboBox(self)
+        self.arrival_station = QComboBox(self)
+        for combo in [self.train_name, self.departure_station, self.arrival_station]:
+            combo.setEnabled(False)
 
         self.seat_number = QSpinBox(self)
+        self.seat_number.setRange(1, self.ticket.train.total_seats if self.ticket else 1)
         if self.ticket:
             self.seat_number.setValue(self.ticket.seat_number)
 
-        self.update_seats_range()
-
         self.departure_time = QDateTimeEdit(self)
         self.arrival_time = QDateTimeEdit(self)
 
@@ -106,14 +97,30 @@ class TicketDialog(QDialog):
         layout.addRow("Время прибытия:", self.arrival_time)
         layout.addRow("Номер места:", self.seat_number)
 
-        # Добавляем кнопку проверки свободных мест
-        check_seats_btn = QPushButton("Проверить свободные места")
-        check_seats_btn.clicked.connect(self.check_available_seats)
-        layout.addRow(check_seats_btn)
+        # Схема мест поезда на время поездки: щелчок по свободному месту выбирает его
+        self.seats_label = QLabel(self)
+        layout.addRow(self.seats_label)
+        self.seat_map = SeatMap(self)
+        self.seat_map.set_selected(self.seat_number.value())
+        self.seat_map.seat_clicked.connect(self.seat_number.setValue)
+        self.seat_number.valueChanged.connect(self.seat_map.set_selected)
+        seat_scroll = QScrollArea(self)
+        seat_scroll.setWidget(self.seat_map)
+        seat_scroll.setAlignment(Qt.AlignmentFlag.AlignHCenter)
+        seat_scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        seat_scroll.setFixedHeight(200)
+        layout.addRow(seat_scroll)
+
+        self.seats_timer = QTimer(self)
+        self.seats_timer.setSingleShot(True)
+        self.seats_timer.setInterval(SEATS_DEBOUNCE_MS)
+        self.seats_timer.timeout.connect(self.check_available_seats)
+        # Рейс, занятость которого запрошена последней; ответы на прежние запросы не показываются
+        self.seats_request = None
 
         # Кнопки
         buttons_layout = QHBoxLayout()
-        save_button = QPushButton("Сохранить")
+        self.save_button = save_button = QPushButton("Сохранить")
         save_button.clicked.connect(self.save)
         save_button.setStyleSheet("""
             QPushButton {
@@ -157,142 +164,128 @@ class TicketDialog(QDialog):
         buttons_layout.addWidget(cancel_button)
         layout.addRow(buttons_layout)
 
-    def update_seats_range(self):
-        with SessionLocal() as db:
-            train = db.query(Train).filter(
-                Train.train_name == self.train_name.currentText()
-            ).first()
-
-            self.seat_number.setRange(1, train.total_seats if train else 1)
+        # Справочники берём из кэша; если он ещё пуст — загружаем в фоне
+        reference = refdata.cache.peek()
+        if reference is not None:
+            self.reference_data_loaded(reference)
+        else:
+            self.save_button.setEnabled(False)
+            self.executor.submit(refdata.cache.get, on_result=self.reference_data_loaded, on_error=self.show_error)
+
+    def reference_data_loaded(self, reference):
+        self.reference = reference
+
+        for train in reference.trains.values():
+            self.train_name.addItem(train.train_name, train.id)
+        self.train_name.setCurrentIndex(max(self.train_name.findData(self.ticket.train_id), 0) if self.ticket else 0)
+        self.train_name.currentIndexChanged.connect(self.update_seats_range)
+        self.train_name.currentIndexChanged.connect(self.schedule_seats)
+        self.departure_time.dateTimeChanged.connect(self.schedule_seats)
+        self.arrival_time.dateTimeChanged.connect(self.schedule_seats)
+
+        for combo, station_id in [(self.departure_station, self.ticket.departure_station_id if self.ticket else None),
+                                  (self.arrival_station, self.ticket.arrival_station_id if self.ticket else None)]:
+            for station in reference.stations.values():
+                combo.addItem(station.name_station, station.id)
+            combo.setCurrentIndex(max(combo.findData(station_id), 0) if self.ticket else 0)
+
+        seat = self.seat_number.value()
+        self.update_seats_range()
+        self.seat_number.setValue(seat)
 
-    def check_available_seats(self):
-        train_name = self.train_name.currentText()
-        if not train_name:
-            QMessageBox.warning(self, "Ошибка", "Введите название поезда")
-            return
+        for widget in [self.train_name, self.departure_station, self.arrival_station, self.save_button]:
+            widget.setEnabled(True)
+        self.check_available_seats()
 
-        with SessionLocal() as db:
-            # Прверяем наличие поезда
-            train = db.query(Train).filter(
-                Train.train_name == train_name,
-            ).first()
+    def update_seats_range(self):
+        train = self.reference.trains.get(self.train_name.currentData()) if self.reference else None
+        self.seat_number.setRange(1, train.total_seats if train else 1)
+        self.seat_map.set_total_seats(train.total_seats if train else 0)
+        self.seat_map.set_selected(self.seat_number.value())
 
-            if not train:
-                QMessageBox.warning(self, "Ошибка", "Поезд не найден")
-                return
+    def departure_datetime(self):
+        # Время поездки храним с точностью до минуты
+        return self.departure_time.dateTime().toPyDateTime().replace(second=0, microsecond=0)
 
-            # Получаем занятые места
-            occupied_seats = db.query(Ticket.seat_number).filter(
-                Ticket.train_id == train.id
-            ).all()
+    def arrival_datetime(self):
+        return self.arrival_time.dateTime().toPyDateTime().replace(second=0, microsecond=0)
 
-            occupied_seats = set(str(seat[0]) for seat in occupied_seats)
-            all_seats = set(str(i) for i in range(1, train.total_seats + 1))
+    def schedule_seats(self):
+        self.seats_timer.start()
 
-            # Создаем список свободных мест
-            available_seats = all_seats - occupied_seats
+    # Занятость мест рейса приходит битовой картой из кэша занятости (seats.inventory):
+    # один запрос при первой загрузке поезда, дальше — только изменённые билеты
+    def check_available_seats(self):
+        self.seats_timer.stop()
+        train_id = self.train_name.currentData()
+        if train_id is None:
+            return
+        if self.arrival_datetime() <= self.departure_datetime():
+            self.seats_request = None
+            self.seats_label.setText("Время прибытия должно быть позже времени отправления")
+            return
 
-            # Показываем диалог со свободными местами
-            msg = QMessageBox()
-            msg.setWindowTitle("Свободные места")
-            msg.setText(f"Свободные места в поезде {train_name}:\n" +
-                        ", ".join(sorted(available_seats, key=lambda x: int(x))))
-            msg.exec()
+        request = (train_id, self.departure_datetime(), self.arrival_datetime())
+        self.seats_request = request
+        self.seats_label.setText("Загрузка занятости мест…")
+        with diagnostics.tracer.action("Проверка мест"):
+            self.executor.submit(booking.available_seats, *request, self.ticket.id if self.ticket else None,
+                                 key=("seats", id(self)),
+                                 on_result=lambda result: self.show_available_seats(request, *result),
+                                 on_error=self.show_error)
+
+    def show_available_seats(self, request, total_seats, seat_map):
+        if request != self.seats_request:
+            return
+        self.seats_label.setText(f"Свободно мест: {seat_map.free_count()} из {total_seats} — выберите место на схеме")
+        self.seat_map.set_occupancy(seat_map)
 
     def save(self):
-        if self.save_ticket():
-            self.accept()
-
-    def save_ticket(self) -> bool:
-        with SessionLocal() as db:
-            # Прверяем наличие поезда
-            train = db.query(Train).filter(
-                Train.train_name == self.train_name.currentText(),
-            ).first()
-
-            if not train:
-                QMessageBox.warning(self, "Ошибка", "Поезд не найден")
-                return False
-
-            seat_number = 0
-            try:
-                seat_number = int(self.seat_number.text())
-            except ValueError:
-                QMessageBox.warning(self, "Ошибка", "Неправильное место!")
-                return False
-
-            # Проверяем, не занято ли место
-            existing_seat = db.query(Ticket).filter(
-                Ticket.id != self.ticket.id,
-                Ticket.train_id == train.id,
-                Ticket.seat_number == seat_number,
-            ).first() if self.ticket else db.query(Ticket).filter(
-                Ticket.train_id == train.id,
-                Ticket.seat_number == seat_number,
-            ).first()
-
-            if existing_seat:
-                QMessageBox.warning(self, "Ошибка", "Это место уже занято!")
-                return False
-
-            passenger = db.query(Passenger).filter(
-                Passenger.series_passport == self.series_passport.text(),
-                Passenger.number_passport == self.number_passport.text(),
-            ).first()
-
-            if not passenger:
-                passenger = Passenger(
-                    first_name=self.first_name.text(),
-                    last_name=self.last_name.text(),
-                    middle_name=self.middle_name.text(),
-                    number_passport=self.number_passport.text(),
-                    series_passport=self.series_passport.text(),
-                )
-                db.add(passenger)
-                db.commit()
-
-            departure_station = db.query(Station).filter(
-                Station.name_station == self.departure_station.currentText(),
-            ).first()
-
-            if not departure_station:
-                QMessageBox.warning(self, "Ошибка", "Станция отправления не найдена!")
-                return False
-
-            arrival_station = db.query(Station).filter(
-                Station.name_station == self.arrival_station.currentText(),
-            ).first()
-
-            if not arrival_station:
-                QMessageBox.warning(self, "Ошибка", "Станция прибытия не найдена!")
-                return False
-
-            if not self.ticket:
-
-                ticket = Ticket(
-                    train_id=train.id,
-                    passenger_id=passenger.id,
-                    departure_station_id=departure_station.id,
-                    arrival_station_id=arrival_station.id,
-                    departure_time=self.departure_time.dateTime().toPyDateTime(),
-                    arrival_time=self.arrival_time.dateTime().toPyDateTime(),
-                    seat_number=self.seat_number.text(),
-                    cashier_id=self.user.id,
-                )
-                db.add(ticket)
-            else:
-                self.ticket = db.query(Ticket).filter_by(id=self.ticket.id).first()
-
-                self.ticket.train_id = train.id
-                self.ticket.passenger_id = passenger.id
-                self.ticket.departure_station_id = departure_station.id
-                self.ticket.arrival_station_id = arrival_station.id
-                self.ticket.departure_time = self.departure_time.dateTime().toPyDateTime()
-                self.ticket.arrival_time = self.arrival_time.dateTime().toPyDateTime()
-                self.ticket.seat_number = self.seat_number.text()
-                self.ticket.cashier_id = self.user.id
-
-            db.commit()
-
-            QMessageBox.information(self, "Успех", "Пассажир успешно добавлен")
-            return True
+        self.save_ticket()
+
+    def form_values(self):
+        return {
+            "ticket_id": self.ticket.id if self.ticket else None,
+            "first_name": self.first_name.text(),
+            "last_name": self.last_name.text(),
+            "middle_name": self.middle_name.text(),
+            "series_passport": self.series_passport.text(),
+            "number_passport": self.number_passport.text(),
+            "train_id": self.train_name.currentData(),
+            "seat_number": self.seat_number.value(),
+            "departure_station_id": self.departure_station.currentData(),
+            "arrival_station_id": self.arrival_station.currentData(),
+            "departure_time": self.departure_datetime(),
+            "arrival_time": self.arrival_datetime(),
+            "cashier_id": self.user.id,
+        }
+
+    # Сохранение идёт в фоне; кнопка недоступна, пока запрос не завершится
+    def save_ticket(self):
+        self.save_button.setEnabled(False)
+        with diagnostics.tracer.action("Сохранение билета"):
+            self.executor.submit(booking.save_ticket, self.form_values(),
+                                 on_result=self.ticket_saved, on_error=self.save_failed)
+
+    def ticket_saved(self, ticket_id):
+        self.save_button.setEnabled(True)
+        QMessageBox.information(self, "Успех", "Пассажир успешно добавлен")
+        self.accept()
+
+    def save_failed(self, error):
+        self.save_button.setEnabled(True)
+        self.show_error(error)
+        # Место могли занять с другой кассы — схема показывает актуальную занятость
+        self.check_available_seats()
+
+    def show_error(self, error):
+        if isinstance(error, booking.BookingError):
+            QMessageBox.warning(self, "Ошибка", str(error))
+        else:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка базы данных: {error}")
+
+    def reject(self):
+        self.seats_timer.stop()
+        self.executor.cancel(("seats", id(self)))
+        super().reject()
+
@@ -0,0 +1,145 @@
+from PyQt6.QtWidgets import (QWidget, QHBoxLayout, QComboBox, QCheckBox, QDateEdit, QPushButton, QLabel,
+                             QLineEdit)
+from PyQt6.QtCore import QDate, QTimer, pyqtSignal
+import diagnostics
+import refdata
+import repository
+from .db_executor import get_executor
+
+# Сколько мс ждать после последнего изменения фильтра, прежде чем отправить запрос
+DEBOUNCE_MS = 300
+
+
+# Панель фильтров над списком билетов. Изменения копятся DEBOUNCE_MS и только
+# потом отправляются одним сигналом changed — быстрый перебор дат или поездов
+# не порождает запрос на каждое нажатие.
+class TicketFilterBar(QWidget):
+    changed = pyqtSignal()
+    # Ошибка загрузки справочников или списка кассиров
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.executor = get_executor()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DEBOUNCE_MS)
+        self.timer.timeout.connect(self.filter_changed)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(10, 0, 10, 0)
+
+        # Быстрый поиск по ФИО и паспорту: фрагменты от трёх символов в любом месте
+        self.search = QLineEdit(self)
+        self.search.setPlaceholderText("Поиск: фамилия, имя или паспорт")
+        self.search.setClearButtonEnabled(True)
+        self.search.setMinimumWidth(240)
+        self.search.textChanged.connect(self.schedule)
+        layout.addWidget(self.search)
+
+        # Combo-боксы хранят id в данных элементов, None — «все»
+        self.train = QComboBox(self)
+        self.departure_station = QComboBox(self)
+        self.arrival_station = QComboBox(self)
+        self.cashier = QComboBox(self)
+        for combo, text in [(self.train, "Все поезда"), (self.departure_station, "Все станции отправления"),
+                            (self.arrival_station, "Все станции прибытия"), (self.cashier, "Все кассиры")]:
+            combo.addItem(text, None)
+            combo.setEnabled(False)
+            combo.currentIndexChanged.connect(self.schedule)
+            layout.addWidget(combo)
+
+        self.use_dates = QCheckBox("Даты с", self)
+        self.date_from = QDateEdit(QDate.currentDate(), self)
+        self.date_to = QDateEdit(QDate.currentDate().addDays(30), self)
+        for date_edit in [self.date_from, self.date_to]:
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("dd.MM.yyyy")
+            date_edit.setEnabled(False)
+            date_edit.dateChanged.connect(self.schedule)
+        self.use_dates.toggled.connect(self.dates_toggled)
+        layout.addWidget(self.use_dates)
+        layout.addWidget(self.date_from)
+        layout.addWidget(QLabel("по", self))
+        layout.addWidget(self.date_to)
+
+        # Билеты состоявшихся поездок, перенесённые в архив (archive.py)
+        self.include_archive = QCheckBox("С архивом", self)
+        self.include_archive.toggled.connect(self.schedule)
+        layout.addWidget(self.include_archive)
+
+        reset_button = QPushButton("Сбросить", self)
+        reset_button.clicked.connect(self.reset)
+        layout.addWidget(reset_button)
+
+        self.search_hint = QLabel(f"Найдено больше {repository.SEARCH_LIMIT} пассажиров — уточните запрос", self)
+        self.search_hint.setStyleSheet("color: #F44336;")
+        self.search_hint.setVisible(False)
+        layout.addWidget(self.search_hint)
+        layout.addStretch()
+
+        reference = refdata.cache.peek()
+        if reference is not None:
+            self.reference_data_loaded(reference)
+        else:
+            self.executor.submit(refdata.cache.get, on_result=self.reference_data_loaded, on_error=self.show_error)
+        self.executor.submit(repository.list_cashiers, on_result=self.cashiers_loaded, on_error=self.show_error)
+
+    def reference_data_loaded(self, reference):
+        for train in reference.trains.values():
+            self.train.addItem(train.train_name, train.id)
+        for combo in [self.departure_station, self.arrival_station]:
+            for station in reference.stations.values():
+                combo.addItem(station.name_station, station.id)
+        for combo in [self.train, self.departure_station, self.arrival_station]:
+            combo.setEnabled(True)
+
+    def cashiers_loaded(self, cashiers):
+        for cashier_id, name in cashiers:
+            self.cashier.addItem(name, cashier_id)
+        self.cashier.setEnabled(True)
+
+    def show_error(self, error):
+        self.load_failed.emit(str(error))
+
+    def dates_toggled(self, checked):
+        self.date_from.setEnabled(checked)
+        self.date_to.setEnabled(checked)
+        self.schedule()
+
+    def schedule(self):
+        self.timer.start()
+
+    def filter_changed(self):
+        self.changed.emit()
+        text = self.search.text()
+        if repository.search_query(text) is None:
+            self.executor.cancel(("search_truncated", id(self)))
+            self.search_hint.setVisible(False)
+            return
+        with diagnostics.tracer.action("Поиск пассажира"):
+            self.executor.submit(repository.search_truncated, text, key=("search_truncated", id(self)),
+                                 on_result=self.search_hint.setVisible, on_error=self.show_error)
+
+    def reset(self):
+        self.search.clear()
+        for combo in [self.train, self.departure_station, self.arrival_station, self.cashier]:
+            combo.setCurrentIndex(0)
+        self.use_dates.setChecked(False)
+        self.include_archive.setChecked(False)
+
+    # Условия фильтра; порядок сортировки задаётся заголовками таблицы
+    def ticket_filter(self, base=repository.NO_FILTER):
+        dates = self.use_dates.isChecked()
+        search = self.search.text().strip()
+        return base._replace(
+            search=search if repository.search_query(search) else None,
+            train_id=self.train.currentData(),
+            departure_station_id=self.departure_station.currentData(),
+            arrival_station_id=self.arrival_station.currentData(),
+            cashier_id=self.cashier.currentData(),
+            date_from=self.date_from.date().toPyDate() if dates else None,
+            date_to=self.date_to.date().toPyDate() if dates else None,
+            include_archive=self.include_archive.isChecked(),
+        )
@@ -0,0 +1,192 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+import diagnostics
+import repository
+from .db_executor import get_executor
+from .ticket_rows import TicketRows
+
+HEADERS = ["ID", "ФИО", "Паспорт", "Название поезда", "Место", "Станция отправления", "Станция прибытия",
+           "Время отправления", "Время прибытия", "ФИО Кассира"]
+
+# Сколько строк подгружаем за один запрос
+PAGE_SIZE = 200
+
+# Колонки таблицы, по которым можно сортировать, и соответствующий порядок в базе.
+# Сортировка по остальным колонкам потребовала бы сортировать весь результат.
+SORTABLE_COLUMNS = {0: "id", 7: "departure_time", 8: "arrival_time"}
+
+# С какого числа изменений обновление списка пересобирает колонки хранилища
+# целиком (со сбросом модели), а не вставляет и удаляет строки по одной
+BULK_CHANGES = 200
+
+
+# Модель списка билетов: строки подгружаются страницами по мере прокрутки.
+# Страница выбирается по ключу сортировки (после последней загруженной строки),
+# поэтому стоимость запроса не зависит от того, насколько далеко прокручена таблица.
+# Фильтр и порядок задаются TicketFilter и выполняются в базе.
+class TicketTableModel(QAbstractTableModel):
+    # Ошибка фоновой загрузки — текст для показа пользователю
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, parent=None, page_size=PAGE_SIZE, executor=None):
+        super().__init__(parent)
+        self.page_size = page_size
+        self.executor = executor or get_executor()
+        self.ticket_filter = repository.NO_FILTER
+        # Строки в порядке отображения, по колонкам (см. TicketRows)
+        self._rows = TicketRows()
+        self._has_more = True
+        # Ревизия данных, которую уже видит представление
+        self._revision = 0
+        # Запросы модели выполняются в фоне по одному; поколение отсекает
+        # результаты, пришедшие после перезагрузки
+        self._loading = False
+        self._refresh_pending = False
+        self._generation = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._rows.text(index.row(), index.column())
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self._has_more or self._loading:
+            return
+        after = self._rows.sort_key(len(self._rows) - 1) if len(self._rows) else None
+        with diagnostics.tracer.action("Прокрутка списка"):
+            self._submit(repository.fetch_ticket_page, self.ticket_filter, after, self.page_size,
+                         on_result=self._page_loaded)
+
+    def _page_loaded(self, rows):
+        self._has_more = len(rows) == self.page_size
+        if not rows:
+            return
+
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        for row in rows:
+            self._rows.append(self._rows.encode(row))
+        self.endInsertRows()
+
+    def set_filter(self, ticket_filter):
+        if ticket_filter != self.ticket_filter:
+            self.ticket_filter = ticket_filter
+            self.reload()
+
+    # Сортировка по щелчку на заголовке: порядок меняется в базе, список
+    # загружается заново с первой страницы
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        sort = SORTABLE_COLUMNS.get(column)
+        if sort is None:
+            return
+        self.set_filter(self.ticket_filter._replace(
+            sort=sort, descending=order == Qt.SortOrder.DescendingOrder))
+
+    # Перезагрузка с первой страницы. Текущие строки остаются на экране,
+    # пока не придёт новая страница; незавершённые запросы отменяются.
+    def reload(self):
+        self.executor.cancel(self)
+        self._generation += 1
+        self._loading = False
+        self._refresh_pending = False
+        with diagnostics.tracer.action("Загрузка списка"):
+            self._submit(repository.fetch_first_page, self.ticket_filter, self.page_size,
+                         on_result=self._first_page_loaded)
+
+    def _first_page_loaded(self, result):
+        revision, rows = result
+        self.beginResetModel()
+        self._rows = TicketRows(self.ticket_filter.sort, self.ticket_filter.descending)
+        for row in rows:
+            self._rows.append(self._rows.encode(row))
+        self._has_more = len(rows) == self.page_size
+        self._revision = revision
+        self.endResetModel()
+
+    # Догружает только изменения с последней увиденной ревизии и правит
+    # затронутые строки на месте, не перестраивая таблицу
+    def refresh(self):
+        if self._loading:
+            self._refresh_pending = True
+            return
+        with diagnostics.tracer.action("Обновление списка"):
+            self._submit(repository.fetch_changes, self._revision, self.ticket_filter,
+                         on_result=self._changes_loaded)
+
+    def _changes_loaded(self, result):
+        revision, rows, deleted = result
+        self._revision = revision
+        if len(rows) + len(deleted) >= BULK_CHANGES:
+            self.beginResetModel()
+            self._rows.update_many(deleted, [self._rows.encode(ticket) for ticket in rows],
+                                   keep_tail=not self._has_more)
+            self.endResetModel()
+            return
+
+        for ticket_id in deleted:
+            self._remove(ticket_id)
+
+        for ticket in rows:
+            values = self._rows.encode(ticket)
+            key = self._rows.key(values)
+            row = self._rows.find(ticket.id)
+            if row is not None and self._rows.key_at(row) == key:
+                self._rows.replace(row, values)
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(HEADERS) - 1))
+                continue
+
+            # Билет переместился в порядке сортировки (или новый)
+            self._remove(ticket.id)
+            row = self._rows.position(key)
+            if row < len(self._rows) or not self._has_more:
+                # Строки за границей загруженного придут при следующем fetchMore
+                self.beginInsertRows(QModelIndex(), row, row)
+                self._rows.insert(row, values)
+                self.endInsertRows()
+
+    def _remove(self, ticket_id):
+        row = self._rows.find(ticket_id)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._rows.remove(row)
+        self.endRemoveRows()
+
+    def _submit(self, fn, *args, on_result):
+        generation = self._generation
+        self._loading = True
+
+        def finished(result):
+            if generation != self._generation:
+                return
+            self._loading = False
+            if isinstance(result, Exception):
+                self._refresh_pending = False
+                self.load_failed.emit(str(result))
+                return
+            on_result(result)
+            if self._refresh_pending:
+                self._refresh_pending = False
+                self.refresh()
+
+        self.executor.submit(fn, *args, key=self, on_result=finished, on_error=finished)
+
+    def ticket_id(self, row):
+        return self._rows.ids[row]
@@ -0,0 +1,208 @@
+from array import array
+from datetime import datetime, timedelta
+
+# Отсчёт времени в колонках: время из базы (без часового пояса) хранится
+# целым числом микросекунд от EPOCH, без перевода часовых поясов
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+
+# Колонки хранилища: имя и тип элемента array. Строки (ФИО по частям, поезд,
+# станции, кассир) хранятся кодами словаря — одинаковые значения хранятся один раз.
+COLUMNS = [
+    ("id", "q"),
+    ("first_name", "i"),
+    ("middle_name", "i"),
+    ("last_name", "i"),
+    ("series_passport", "i"),
+    ("number_passport", "q"),
+    ("train", "i"),
+    ("seat_number", "i"),
+    ("departure_station", "i"),
+    ("arrival_station", "i"),
+    ("departure_time", "q"),
+    ("arrival_time", "q"),
+    ("cashier", "i"),
+    ("rank", "i"),
+]
+ID, FIRST_NAME, MIDDLE_NAME, LAST_NAME, SERIES, NUMBER, TRAIN, SEAT, DEPARTURE_STATION, ARRIVAL_STATION, \
+    DEPARTURE_TIME, ARRIVAL_TIME, CASHIER, RANK = range(len(COLUMNS))
+
+# Колонка значения сортировки для TicketFilter.sort; при сортировке по id ключ — сам id
+SORT_COLUMNS = {"departure_time": DEPARTURE_TIME, "arrival_time": ARRIVAL_TIME, "rank": RANK}
+
+
+def to_micros(value: datetime) -> int:
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def _join(parts):
+    return ' '.join(part for part in parts if part)
+
+
+# Строки списка билетов по колонкам: числа и время — в array, строки — кодами
+# словаря. Строка занимает около 70 байт вместо графа объектов и десяти готовых
+# строк; текст ячейки собирается при отрисовке (text). Строки лежат в порядке
+# сортировки sort/descending (как TicketFilter), позиция в хранилище — номер
+# строки таблицы.
+class TicketRows:
+    def __init__(self, sort="id", descending=False):
+        self.sort = sort
+        self.descending = descending
+        self._sort_column = SORT_COLUMNS.get(sort)
+        self.columns = [array(typecode) for _, typecode in COLUMNS]
+        self.ids = self.columns[ID]
+        # Словарь строк: код 0 — пустое значение
+        self._strings = [None]
+        self._codes = {None: 0}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._strings)
+            self._strings.append(value)
+        return code
+
+    # Строка из repository (fetch_ticket_page, fetch_changes) в значения колонок
+    def encode(self, row) -> tuple:
+        code = self._code
+        cashier = _join([row.cashier_lastname, row.cashier_firstname, row.cashier_middle_name])
+        return (
+            row.id,
+            code(row.first_name),
+            code(row.middle_name),
+            code(row.last_name),
+            row.series_passport,
+            row.number_passport,
+            code(row.train_name),
+            row.seat_number,
+            code(row.departure_station),
+            code(row.arrival_station),
+            to_micros(row.departure_time),
+            to_micros(row.arrival_time),
+            code(cashier),
+            getattr(row, "rank", 0) or 0,
+        )
+
+    def key(self, values):
+        if self._sort_column is None:
+            return (values[ID],)
+        return (values[self._sort_column], values[ID])
+
+    def key_at(self, position):
+        if self._sort_column is None:
+            return (self.ids[position],)
+        return (self.columns[self._sort_column][position], self.ids[position])
+
+    # Ключ строки в виде repository.sort_key — для выборки следующей страницы
+    def sort_key(self, position):
+        key = self.key_at(position)
+        if self.sort in ("departure_time", "arrival_time"):
+            return (from_micros(key[0]), key[1])
+        return key
+
+    # Позиция, на которую встаёт строка с ключом key (как bisect_left)
+    def position(self, key):
+        low, high = 0, len(self.ids)
+        while low < high:
+            middle = (low + high) // 2
+            current = self.key_at(middle)
+            if (key < current) if self.descending else (current < key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, ticket_id):
+        if self._sort_column is None:
+            position = self.position((ticket_id,))
+            return position if position < len(self.ids) and self.ids[position] == ticket_id else None
+        # Порядок не по id: поиск просмотром колонки id (на уровне C)
+        try:
+            return self.ids.index(ticket_id)
+        except ValueError:
+            return None
+
+    def append(self, values):
+        for column, value in zip(self.columns, values):
+            column.append(value)
+
+    def insert(self, position, values):
+        for column, value in zip(self.columns, values):
+            column.insert(position, value)
+
+    def replace(self, position, values):
+        for column, value in zip(self.columns, values):
+            column[position] = value
+
+    def remove(self, position):
+        for column in self.columns:
+            del column[position]
+
+    # Много изменений сразу: убрать билеты removed_ids и вставить новые строки
+    # rows (значения encode) по своим местам. Колонки пересобираются кусками
+    # между затронутыми позициями, а не сдвигаются на каждую строку. Строки,
+    # которые встали бы после последней, вставляются, только если keep_tail.
+    def update_many(self, removed_ids, rows, keep_tail=True):
+        removed = set(removed_ids)
+        removed.update(values[ID] for values in rows)
+        positions = [position for position, ticket_id in enumerate(self.ids) if ticket_id in removed]
+        if positions:
+            self._rebuild([(position, position + 1, None) for position in positions])
+
+        rows = sorted(rows, key=self.key, reverse=self.descending)
+        inserts = [(self.position(self.key(values)), values) for values in rows]
+        if not keep_tail:
+            inserts = [(position, values) for position, values in inserts if position < len(self.ids)]
+        if inserts:
+            self._rebuild([(position, position, values) for position, values in inserts])
+
+    # changes — по возрастанию позиции: (начало, конец, значения) — заменить
+    # строки [начало, конец) строкой values (None — просто удалить)
+    def _rebuild(self, changes):
+        for index, column in enumerate(self.columns):
+            rebuilt = array(column.typecode)
+            previous = 0
+            for start, end, values in changes:
+                rebuilt.extend(column[previous:start])
+                if values is not None:
+                    rebuilt.append(values[index])
+                previous = end
+            rebuilt.extend(column[previous:])
+            self.columns[index] = rebuilt
+        self.ids = self.columns[ID]
+
+    # Текст ячейки для колонки таблицы (ticket_model.HEADERS)
+    def text(self, position, column):
+        columns = self.columns
+        strings = self._strings
+        if column == 0:
+            return str(self.ids[position])
+        if column == 1:
+            return _join([strings[columns[FIRST_NAME][position]], strings[columns[MIDDLE_NAME][position]],
+                          strings[columns[LAST_NAME][position]]])
+        if column == 2:
+            return f"{columns[SERIES][position]} {columns[NUMBER][position]}"
+        if column == 3:
+            return strings[columns[TRAIN][position]]
+        if column == 4:
+            return str(columns[SEAT][position])
+        if column == 5:
+            return strings[columns[DEPARTURE_STATION][position]]
+        if column == 6:
+            return strings[columns[ARRIVAL_STATION][position]]
+        if column == 7:
+            return from_micros(columns[DEPARTURE_TIME][position]).strftime(DATETIME_FORMAT)
+        if column == 8:
+            return from_micros(columns[ARRIVAL_TIME][position]).strftime(DATETIME_FORMAT)
+        if column == 9:
+            return strings[columns[CASHIER][position]]
+        return None